@@ -0,0 +1,116 @@
+from langchain_openai import ChatOpenAI
+from app.models import State, MealEntry, MealCorrection
+from app.database import Database
+from app import corrections
+from app.circuit import OPENAI_MAX_RETRIES, OPENAI_TIMEOUT_SECONDS, CircuitOpenError, openai_breaker
+import time
+
+class Meal_Corrector:
+    """Applies corrections to recently logged meals instead of logging new ones"""
+
+    def __init__(self, db: Database = None):
+        # Text only: a correction never re-runs the image analysis
+        self.llm = ChatOpenAI(model="gpt-4o-mini", timeout=OPENAI_TIMEOUT_SECONDS,
+                              max_retries=OPENAI_MAX_RETRIES).with_structured_output(MealCorrection)
+        self.db = db or Database()
+
+    def __call__(self, state: State) -> State:
+        """
+        Resolve the meal being corrected and update or delete it in place
+        """
+        if state.response:
+            return state
+
+        started = time.perf_counter()
+        message = state.message.body
+        user_id = state.message.sender
+
+        recent = self.db.get_recent_meals(user_id, limit=corrections.CORRECTION_WINDOW)
+        if not recent:
+            state.response = "You haven't logged any meals yet, so there's nothing to correct. Tell me what you ate! 🍽️"
+            return state
+
+        # Small edits are resolved locally
+        correction = corrections.parse_correction(message)
+        target = corrections.pick_target(recent, correction, message)
+        corrected = None
+        delete = False
+        if correction is not None and target is not None:
+            if correction.kind == "delete":
+                delete = True
+            else:
+                corrected = corrections.apply_correction(correction, target)
+
+        local = delete or corrected is not None
+        if not local:
+            try:
+                target, corrected, delete = self._ask_model(message, recent)
+            except CircuitOpenError:
+                # Deferred until the model is back
+                raise
+            except Exception as e:
+                print(f"Error resolving correction: {e}")
+                state.response = "Sorry, I couldn't work out which meal to correct. Could you say it again, e.g. \"actually it was 2 eggs, not 3\"?"
+                return state
+
+        try:
+            if delete:
+                self.db.delete_meal_entry(user_id, str(target.id))
+                state.response = f"🗑️ Removed {target.meal_name} ({target.meal_calories} kcal) from your log."
+            else:
+                # Rollups and cached daily totals are adjusted by the difference
+                self.db.update_meal_entry(user_id, str(target.id), corrected)
+                corrected.id = str(target.id)
+                state.meal_entry = corrected
+                state.response = render_update(target, corrected)
+            state.db_operation_status = "success"
+        except Exception as e:
+            print(f"Database error: {e}")
+            state.db_operation_status = f"error: {str(e)}"
+            state.response = "Sorry, I couldn't save that correction. Please try again."
+
+        print(f"Correction ({'local' if local else 'model'}) handled in {(time.perf_counter() - started) * 1000:.1f} ms")
+        return state
+
+    def _ask_model(self, message: str, recent):
+        """Let the model pick the meal and the corrected values"""
+        meals = "\n".join(
+            f"{number}. {row.meal_name}: {row.meal_description} "
+            f"({row.meal_calories} kcal, {row.meal_protein}g protein, "
+            f"{row.meal_carbs}g carbs, {row.meal_fat}g fat)"
+            for number, row in enumerate(recent, start=1)
+        )
+        prompt = f"""
+        The user is correcting a meal they already logged. Their latest meals, newest first:
+        {meals}
+
+        The user says: "{message}"
+
+        Return the number of the meal they mean. If they want it removed, set delete to true.
+        Otherwise return the full corrected meal, changing only what the correction affects
+        and scaling the nutrition values accordingly.
+        """
+        result = openai_breaker.call(self.llm.invoke, prompt)
+        if not 1 <= result.meal_number <= len(recent):
+            raise ValueError(f"Meal number {result.meal_number} out of range")
+        target = recent[result.meal_number - 1]
+        if not result.delete and result.meal is None:
+            raise ValueError("No corrected meal returned")
+        return target, result.meal, result.delete
+
+
+def render_update(old, new: MealEntry) -> str:
+    """Templated reply showing what changed"""
+    def line(icon, label, before, after, unit):
+        if before == after:
+            return f"{icon} {label}: {after}{unit}"
+        return f"{icon} {label}: {before}{unit} → {after}{unit}"
+
+    return "\n".join([
+        f"✏️ Updated: {new.meal_name}",
+        "",
+        line("⚡", "Calories", old.meal_calories, new.meal_calories, " kcal"),
+        line("🥩", "Protein", old.meal_protein, new.meal_protein, "g"),
+        line("🥑", "Fats", old.meal_fat, new.meal_fat, "g"),
+        line("🍚", "Carbs", old.meal_carbs, new.meal_carbs, "g"),
+    ])
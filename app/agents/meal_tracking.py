@@ -3,6 +3,10 @@ from langchain_core.messages import HumanMessage
 from app.models import State, MealEntry
 import json
 from app.database import Database
+from app.meal_memory import HINT_THRESHOLD, can_reuse, meal_memory
+from app import progress
+from app.agents.synthesizer import render_macro_block
+from app.circuit import OPENAI_MAX_RETRIES, OPENAI_TIMEOUT_SECONDS, openai_breaker
 from sqlalchemy import text
 
 #from app.database import DatabaseService
@@ -10,10 +14,12 @@ from sqlalchemy import text
 class Meal_Tracker:
     """Meal tracking agent for nutrition analysis"""
     
-    def __init__(self):
+    def __init__(self, db: Database = None):
         # Use different models based on whether we're analyzing text or images
-        self.llm = ChatOpenAI(model="gpt-4o-mini").with_structured_output(MealEntry)
-        self.db = Database()
+        self.llm = ChatOpenAI(model="gpt-4o-mini", timeout=OPENAI_TIMEOUT_SECONDS,
+                              max_retries=OPENAI_MAX_RETRIES).with_structured_output(MealEntry)
+        self.db = db or Database()
+        self.memory = meal_memory
     
     def __call__(self, state: State) -> State:
         """
@@ -26,9 +32,44 @@ class Meal_Tracker:
         message = state.message.body  # Already contains transcription
         user_id = state.message.sender
 
+        has_images = any(media["type"].startswith("image/") for media in state.message.media_items)
+
+        # Past meals that look like this one
+        try:
+            matches = self.memory.search(self.db, user_id, message) if message else []
+        except Exception as e:
+            print(f"Meal memory error: {e}")
+            matches = []
+
+        # A near-identical text-only log with the same amounts reuses the stored numbers as they are now
+        if matches and can_reuse(message, *matches[0]) and not has_images:
+            row = self.db.get_meal_entry(user_id, matches[0][1]["id"])
+            if row is not None:
+                print(f"Reusing meal {row.id} ({matches[0][0]:.2f} similar)")
+                state.meal_entry = MealEntry(
+                    meal_name=row.meal_name,
+                    meal_description=row.meal_description or "",
+                    meal_calories=row.meal_calories or 0,
+                    meal_protein=row.meal_protein or 0,
+                    meal_carbs=row.meal_carbs or 0,
+                    meal_fat=row.meal_fat or 0,
+                )
+                return self._save(state, user_id)
+
+        text_prompt = f"Analyze this meal description: {message}"
+        references = [meal for similarity, meal in matches if similarity >= HINT_THRESHOLD]
+        if references:
+            text_prompt += "\n\nThe user has logged similar meals before. If this is the same meal, keep the numbers consistent with it:\n"
+            text_prompt += "\n".join(
+                f"- {meal['meal_name']}: {meal['meal_description']} "
+                f"({meal['meal_calories']} kcal, {meal['meal_protein']}g protein, "
+                f"{meal['meal_carbs']}g carbs, {meal['meal_fat']}g fat)"
+                for meal in references
+            )
+
         prompt = [HumanMessage(
             content=[
-                {"type": "text", "text": f"Analyze this meal description: {message}"},
+                {"type": "text", "text": text_prompt},
             ],
         )]
 
@@ -40,17 +81,31 @@ class Meal_Tracker:
                     "image_url": {"url": media["url"]}
                 })
 
-        # Call the model with the simplified prompt
-        response = self.llm.invoke(prompt)
+        # Call the model with the simplified prompt; while it's down this raises
+        # CircuitOpenError and the message is deferred
+        response = openai_breaker.call(self.llm.invoke, prompt)
         state.meal_entry = response
         
+        return self._save(state, user_id)
+
+    def _save(self, state: State, user_id: str) -> State:
         # Save to database, etc...
         try:
-            user_id = state.message.sender
             self.db.set_meal_entry(user_id, state.meal_entry)
             state.db_operation_status = "success"
         except Exception as e:
             print(f"Database error: {e}")
             state.db_operation_status = f"error: {str(e)}"
+            return state
+        
+        try:
+            self.memory.add(self.db, user_id, state.meal_entry.id, state.meal_entry)
+        except Exception as e:
+            print(f"Meal memory error: {e}")
+        
+        # On a slow turn the numbers go out now, before the synthesizer runs
+        reporter = progress.current()
+        if reporter is not None:
+            reporter.partial("macros", render_macro_block(state.meal_entry))
         
         return state
@@ -0,0 +1,132 @@
+from app.models import State, MealEntry
+from app.database import Database
+from app import date_parser, quick_log
+from datetime import datetime, timedelta
+import time
+
+class Quick_Logger:
+    """Re-logs favorites and earlier meals without calling a model"""
+
+    def __init__(self, db: Database = None):
+        self.db = db or Database()
+
+    def __call__(self, state: State) -> State:
+        """
+        Handle quick-log commands; any other message passes through untouched
+        """
+        # A photo is always a new meal
+        if any(media["type"].startswith("image/") for media in state.message.media_items or []):
+            return state
+
+        started = time.perf_counter()
+        user_id = state.message.sender
+        command = quick_log.parse_command(state.message.body, date_parser.today_for(user_id))
+        if command is None:
+            return state
+
+        try:
+            handler = getattr(self, f"_{command.kind}")
+            response = handler(state, user_id, command)
+        except Exception as e:
+            print(f"Quick log error: {e}")
+            import traceback
+            traceback.print_exc()
+            return state
+
+        if response is None:
+            # e.g. a short message that isn't one of the user's aliases
+            return state
+
+        state.intent = "quick_log"
+        state.response = response
+        print(f"Quick log ({command.kind}) handled in {(time.perf_counter() - started) * 1000:.1f} ms")
+        return state
+
+    # Commands
+    def _repeat_last(self, state, user_id, command):
+        meals = self.db.get_recent_meals(user_id, limit=1)
+        if not meals:
+            return "You haven't logged any meals yet, so there's nothing to repeat. Tell me what you ate! 🍽️"
+        return self._log(state, user_id, meals)
+
+    def _same_as(self, state, user_id, command):
+        start, end = quick_log.slot_window(command.day, command.slot, date_parser.user_timezone(user_id))
+        meals = []
+        # The local day can span two UTC dates
+        for row in self.db.iter_meals(user_id, start.date(), (end - timedelta(microseconds=1)).date()):
+            created_at = row.created_at
+            if isinstance(created_at, str):
+                created_at = datetime.fromisoformat(created_at)
+            if start <= created_at < end:
+                meals.append(row)
+        if not meals:
+            what = command.slot or "meals"
+            return f"I couldn't find any {what} logged on {command.day.strftime('%A, %d %B')}. Tell me what you ate instead! 🍽️"
+        return self._log(state, user_id, meals)
+
+    def _log_favorite(self, state, user_id, command):
+        favorite = self.db.get_favorite(user_id, command.alias)
+        if favorite is None:
+            return None
+        with self.db.batch():
+            self.db.use_favorite(user_id, command.alias)
+            response = self._log(state, user_id, [favorite])
+        return response
+
+    def _save_favorite(self, state, user_id, command):
+        meals = self.db.get_recent_meals(user_id, limit=1)
+        if not meals:
+            return "Log a meal first, then save it as a favorite. ⭐"
+        self.db.save_favorite(user_id, command.alias, _meal_entry(meals[0]))
+        return (f"⭐ Saved {meals[0].meal_name} as \"{command.alias}\".\n"
+                f"Send \"{command.alias}\" any time to log it again.")
+
+    def _list_favorites(self, state, user_id, command):
+        favorites = self.db.list_favorites(user_id)
+        if not favorites:
+            return "You don't have any favorites yet. Log a meal, then send \"save as <name>\". ⭐"
+        lines = ["⭐ Your favorites:"]
+        for favorite in favorites:
+            lines.append(f"• {favorite.alias}: {favorite.meal_name} ({favorite.meal_calories} kcal)")
+        return "\n".join(lines)
+
+    def _delete_favorite(self, state, user_id, command):
+        if not self.db.delete_favorite(user_id, command.alias):
+            return f"You don't have a favorite called \"{command.alias}\"."
+        return f"🗑️ Removed \"{command.alias}\" from your favorites."
+
+    def _log(self, state, user_id, meals) -> str:
+        """Copy meals into meal_entries and render the reply"""
+        entries = [_meal_entry(meal) for meal in meals]
+        with self.db.batch():
+            for entry in entries:
+                self.db.set_meal_entry(user_id, entry)
+        state.meal_entry = entries[-1]
+        state.db_operation_status = "success"
+        return render_reply(entries)
+
+
+def _meal_entry(row) -> MealEntry:
+    return MealEntry(
+        meal_name=row.meal_name,
+        meal_description=row.meal_description or "",
+        meal_calories=row.meal_calories or 0,
+        meal_protein=row.meal_protein or 0,
+        meal_carbs=row.meal_carbs or 0,
+        meal_fat=row.meal_fat or 0,
+    )
+
+
+def render_reply(entries) -> str:
+    """Templated confirmation for re-logged meals"""
+    lines = ["✅ Logged again:" if len(entries) == 1 else f"✅ Logged {len(entries)} meals again:"]
+    for entry in entries:
+        lines.append(f"🍽️ {entry.meal_name}")
+    lines.extend([
+        "",
+        f"⚡ Calories: {sum(e.meal_calories for e in entries)} kcal",
+        f"🥩 Protein: {sum(e.meal_protein for e in entries)}g",
+        f"🥑 Fats: {sum(e.meal_fat for e in entries)}g",
+        f"🍚 Carbs: {sum(e.meal_carbs for e in entries)}g",
+    ])
+    return "\n".join(lines)
@@ -2,12 +2,25 @@ from typing import Literal
 from langchain_openai import ChatOpenAI
 from langchain_core.messages import HumanMessage
 from app.models import State, BinaryResponse
+from app.database import Database
+from app import corrections
+from app.circuit import OPENAI_MAX_RETRIES, OPENAI_TIMEOUT_SECONDS, CircuitOpenError, openai_breaker
+import re
+
+# Requests for a summary, recognised without the model while it's unavailable
+SUMMARY_REQUEST = re.compile(
+    r"\b(summary|summarize|summarise|overview|report|stats|statistics|"
+    r"zusammenfassung|übersicht|uebersicht|auswertung|bilanz)\b",
+    re.IGNORECASE,
+)
 
 class Router:
     """Router node for the LangGraph flow"""
     
-    def __init__(self):
-        self.llm = ChatOpenAI(model="gpt-4o-mini")
+    def __init__(self, db: Database = None):
+        self.llm = ChatOpenAI(model="gpt-4o-mini", timeout=OPENAI_TIMEOUT_SECONDS,
+                              max_retries=OPENAI_MAX_RETRIES)
+        self.db = db or Database()
     
     def __call__(self, state: State) -> State:
         """
@@ -15,6 +28,18 @@ class Router:
         """
         message = state.message.body
         
+        # Corrections we can read locally, with a cue and a recent meal they're about, skip the model
+        if corrections.parse_correction(message) is not None:
+            recent = self.db.get_recent_meals(state.message.sender, limit=corrections.CORRECTION_WINDOW)
+            if corrections.local_correction(message, recent) is not None:
+                print("Router decision: correction (local)")
+                state.intent = "correction"
+                return state
+        
+        # The model is down: route on keywords, the meal tracker defers whatever needs it
+        if not openai_breaker.available():
+            return self.route_locally(state)
+        
         # Now just handle the text content (which includes any transcriptions)
         prompt = [HumanMessage(
             content=[
@@ -29,10 +54,12 @@ class Router:
                         - Nutrition terms (e.g. calories, protein)
                     - summary:
                         Is the user asking for a summary of their meal tracking data?
+                    - correction:
+                        Is the user correcting or removing a meal they already logged? e.g. "actually it was 2 eggs, not 3", "the pasta was only half a portion", "delete the last one"
                     - other:
                         Is the user asking about something else entirely that is unrelated to food or meal tracking or nutrition?
                     
-                    Please return the intent as a string and nothing else. Possible values are: meal_tracking, summary, other.
+                    Please return the intent as a string and nothing else. Possible values are: meal_tracking, summary, correction, other.
                     """.strip().lower()}
             ],
         )] 
@@ -50,7 +77,10 @@ class Router:
                 })
         
         print(f"Router prompt: {str(prompt)[:150]}...")
-        response = self.llm.invoke(prompt).content.strip().lower()
+        try:
+            response = openai_breaker.call(self.llm.invoke, prompt).content.strip().lower()
+        except CircuitOpenError:
+            return self.route_locally(state)
         print(f"Router decision: {response}")
         #print(f"Router reasoning: {response.reasoning}")
         state.intent = response
@@ -62,3 +92,9 @@ class Router:
             state.response = "I'm not sure how to help with that. Can you tell me about a meal you'd like me to analyze or send a photo of your food?"
         
         return state
+
+    def route_locally(self, state: State) -> State:
+        """Keyword routing for degraded mode: summary requests, otherwise a meal"""
+        state.intent = "summary" if SUMMARY_REQUEST.search(state.message.body or "") else "meal_tracking"
+        print(f"Router decision: {state.intent} (local, model unavailable)")
+        return state
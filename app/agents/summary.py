@@ -1,78 +1,61 @@
-from agents import Agent, Runner, function_tool
+from agents import Agent, Runner, RunContextWrapper, function_tool
+from langchain_openai import ChatOpenAI
 from app.models import State
 from app.database import Database
+from app import date_parser, summary_engine, user_stats
+from app.cache import summary_cache
+from app.circuit import OPENAI_MAX_RETRIES, OPENAI_TIMEOUT_SECONDS, CircuitOpenError, openai_breaker
+from dataclasses import dataclass
 from datetime import date, datetime
 import json
 import asyncio
 
 #from app.database import DatabaseService
 
+@dataclass
+class SummaryToolContext:
+    """Dependencies handed to the summary tools for one run"""
+    db: Database
+    user_id: str
+
+
 @function_tool
-def get_meals(user_id: str, start_date: str, end_date: str):
+def get_meals(ctx: RunContextWrapper[SummaryToolContext], start_date: str, end_date: str) -> summary_engine.NutritionSummary:
     """
-    Get all meals for a user within a specific timeframe.
+    Get per-day nutrition totals for the user within a specific timeframe.
     
     Args:
-        user_id: The user's identifier
         start_date: Start date in format YYYY-MM-DD
         end_date: End date in format YYYY-MM-DD
     """
-    db = Database()
-    # Convert string dates to datetime objects
     try:
-        start = datetime.fromisoformat(start_date)
-        end = datetime.fromisoformat(end_date)
+        start = date.fromisoformat(start_date)
+        end = date.fromisoformat(end_date)
         print(f"Getting meals from {start} to {end}")
         
-        # Call the database method
-        results = db.get_meals_for_user_and_timeframe(user_id, start, end)
-        print(f"Found {len(results)} meals")
-        
-        # Format the results as a list of dictionaries
-        meals = []
-        for row in results:
-            meals.append({
-                "id": str(row[0]),  # Convert UUID to string
-                "user_id": row[1],
-                "meal_name": row[2], 
-                "meal_description": row[3],
-                "meal_calories": row[4],
-                "meal_protein": row[5],
-                "meal_carbs": row[6],
-                "meal_fat": row[7],
-                "created_at": str(row[8]) if row[8] else None
-            })
-
-        total_calories = sum(meal['meal_calories'] for meal in meals)
-        total_protein = sum(meal['meal_protein'] for meal in meals)
-        total_carbs = sum(meal['meal_carbs'] for meal in meals)
-        total_fat = sum(meal['meal_fat'] for meal in meals)
-        return {
-            "meals": meals,
-            "total_calories": total_calories,
-            "total_protein": total_protein,
-            "total_carbs": total_carbs,
-            "total_fat": total_fat 
-        }
+        # Per-day rollups for the sender of this run, not every meal row
+        results = ctx.context.db.get_daily_rollups(ctx.context.user_id, start, end)
+        print(f"Found {len(results)} days with meals")
+        return summary_engine.build_summary(results, start, end)
     except Exception as e:
         print(f"Error in get_meals: {e}")
         import traceback
         traceback.print_exc()
-        return []
+        return f"Error retrieving meals: {e}"
 
 
 class Summary_Creator:
     """Summary creator agent for meal tracking"""
     
-    def __init__(self):
+    def __init__(self, db: Database = None):
         # Create the agent with the tool
-        self.agent = Agent(
+        self.agent = Agent[SummaryToolContext](
             name="Summary Creator",
             instructions="""You are a nutrition assistant that creates summaries of users' meal tracking data.
             
             When asked for a summary, you should:
             1. Interpret the date range from the user's message
-            2. Use the get_meals tool to retrieve their meal data
+            2. Use the get_meals tool to retrieve their per-day meal totals
             3. Consider only days with tracked meals for the average calculation
             4. output the overview in the following format:
             📊 3-Day Nutrition Summary
@@ -91,6 +74,12 @@ class Summary_Creator:
             tools=[get_meals],  # Use a non-static method
             model="gpt-4o-mini"
         )
+        # Only used for the one-line comment under the table
+        self.llm = ChatOpenAI(model="gpt-4o-mini", max_tokens=80, timeout=OPENAI_TIMEOUT_SECONDS,
+                              max_retries=OPENAI_MAX_RETRIES)
+        self.db = db or Database()
+        # Rendered summaries, dropped when a meal in their range changes
+        self.cache = summary_cache
     
     async def __call__(self, state: State) -> State:
         """
@@ -100,11 +89,23 @@ class Summary_Creator:
         message = state.message.body
         user_id = state.message.sender
         
+        # Resolve the range locally; the agent only handles what we can't parse
+        today = date_parser.today_for(user_id)
+        try:
+            date_range = date_parser.parse_date_range(message, today)
+            if date_range is not None:
+                state.response = await self.create_summary(user_id, *date_range)
+                return state
+        except Exception as e:
+            print(f"Error creating local summary, falling back to agent: {e}")
+        
         try:
             # Use the synchronous run method
-            result = await Runner.run(
+            result = await openai_breaker.acall(
+                Runner.run,
                 starting_agent=self.agent,
-                input=f"Create a summary of my meal tracking data. Today is {date.today()}. {message}. Sent by {user_id}."
+                input=f"Create a summary of my meal tracking data. Today is {today}. {message}",
+                context=SummaryToolContext(db=self.db, user_id=user_id)
             )
 
             print(str(result))
@@ -112,6 +113,9 @@ class Summary_Creator:
             state.response = result.final_output
             print(f"Summary: {result.final_output[:100] if result.final_output else 'No result'}...")
             
+        except CircuitOpenError:
+            # Ranges we can't parse need the agent; deferred until it's back
+            raise
         except Exception as e:
             print(f"Error creating summary: {e}")
             import traceback
@@ -119,3 +123,32 @@ class Summary_Creator:
             state.response = "Sorry, I couldn't create a summary of your meal tracking data. Please try again later."
         
         return state
+
+    async def create_summary(self, user_id: str, start_date: date, end_date: date) -> str:
+        """Build the summary table in Python with one query and one short LLM call"""
+        cached = self.cache.get(user_id, start_date, end_date)
+        if cached is not None:
+            print(f"Summary cache hit for {user_id} from {start_date} to {end_date}")
+            return cached
+        
+        marker = self.cache.write_marker()
+        rows = self.db.get_daily_rollups(user_id, start_date, end_date)
+        summary = summary_engine.build_summary(rows, start_date, end_date)
+        table = summary_engine.render_summary_table(summary)
+        if not summary.days:
+            self.cache.put(user_id, start_date, end_date, table, marker)
+            return table
+        
+        try:
+            stats = user_stats.stats_for_user(self.db, user_id, end_date)
+            prompt = summary_engine.comment_prompt(summary, user_stats.describe_stats(stats))
+            response = await openai_breaker.acall(self.llm.ainvoke, prompt)
+            comment = response.content.strip()
+        except Exception as e:
+            print(f"Error creating summary comment: {e}")
+            comment = summary_engine.fallback_comment(summary)
+        
+        print(f"Summary for {user_id} from {start_date} to {end_date}: {len(summary.days)} days")
+        response_text = f"{table}\n\n{comment}"
+        self.cache.put(user_id, start_date, end_date, response_text, marker)
+        return response_text
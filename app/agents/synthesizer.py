@@ -1,13 +1,18 @@
 from langchain_openai import ChatOpenAI
 from app.models import State
+from app.database import Database
+from app import date_parser, progress, user_stats
+from app.circuit import OPENAI_MAX_RETRIES, OPENAI_TIMEOUT_SECONDS, CircuitOpenError, openai_breaker
 import json
 #from app.database import DatabaseService
 
 class Synthesizer:
     """To format and synthesize the final response"""
     
-    def __init__(self):
-        self.llm = ChatOpenAI(model="gpt-4o-mini")
+    def __init__(self, db: Database = None):
+        self.llm = ChatOpenAI(model="gpt-4o-mini", timeout=OPENAI_TIMEOUT_SECONDS,
+                              max_retries=OPENAI_MAX_RETRIES)
+        self.db = db or Database()
     
     def __call__(self, state: State) -> State:
         """
@@ -25,6 +30,36 @@ class Synthesizer:
         meal_carbs = state.meal_entry.meal_carbs
         meal_fat = state.meal_entry.meal_fat
         
+        # Recent trends and habits, precomputed nightly
+        try:
+            user_id = state.message.sender
+            stats = user_stats.stats_for_user(self.db, user_id, date_parser.today_for(user_id))
+            trend_line = user_stats.describe_stats(stats)
+        except Exception as e:
+            print(f"Error computing trends: {e}")
+            trend_line = "No recent history."
+        
+        # On a slow turn the numbers may have gone out already; only the comment is left
+        reporter = progress.current()
+        if reporter is not None and reporter.sent("macros"):
+            prompt = f"""
+        
+        The user just received the nutrition numbers for this meal: "{meal_name}: {meal_description}"
+        ({meal_calories} kcal, {meal_protein}g protein, {meal_carbs}g carbs, {meal_fat}g fat).
+        
+        Write a 1-2 sentence motivational or witty comment about it with emojis.
+        If the meal is unhealthy, be a bit witty/sarcastic.
+        
+        Reference the context of the user in the comment: {str(state.context)}.
+        Their recent trends: {trend_line}
+        Do not repeat the numbers and do not include any other text or formatting.
+        """
+            try:
+                state.response = openai_breaker.call(self.llm.invoke, prompt).content
+            except CircuitOpenError:
+                state.response = "✅ Logged."
+            return state
+        
         prompt = f"""
         
         Synthesize this meal into a well formated message. The details about the meal are: 
@@ -49,12 +84,28 @@ class Synthesizer:
         Keep your total response under 1500 characters for WhatsApp.
         Use friendly, encouraging language with emojis. If the meal is unhealthy, be a bit witty/sarcastic.
 
-        For the witty comment, reference the context of the user in the response: {str(state.context)}.     
+        For the witty comment, reference the context of the user in the response: {str(state.context)}.
+        Their recent trends: {trend_line}
         Do not include any other text or formatting.
         """
-        response = self.llm.invoke(prompt).content
+        try:
+            response = openai_breaker.call(self.llm.invoke, prompt).content
+        except CircuitOpenError:
+            # The meal is logged (e.g. reused numbers); only the comment has to go
+            response = f"{render_macro_block(state.meal_entry)}\n\n✅ Logged."
 
         state.response = response
             
         return state
-    
\ No newline at end of file
+
+
+def render_macro_block(meal_entry) -> str:
+    """The numbers part of a meal reply, sent early on slow turns"""
+    return "\n".join([
+        f"🍽️ {meal_entry.meal_name}",
+        "",
+        f"⚡ Calories: {meal_entry.meal_calories} kcal",
+        f"🥩 Protein: {meal_entry.meal_protein}g",
+        f"🥑 Fats: {meal_entry.meal_fat}g",
+        f"🍚 Carbs: {meal_entry.meal_carbs}g",
+    ])
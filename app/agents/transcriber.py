@@ -1,70 +1,111 @@
-from langchain_openai import OpenAI
-from openai import OpenAI as DirectOpenAI
 from app.models import State
+from app import audio as audio_pipeline
+from app.transcription import get_backend
+from app.media_store import media_store
+from app.circuit import CircuitOpenError
+from base64 import b64decode
+from concurrent.futures import ThreadPoolExecutor
+import mimetypes
 import os
-import tempfile
 
 class Transcriber:
     """Transcribe audio content in messages before processing"""
-    
+
     def __init__(self):
-        # Initialize the direct OpenAI client for whisper
-        self.client = DirectOpenAI()
-    
+        # Configured by TRANSCRIPTION_BACKEND; a local model is loaded here, once
+        self.backend = get_backend()
+        # Shared by every message so a burst of voice notes can't oversubscribe the backend
+        self.pool = ThreadPoolExecutor(max_workers=self.backend.max_concurrency,
+                                       thread_name_prefix="transcribe")
+
     def __call__(self, state: State) -> State:
         """
-        Check for audio in the message and transcribe it
+        Transcribe every audio item in the message and add the text to the body
         """
         # If no media or no audio, just return state unchanged
         if not state.message.media_items:
             return state
-            
+
         # Check if any media item is audio
-        audio_items = [media for media in state.message.media_items 
+        audio_items = [media for media in state.message.media_items
                       if media["type"].startswith("audio/")]
-        
+
         if not audio_items:
             return state
-            
-        # Process the first audio item (could extend to handle multiple)
-        audio = audio_items[0]
-        
-        print(f"Transcribing audio from {state.message.sender}")
-        
-        try:
-            # Write the base64 decoded audio to a temporary file
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.mp3') as temp_audio:
-                # Write the binary audio data to the file
-                temp_path = temp_audio.name
-                
-                # If we have file_path, use it
-                if "file_path" in audio and os.path.exists(audio["file_path"]):
-                    temp_path = audio["file_path"]
-                    print(f"Using existing audio file at {temp_path}")
-                
-            # Transcribe using the Whisper API
-            with open(temp_path, 'rb') as audio_file:
-                transcript = self.client.audio.transcriptions.create(
-                    model="whisper-1",
-                    file=audio_file
-                )
-                
-            transcription = transcript.text
-            print(f"Transcription: {transcription}")
-            
+
+        print(f"Transcribing {len(audio_items)} audio item(s) from {state.message.sender}")
+
+        # Decode and split every item, then send all chunks to the pool at once
+        prepared = list(self.pool.map(self._prepare, audio_items))
+        futures = [
+            [self.pool.submit(self._transcribe_chunk, name, data) for name, data in chunks]
+            if chunks is not None else None
+            for chunks in prepared
+        ]
+
+        transcriptions = []
+        failed = 0
+        for item_futures in futures:
+            try:
+                if item_futures is None:
+                    raise RuntimeError("could not read the audio")
+                # Stitch chunks back together in order
+                text = " ".join(f.result().strip() for f in item_futures).strip()
+                if text:
+                    transcriptions.append(text)
+            except CircuitOpenError:
+                # No backend to transcribe with: the message is deferred, not answered
+                raise
+            except Exception as e:
+                print(f"Error transcribing audio: {e}")
+                failed += 1
+
+        transcription = "\n".join(transcriptions)
+        print(f"Transcription: {transcription}")
+
+        if transcription:
             # Update the message body with the transcription
             # If there was already text, append the transcription
             if state.message.body:
                 state.message.body = f"{state.message.body}\n[Audio Transcription: {transcription}]"
             else:
                 state.message.body = transcription
-        
-        except Exception as e:
-            print(f"Error transcribing audio: {e}")
+
+        if failed:
             # If transcription fails, add a note to the message
             if state.message.body:
                 state.message.body = f"{state.message.body}\n[Audio transcription failed]"
             else:
                 state.message.body = "[Audio transcription failed. Please try again or describe your meal in text.]"
-        
-        return state 
\ No newline at end of file
+
+        return state
+
+    def _prepare(self, audio):
+        """
+        WAV chunks for one audio item, or the original file as a single chunk
+        if it can't be decoded locally (e.g. no ffmpeg); None if unreadable
+        """
+        try:
+            if "media_id" in audio:
+                data = media_store.read(audio["media_id"])
+            elif "file_path" in audio and os.path.exists(audio["file_path"]):
+                with open(audio["file_path"], "rb") as f:
+                    data = f.read()
+            else:
+                data = b64decode(audio["base64_data"])
+        except Exception as e:
+            print(f"Error reading audio: {e}")
+            return None
+
+        try:
+            chunks = audio_pipeline.prepare_chunks(data)
+            print(f"Audio split into {len(chunks)} chunk(s)")
+            return [(f"chunk{i}.wav", chunk) for i, chunk in enumerate(chunks)]
+        except Exception as e:
+            print(f"Audio preprocessing failed, sending the file as is: {e}")
+            media_type = audio["type"].split(";")[0].strip()
+            extension = mimetypes.guess_extension(media_type) or ".ogg"
+            return [(f"audio{extension}", data)]
+
+    def _transcribe_chunk(self, name: str, data: bytes) -> str:
+        return self.backend.transcribe(name, data)
@@ -0,0 +1,291 @@
+# Vectorized nutrition analytics over meal history (rolling averages, macro
+# ratios, goal adherence, logging streaks)
+
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from itertools import chain
+from typing import Dict, List, Optional
+import os
+
+import numpy as np
+
+from app import date_parser
+
+DEFAULT_CALORIE_GOAL = int(os.getenv("CALORIE_GOAL", "2000"))
+# A day counts as on goal within this fraction of the calorie goal
+GOAL_TOLERANCE = float(os.getenv("CALORIE_GOAL_TOLERANCE", "0.1"))
+ROLLING_DAYS = 7
+
+# kcal per gram
+KCAL_PROTEIN = 4
+KCAL_CARBS = 4
+KCAL_FAT = 9
+
+
+@dataclass
+class MealArrays:
+    """Meal history as columns; `user` indexes into `users`, `day` is a date ordinal"""
+    users: List[str]
+    user: np.ndarray
+    day: np.ndarray
+    hour: np.ndarray
+    calories: np.ndarray
+    protein: np.ndarray
+    carbs: np.ndarray
+    fat: np.ndarray
+
+    def __len__(self):
+        return len(self.user)
+
+
+@dataclass
+class DailyArrays:
+    """One row per (user, day) with meals, sorted by user then day"""
+    users: List[str]
+    user: np.ndarray
+    day: np.ndarray
+    calories: np.ndarray
+    protein: np.ndarray
+    carbs: np.ndarray
+    fat: np.ndarray
+    meal_count: np.ndarray
+
+
+def load_meal_arrays(db, user_id: str = None, start_date: datetime = None,
+                     end_date: datetime = None, chunk_size: int = 50000,
+                     user_ids: List[str] = None) -> MealArrays:
+    """
+    Stream meals from the database into NumPy columns
+
+    Day and hour are the user's local time, like rollups and summaries, and
+    start_date/end_date are local days. Rows are converted a chunk at a
+    time, so peak memory is the final arrays plus one chunk of Python
+    objects. Pass user_ids to load several users (one indexed range scan
+    each); rows then stay sorted by user.
+    """
+    user_codes: Dict[str, int] = {}
+    zones = {}
+    chunks = []
+    buffer = []
+
+    def flush():
+        if buffer:
+            chunks.append(np.array(buffer, dtype=np.int64).reshape(-1, 7))
+            buffer.clear()
+
+    # iter_meals filters by UTC date: read a day more on each side, then keep the local days
+    first_day = start_date.toordinal() if start_date else None
+    last_day = end_date.toordinal() if end_date else None
+    if start_date:
+        start_date = start_date - timedelta(days=1)
+    if end_date:
+        end_date = end_date + timedelta(days=1)
+
+    if user_ids is not None:
+        rows = chain.from_iterable(
+            db.iter_meals(uid, start_date, end_date, batch_size=chunk_size) for uid in user_ids
+        )
+    else:
+        rows = db.iter_meals(user_id, start_date, end_date, batch_size=chunk_size)
+
+    for row in rows:
+        created_at = row.created_at
+        if isinstance(created_at, str):
+            created_at = datetime.fromisoformat(created_at)
+        zone = zones.get(row.user_id)
+        if zone is None:
+            zone = zones[row.user_id] = date_parser.user_timezone(row.user_id)
+        local = date_parser.local_time(created_at, zone)
+        day = local.toordinal()
+        if (first_day is not None and day < first_day) or (last_day is not None and day > last_day):
+            continue
+        code = user_codes.setdefault(row.user_id, len(user_codes))
+        buffer.append((code, day, local.hour,
+                       row.meal_calories or 0, row.meal_protein or 0,
+                       row.meal_carbs or 0, row.meal_fat or 0))
+        if len(buffer) >= chunk_size:
+            flush()
+    flush()
+
+    data = np.concatenate(chunks) if chunks else np.zeros((0, 7), dtype=np.int64)
+    return MealArrays(
+        users=list(user_codes),
+        user=data[:, 0].astype(np.int32),
+        day=data[:, 1].astype(np.int32),
+        hour=data[:, 2].astype(np.int8),
+        calories=data[:, 3].astype(np.int32),
+        protein=data[:, 4].astype(np.int32),
+        carbs=data[:, 5].astype(np.int32),
+        fat=data[:, 6].astype(np.int32),
+    )
+
+
+def daily_totals(meals: MealArrays) -> DailyArrays:
+    """Sum meals per (user, day) with a single sort and bincount per column"""
+    if len(meals) == 0:
+        empty = np.zeros(0, dtype=np.int64)
+        return DailyArrays(meals.users, empty, empty, empty, empty, empty, empty, empty)
+
+    first_day = int(meals.day.min())
+    span = int(meals.day.max()) - first_day + 1
+    keys = meals.user.astype(np.int64) * span + (meals.day - first_day)
+    unique_keys, inverse = np.unique(keys, return_inverse=True)
+
+    def total(values):
+        return np.bincount(inverse, weights=values, minlength=len(unique_keys)).astype(np.int64)
+
+    return DailyArrays(
+        users=meals.users,
+        user=(unique_keys // span).astype(np.int32),
+        day=(unique_keys % span + first_day).astype(np.int32),
+        calories=total(meals.calories),
+        protein=total(meals.protein),
+        carbs=total(meals.carbs),
+        fat=total(meals.fat),
+        meal_count=np.bincount(inverse, minlength=len(unique_keys)).astype(np.int64),
+    )
+
+
+def rolling_average(daily: DailyArrays, values: np.ndarray, window: int = ROLLING_DAYS) -> np.ndarray:
+    """
+    Average per tracked day over the trailing `window` calendar days, per row
+
+    Uses a prefix sum and a searchsorted on (user, day) keys, so it's one
+    pass regardless of how many users are mixed in.
+    """
+    if len(values) == 0:
+        return np.zeros(0, dtype=np.float64)
+    first_day = int(daily.day.min())
+    # Spacing keeps day - window from reaching into the previous user's keys
+    spacing = int(daily.day.max()) - first_day + window + 1
+    keys = daily.user.astype(np.int64) * spacing + (daily.day - first_day)
+    window_start = np.searchsorted(keys, keys - (window - 1), side="left")
+    prefix = np.concatenate(([0], np.cumsum(values, dtype=np.float64)))
+    index = np.arange(len(values))
+    sums = prefix[index + 1] - prefix[window_start]
+    counts = index - window_start + 1
+    return sums / counts
+
+
+def macro_ratios(protein: np.ndarray, carbs: np.ndarray, fat: np.ndarray) -> np.ndarray:
+    """Share of macro calories from protein, carbs and fat; shape (n, 3)"""
+    kcal = np.stack([protein * KCAL_PROTEIN, carbs * KCAL_CARBS, fat * KCAL_FAT], axis=-1)
+    total = kcal.sum(axis=-1, keepdims=True).astype(np.float64)
+    return np.divide(kcal, total, out=np.zeros(kcal.shape, dtype=np.float64), where=total > 0)
+
+
+def goal_adherence(daily: DailyArrays, goals: np.ndarray = None,
+                   tolerance: float = GOAL_TOLERANCE) -> np.ndarray:
+    """Per user: share of tracked days within tolerance of their calorie goal"""
+    n_users = len(daily.users)
+    if goals is None:
+        goals = np.full(n_users, DEFAULT_CALORIE_GOAL, dtype=np.float64)
+    on_goal = np.abs(daily.calories - goals[daily.user]) <= tolerance * goals[daily.user]
+    tracked = np.bincount(daily.user, minlength=n_users)
+    hits = np.bincount(daily.user, weights=on_goal, minlength=n_users)
+    return np.divide(hits, tracked, out=np.zeros(n_users), where=tracked > 0)
+
+
+def streaks(daily: DailyArrays, today: Optional[date] = None):
+    """
+    Logging streaks per user
+
+    Returns:
+        (current, longest) arrays indexed by user code. The current streak
+        counts back from the user's last tracked day, and is zero if that
+        day is before yesterday.
+    """
+    n_users = len(daily.users)
+    current = np.zeros(n_users, dtype=np.int64)
+    longest = np.zeros(n_users, dtype=np.int64)
+    if len(daily.day) == 0:
+        return current, longest
+
+    # A run starts wherever the user changes or a day was skipped
+    starts = np.ones(len(daily.day), dtype=bool)
+    starts[1:] = (daily.user[1:] != daily.user[:-1]) | (np.diff(daily.day) != 1)
+    run_starts = np.flatnonzero(starts)
+    run_lengths = np.diff(np.append(run_starts, len(daily.day)))
+    run_users = daily.user[run_starts]
+
+    np.maximum.at(longest, run_users, run_lengths)
+
+    # Each user's last run is their current streak
+    last_run = np.zeros(n_users, dtype=np.int64) - 1
+    last_run[run_users] = np.arange(len(run_starts))
+    has_runs = last_run >= 0
+    current[has_runs] = run_lengths[last_run[has_runs]]
+    if today is not None:
+        last_day = daily.day[run_starts[last_run[has_runs]] + run_lengths[last_run[has_runs]] - 1]
+        stale = last_day < today.toordinal() - 1
+        current[np.flatnonzero(has_runs)[stale]] = 0
+    return current, longest
+
+
+def typical_meal_hours(meals: MealArrays, top: int = 3) -> Dict[str, List[int]]:
+    """Most common hours of day each user logs a meal"""
+    n_users = len(meals.users)
+    counts = np.bincount(meals.user.astype(np.int64) * 24 + meals.hour,
+                         minlength=n_users * 24).reshape(n_users, 24)
+    order = np.argsort(-counts, axis=1, kind="stable")[:, :top]
+    return {
+        meals.users[code]: [int(hour) for hour in order[code] if counts[code, hour] > 0]
+        for code in range(n_users)
+    }
+
+
+def user_trends(meals: MealArrays, today: date, goals: np.ndarray = None) -> Dict[str, dict]:
+    """All trend features per user, ready to show or store"""
+    daily = daily_totals(meals)
+    if len(daily.day) == 0:
+        return {}
+    rolling = rolling_average(daily, daily.calories)
+    ratios = macro_ratios(daily.protein, daily.carbs, daily.fat)
+    adherence = goal_adherence(daily, goals)
+    current, longest = streaks(daily, today)
+
+    # Last row of each user carries their latest rolling average
+    last_row = np.zeros(len(daily.users), dtype=np.int64)
+    last_row[daily.user] = np.arange(len(daily.user))
+    tracked = np.bincount(daily.user, minlength=len(daily.users))
+    overall = macro_ratios(
+        np.bincount(daily.user, weights=daily.protein, minlength=len(daily.users)),
+        np.bincount(daily.user, weights=daily.carbs, minlength=len(daily.users)),
+        np.bincount(daily.user, weights=daily.fat, minlength=len(daily.users)),
+    )
+
+    trends = {}
+    for code, user_id in enumerate(daily.users):
+        if tracked[code] == 0:
+            continue
+        row = last_row[code]
+        trends[user_id] = {
+            "rolling_7d_calories": round(float(rolling[row]), 1),
+            "last_day_macro_ratio": [round(float(x), 3) for x in ratios[row]],
+            "macro_ratio": [round(float(x), 3) for x in overall[code]],
+            "goal_adherence": round(float(adherence[code]), 3),
+            "current_streak": int(current[code]),
+            "longest_streak": int(longest[code]),
+            "tracked_days": int(tracked[code]),
+        }
+    return trends
+
+
+def trends_for_user(db, user_id: str, today: date, lookback_days: int = 30) -> Optional[dict]:
+    """Trend features for one user over their recent history"""
+    start = datetime.combine(today - timedelta(days=lookback_days - 1), datetime.min.time())
+    end = datetime.combine(today, datetime.min.time())
+    meals = load_meal_arrays(db, user_id, start, end)
+    return user_trends(meals, today).get(user_id)
+
+
+def describe_trends(trends: Optional[dict]) -> str:
+    """One line for LLM prompts"""
+    if not trends:
+        return "No recent history."
+    protein, carbs, fat = (round(x * 100) for x in trends["macro_ratio"])
+    return (f"7-day average {trends['rolling_7d_calories']:.0f} kcal; "
+            f"macros {protein}% protein / {carbs}% carbs / {fat}% fat; "
+            f"on calorie goal {trends['goal_adherence'] * 100:.0f}% of "
+            f"{trends['tracked_days']} tracked days; "
+            f"logging streak {trends['current_streak']} days (best {trends['longest_streak']}).")
@@ -4,87 +4,139 @@ import os
 import openai
 from requests.auth import HTTPBasicAuth
 from twilio.request_validator import RequestValidator
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
+import asyncio
+import time
 
 from app.twilio import Twilio_Client
 from app.models import WhatsAppMessage, State
 from app.langgraph_flow import Workflow
 from app.database import Database
+from app.cache import summary_cache
+from app.meal_memory import meal_memory
+from app.media_store import media_store
+from app.outbound import OutboundQueue
+from app import circuit, progress
+from app.circuit import (DEFERRED_BATCH, DEFERRED_LEASE_SECONDS, DEFERRED_MAX_ATTEMPTS, DEFERRED_POLL_SECONDS,
+                         DEFERRED_REPLY, CircuitOpenError)
+from app.ids import new_id
+from app.inbox import INBOX_MAX_REPLAYS, open_inbox
 
 # Initialize FastAPI
 app = FastAPI()
 # Initialize twilio client
 twilio_client = Twilio_Client()
 db = Database()
+# Built once and shared by all requests; agents get the same Database
+workflow = Workflow(db)
+# Replies are delivered in the background, retried, and survive restarts
+outbound = OutboundQueue(db, twilio_client)
+# Inbound payloads are logged before processing and replayed after a crash;
+# opened (and its slot locked) at startup, not on import
+inbox = None
+inbox_lock = None
 
 # Database check on startup
 @app.on_event("startup")
 async def startup_db_check():
     """Check database tables on startup"""
+    global inbox, inbox_lock
     try:
         tables = db.get_existing_tables()
-        required_tables = ['workflow_states', 'meal_entries']
+        required_tables = ['workflow_states', 'meal_entries', 'daily_nutrition_rollups', 'user_stats', 'meal_favorites', 'outbound_messages', 'graph_checkpoints', 'deferred_messages']
         
         missing_tables = [table for table in required_tables if table not in tables]
-        if missing_tables:
+        if missing_tables and db.auto_create_tables:
+            print(f"Creating missing tables: {missing_tables}")
+            db.create_tables()
+        elif missing_tables:
             print(f"WARNING: Missing required tables: {missing_tables}")
             print("Run 'python -m app.scripts.init_db' to initialize the database")
         else:
             print("Database tables verified successfully")
     except Exception as e:
         print(f"Database check failed: {e}")
+    
+    try:
+        workflow.save_display_graph()
+    except Exception as e:
+        print(f"Could not save graph image: {e}")
+    
+    await outbound.start()
+    
+    # Messages a crash interrupted are processed in the background
+    inbox, inbox_lock = open_inbox()
+    app.state.replay_task = asyncio.create_task(replay_inbox())
+    
+    # Messages deferred during an outage are processed once the circuits close
+    wakeup = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    
+    def on_circuit_change(name: str, state: str):
+        # Called from whichever thread made the call that closed it
+        if state == circuit.CLOSED:
+            loop.call_soon_threadsafe(wakeup.set)
+    
+    for breaker in circuit.BREAKERS.values():
+        breaker.add_listener(on_circuit_change)
+    app.state.deferred_task = asyncio.create_task(process_deferred(wakeup))
+
+@app.on_event("shutdown")
+async def shutdown_outbound():
+    """Give queued replies a moment to go out; the rest are sent after the restart"""
+    await outbound.stop()
+    if inbox is not None:
+        inbox.close()
+        # Releases the slot for the next worker
+        inbox_lock.close()
+    if workflow.checkpointer is not None:
+        workflow.checkpointer.flush()
+    meal_memory.flush()
+
+async def replay_inbox():
+    """Run every logged message that never finished through the workflow again"""
+    try:
+        pending = await asyncio.to_thread(inbox.pending)
+    except Exception as e:
+        print(f"Could not read the inbox: {e}")
+        return
+    if pending:
+        print(f"Replaying {len(pending)} unfinished message(s) from the inbox")
+    for record, replays in pending:
+        entry_id = record["id"]
+        if replays >= INBOX_MAX_REPLAYS:
+            # It never finished in any of those runs; don't let it take the worker down again
+            print(f"Giving up on inbox entry {entry_id} after {replays} replays")
+            inbox.record_done(entry_id)
+            continue
+        await asyncio.to_thread(inbox.record_replay, entry_id)
+        with media_store.request_scope():
+            result = await handle_message(record["form"], time.monotonic())
+        print(f"Replayed inbox entry {entry_id}: {result.get('status')}")
+        inbox.record_done(entry_id)
 
 @app.post("/webhook")
 async def webhook_handler(request: Request):
     """Handle incoming WhatsApp messages"""
+    # Progress messages are timed from here, so media downloads count
+    received = time.monotonic()
+    form_dict = dict(await request.form())
+    
+    # On disk before any work starts, so a crash mid-graph is replayed on restart
+    entry_id = await asyncio.to_thread(inbox.record_received, form_dict)
     try:
-        workflow = Workflow()
-        workflow.save_display_graph()
-        
-        # Extract and validate the request data
-        form_data = await request.form()
-        form_dict = dict(form_data)
-        
-        # Create a validated WhatsAppMessage object
-        message = WhatsAppMessage.from_twilio_request(twilio_client, form_dict)
-        print(f"Received message from {message.sender}: {message.body[:50]}...")
-        # Get today's context for the user
-        today_context = db.get_daily_context(
-            user_id=message.sender,
-            date=datetime.now()
-        )
-        
-        #print(f"Today's context: {today_context}")
-        
-        # Initialize state with the message and context
-        initial_state = State(
-            message=message,
-            context=today_context
-        )
-        
-        # Save the initial state to the database
-        initial_state_id = db.save_state(initial_state, 'initial')
-        print(f"Saved initial state with ID: {initial_state_id}")
-        
-        # Run the graph with the initial state
-        final_state = await workflow.run_graph(initial_state)
-        
-        # Save the final state to the database
-        final_state_id = db.save_state(final_state, 'final')
-        print(f"Saved final state with ID: {final_state_id}")
-        
-        print(f"Final state contents: {final_state}")
-        response_text = final_state.get("response", "Sorry, I couldn't process your request.")
-        
-        message_response = twilio_client.send_message(
-            message=response_text,
-            to=message.sender
-        )
+        # Media downloaded for this request is released when it finishes
+        with media_store.request_scope():
+            return await handle_message(form_dict, received)
+    finally:
+        inbox.record_done(entry_id)
 
-        print(message_response)
-        return {"status": "success", "message_id": message_response.sid, 
-                "initial_state_id": initial_state_id, "final_state_id": final_state_id}
-                
+async def handle_message(form_dict: dict, received: float):
+    try:
+        return await process_message(form_dict, received)
+    except CircuitOpenError as e:
+        # OpenAI or Twilio is down: keep the message and answer without them
+        return await defer_message(form_dict, e)
     except Exception as e:
         print(f"Error in webhook_handler: {e}")
         print(f"Error type: {type(e)}")
@@ -92,6 +144,154 @@ async def webhook_handler(request: Request):
         traceback.print_exc()
         return {"status": "error", "message": str(e)}
 
+async def process_message(form_dict: dict, received: float):
+    """Run one message through the workflow and queue the reply; raises CircuitOpenError in degraded mode"""
+    # Create a validated WhatsAppMessage object
+    message = WhatsAppMessage.from_twilio_request(twilio_client, form_dict)
+    print(f"Received message from {message.sender}: {message.body[:50]}...")
+    # Get today's context for the user
+    today_context = db.get_daily_context(
+        user_id=message.sender,
+        date=datetime.now()
+    )
+    
+    #print(f"Today's context: {today_context}")
+    
+    # Initialize state with the message and context
+    initial_state = State(
+        message=message,
+        context=today_context
+    )
+    
+    # Save the initial state to the database
+    initial_state_id = db.save_state(initial_state, 'initial')
+    print(f"Saved initial state with ID: {initial_state_id}")
+    
+    # Run the graph with the initial state; slow turns send progress messages on the way
+    with progress.reporting(lambda text: outbound.enqueue(text, to=message.sender),
+                            started=received) as reporter:
+        acknowledgement = progress.acknowledgement_for(message.media_items)
+        if reporter is not None and acknowledgement:
+            reporter.acknowledge(acknowledgement)
+        final_state = await workflow.run_graph(initial_state, run_id=form_dict.get("MessageSid"))
+    
+    # Save the final state to the database
+    final_state_id = db.save_state(final_state, 'final')
+    print(f"Saved final state with ID: {final_state_id}")
+    
+    print(f"Final state contents: {final_state}")
+    response_text = final_state.get("response", "Sorry, I couldn't process your request.")
+    
+    # Queued for delivery (split into parts if it's too long); the webhook doesn't wait for Twilio
+    outbound_ids = outbound.enqueue(response_text, to=message.sender)
+    print(f"Queued reply in {len(outbound_ids)} part(s)")
+    return {"status": "success", "outbound_ids": outbound_ids, 
+            "initial_state_id": initial_state_id, "final_state_id": final_state_id}
+
+async def defer_message(form_dict: dict, error: CircuitOpenError):
+    """Store the raw message for process_deferred() and tell the user it's logged"""
+    message_sid = form_dict.get("MessageSid") or new_id()
+    sender = form_dict.get("From", "")
+    stored = await asyncio.to_thread(
+        db.defer_message, new_id(), message_sid, sender, form_dict, str(error)
+    )
+    print(f"Deferred message {message_sid} from {sender}: {error}")
+    # A webhook Twilio retried is already stored and answered
+    outbound_ids = outbound.enqueue(DEFERRED_REPLY, to=sender) if stored and sender else []
+    return {"status": "deferred", "reason": str(error), "outbound_ids": outbound_ids}
+
+async def process_deferred(wakeup: asyncio.Event):
+    """Work through messages deferred in degraded mode, oldest first, while the circuits allow it"""
+    while True:
+        try:
+            await asyncio.wait_for(wakeup.wait(), timeout=DEFERRED_POLL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+        wakeup.clear()
+        
+        # The first message through also probes an open circuit that is due for it
+        while circuit.openai_breaker.available() and circuit.twilio_breaker.available():
+            try:
+                now = datetime.now(timezone.utc).replace(tzinfo=None)
+                rows = await asyncio.to_thread(db.get_deferred, now, DEFERRED_BATCH)
+            except Exception as e:
+                print(f"Could not read deferred messages: {e}")
+                break
+            # Rows that failed for other reasons wait for the next poll
+            if not await process_deferred_batch(rows) or len(rows) < DEFERRED_BATCH:
+                break
+
+async def process_deferred_batch(rows) -> bool:
+    """Claim and process rows in order; False once a circuit is open again"""
+    if rows:
+        print(f"Processing {len(rows)} deferred message(s)")
+    for message_id, form_dict, attempts in rows:
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        claimed = await asyncio.to_thread(
+            db.claim_deferred, message_id, now, now + timedelta(seconds=DEFERRED_LEASE_SECONDS)
+        )
+        if not claimed:
+            # Taken by another worker in the meantime
+            continue
+        try:
+            with media_store.request_scope():
+                await process_message(form_dict, time.monotonic())
+        except CircuitOpenError as e:
+            # Still down; it stays first in line
+            await asyncio.to_thread(db.finish_deferred, message_id, "pending", str(e), attempted=False)
+            return False
+        except Exception as e:
+            print(f"Error processing deferred message {message_id}: {e}")
+            status = "failed" if attempts + 1 >= DEFERRED_MAX_ATTEMPTS else "pending"
+            await asyncio.to_thread(db.finish_deferred, message_id, status, str(e)[:300])
+            continue
+        await asyncio.to_thread(db.finish_deferred, message_id, "done")
+    return True
+
 @app.get("/")
 async def root():
-    return {"message": "Nutrition Bot is running"} 
\ No newline at end of file
+    return {"message": "Nutrition Bot is running"}
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """Hit rate and size of the in-process caches"""
+    return {
+        "daily_context": db.context_cache.stats(),
+        "summaries": summary_cache.stats(),
+        "meal_memory": meal_memory.stats(),
+    }
+
+@app.get("/media/stats")
+async def media_stats():
+    """Spooled media in memory and on disk, and janitor activity"""
+    return media_store.stats()
+
+@app.get("/outbound/stats")
+async def outbound_stats():
+    """Delivery counts, errors and latency of the outbound queue"""
+    return {**outbound.stats(), "progress": progress.stats()}
+
+@app.get("/checkpoints/stats")
+async def checkpoint_stats():
+    """Runs held in memory and rows written behind them"""
+    if workflow.checkpointer is None:
+        return {"backend": "off"}
+    return workflow.checkpointer.stats()
+
+@app.get("/inbox/stats")
+async def inbox_stats():
+    """Write-ahead log segments, fsync batching and compactions"""
+    return inbox.stats()
+
+@app.get("/health")
+async def health():
+    """Circuit breaker states, and messages waiting for them to close"""
+    try:
+        deferred = await asyncio.to_thread(db.count_deferred)
+    except Exception as e:
+        deferred = f"unavailable: {e}"
+    return {
+        "status": "degraded" if circuit.degraded() else "ok",
+        "circuits": circuit.stats(),
+        "deferred_messages": deferred,
+    }
@@ -0,0 +1,139 @@
+# Voice note preprocessing: decode, trim silence with an energy-based VAD,
+# and split long notes at pauses so chunks can be transcribed in parallel
+
+from typing import List, Tuple
+import io
+import os
+import subprocess
+import wave
+
+import numpy as np
+
+SAMPLE_RATE = 16000
+FRAME_MS = 30
+# Keep this much audio around speech when trimming, so words aren't clipped
+PAD_MS = 200
+# Chunks aim for this length and are never longer than MAX_CHUNK_SECONDS
+TARGET_CHUNK_SECONDS = float(os.getenv("AUDIO_TARGET_CHUNK_SECONDS", "20"))
+MAX_CHUNK_SECONDS = float(os.getenv("AUDIO_MAX_CHUNK_SECONDS", "30"))
+# A pause must be at least this long to cut at
+MIN_PAUSE_MS = 250
+# Speech is this many dB above the noise floor
+SPEECH_MARGIN_DB = 12.0
+# ...and never quieter than this
+MIN_SPEECH_DB = -50.0
+
+
+def decode_audio(data: bytes) -> np.ndarray:
+    """
+    Decode any ffmpeg-readable payload (WhatsApp sends OGG/Opus) to mono
+    16 kHz float32 samples in [-1, 1]
+    """
+    try:
+        process = subprocess.run(
+            ["ffmpeg", "-nostdin", "-loglevel", "error", "-i", "pipe:0",
+             "-f", "s16le", "-acodec", "pcm_s16le", "-ac", "1", "-ar", str(SAMPLE_RATE), "pipe:1"],
+            input=data, capture_output=True, check=True, timeout=60,
+        )
+    except FileNotFoundError:
+        raise RuntimeError("ffmpeg is not installed")
+    except subprocess.CalledProcessError as e:
+        raise RuntimeError(f"ffmpeg could not decode the audio: {e.stderr.decode(errors='replace').strip()}")
+    return np.frombuffer(process.stdout, dtype=np.int16).astype(np.float32) / 32768.0
+
+
+def encode_wav(samples: np.ndarray) -> bytes:
+    """16-bit PCM WAV, accepted by every transcription backend"""
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(SAMPLE_RATE)
+        wav.writeframes((np.clip(samples, -1.0, 1.0) * 32767).astype(np.int16).tobytes())
+    return buffer.getvalue()
+
+
+def frame_energy(samples: np.ndarray, frame_ms: int = FRAME_MS) -> np.ndarray:
+    """RMS energy per frame, in dBFS"""
+    frame = SAMPLE_RATE * frame_ms // 1000
+    n_frames = len(samples) // frame
+    if n_frames == 0:
+        return np.zeros(0, dtype=np.float32)
+    frames = samples[:n_frames * frame].reshape(n_frames, frame)
+    rms = np.sqrt(np.mean(frames ** 2, axis=1))
+    return 20 * np.log10(np.maximum(rms, 1e-10))
+
+
+def voiced_frames(samples: np.ndarray) -> np.ndarray:
+    """
+    Boolean speech mask per frame
+
+    The threshold adapts to the recording: a margin above the noise floor
+    (the quiet end of the energy distribution), but at least MIN_SPEECH_DB.
+    """
+    energy = frame_energy(samples)
+    if len(energy) == 0:
+        return np.zeros(0, dtype=bool)
+    noise_floor = np.percentile(energy, 10)
+    return energy > max(noise_floor + SPEECH_MARGIN_DB, MIN_SPEECH_DB)
+
+
+def trim_silence(samples: np.ndarray) -> np.ndarray:
+    """Drop leading and trailing silence; empty if there's no speech at all"""
+    voiced = voiced_frames(samples)
+    if not voiced.any():
+        return samples[:0]
+    frame = SAMPLE_RATE * FRAME_MS // 1000
+    pad = SAMPLE_RATE * PAD_MS // 1000
+    first = np.argmax(voiced)
+    last = len(voiced) - np.argmax(voiced[::-1])
+    return samples[max(0, first * frame - pad):min(len(samples), last * frame + pad)]
+
+
+def split_on_silence(samples: np.ndarray, target_seconds: float = TARGET_CHUNK_SECONDS,
+                     max_seconds: float = MAX_CHUNK_SECONDS) -> List[Tuple[int, int]]:
+    """
+    Cut points for long audio, as (start, end) sample ranges in order
+
+    Each chunk ends in the longest pause between target_seconds and
+    max_seconds from its start (cut in the middle of the pause); without a
+    pause in that window it's cut hard at max_seconds.
+    """
+    total = len(samples)
+    if total <= max_seconds * SAMPLE_RATE:
+        return [(0, total)]
+
+    frame = SAMPLE_RATE * FRAME_MS // 1000
+    silent = ~voiced_frames(samples)
+    min_pause = max(1, MIN_PAUSE_MS // FRAME_MS)
+
+    # Runs of silent frames as (start_frame, length)
+    edges = np.diff(np.concatenate(([0], silent.astype(np.int8), [0])))
+    run_starts = np.flatnonzero(edges == 1)
+    run_lengths = np.flatnonzero(edges == -1) - run_starts
+    keep = run_lengths >= min_pause
+    pause_middles = (run_starts[keep] + run_lengths[keep] // 2) * frame
+    pause_lengths = run_lengths[keep]
+
+    chunks = []
+    start = 0
+    while total - start > max_seconds * SAMPLE_RATE:
+        low = start + int(target_seconds * SAMPLE_RATE)
+        high = start + int(max_seconds * SAMPLE_RATE)
+        in_window = (pause_middles > low) & (pause_middles <= high)
+        if in_window.any():
+            cut = int(pause_middles[in_window][np.argmax(pause_lengths[in_window])])
+        else:
+            cut = high
+        chunks.append((start, cut))
+        start = cut
+    chunks.append((start, total))
+    return chunks
+
+
+def prepare_chunks(data: bytes) -> List[bytes]:
+    """Decode, trim and split a voice note into WAV chunks, in order"""
+    samples = trim_silence(decode_audio(data))
+    if len(samples) == 0:
+        return []
+    return [encode_wav(samples[start:end]) for start, end in split_on_silence(samples)]
@@ -0,0 +1,322 @@
+# In-process caches shared by every Database instance in a worker
+
+from collections import OrderedDict
+from datetime import date
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+import os
+import threading
+import uuid
+
+from app.date_parser import local_date
+from app.models import DailyContext, MealContext, MealEntry
+
+# Same window the context query uses (last N meals)
+CONTEXT_WINDOW = 10
+
+# Topic used to announce meal writes to other workers
+MEAL_TOPIC = "meal_entries"
+
+
+class LocalPubSub:
+    """
+    In-process stand-in for a pub/sub channel (e.g. Redis or Postgres NOTIFY).
+
+    Every cache subscribes to the same bus; a write in one worker is
+    published so that the caches of the other workers drop their copy.
+    """
+
+    def __init__(self):
+        self._subscribers: Dict[str, List[Callable[[Dict[str, Any]], None]]] = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, topic: str, callback: Callable[[Dict[str, Any]], None]):
+        with self._lock:
+            self._subscribers.setdefault(topic, []).append(callback)
+
+    def unsubscribe(self, topic: str, callback: Callable[[Dict[str, Any]], None]):
+        with self._lock:
+            if callback in self._subscribers.get(topic, []):
+                self._subscribers[topic].remove(callback)
+
+    def publish(self, topic: str, message: Dict[str, Any]):
+        with self._lock:
+            callbacks = list(self._subscribers.get(topic, []))
+        for callback in callbacks:
+            try:
+                callback(message)
+            except Exception as e:
+                print(f"Error in subscriber for {topic}: {e}")
+
+
+class DailyContextCache:
+    """
+    Read-through, size-bounded LRU cache of DailyContext objects per user.
+
+    Writes are applied incrementally (running totals are adjusted instead of
+    re-summed) and announced on the bus so other workers can invalidate.
+    """
+
+    def __init__(self, max_users: int = 1024, bus: Optional[LocalPubSub] = None,
+                 window: int = CONTEXT_WINDOW):
+        self.max_users = max_users
+        self.window = window
+        self.bus = bus
+        self.cache_id = uuid.uuid4().hex
+        self._entries: "OrderedDict[str, DailyContext]" = OrderedDict()
+        self._lock = threading.RLock()
+        # Bumped on every write so that a load racing with a write is discarded
+        self._write_counter = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+        if bus is not None:
+            bus.subscribe(MEAL_TOPIC, self._on_meal_event)
+
+    # Reads
+    def get(self, user_id: str) -> Optional[DailyContext]:
+        """Return a copy of the cached context, or None on a miss"""
+        with self._lock:
+            context = self._entries.get(user_id)
+            if context is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return context.model_copy(deep=True)
+
+    def write_marker(self) -> int:
+        """Take before loading from the database; pass to put()"""
+        with self._lock:
+            return self._write_counter
+
+    def put(self, user_id: str, context: DailyContext, marker: Optional[int] = None):
+        """Store a freshly loaded context unless a write happened since the load started"""
+        with self._lock:
+            if marker is not None and marker != self._write_counter:
+                return
+            self._entries[user_id] = context.model_copy(deep=True)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_users:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    # Incremental writes
+    def add_meal(self, user_id: str, meal: MealContext):
+        """Prepend a newly inserted meal and adjust the running totals"""
+        with self._lock:
+            self._write_counter += 1
+            context = self._entries.get(user_id)
+            if context is not None:
+                context.meals.insert(0, meal)
+                _apply_delta(context, meal, 1)
+                while len(context.meals) > self.window:
+                    _apply_delta(context, context.meals.pop(), -1)
+        self._publish(user_id, "insert", meal.created_at)
+
+    def update_meal(self, user_id: str, meal_id: str, meal_entry: MealEntry, created_at=None):
+        """Replace a cached meal's values and adjust totals by the difference"""
+        day = created_at
+        with self._lock:
+            self._write_counter += 1
+            context = self._entries.get(user_id)
+            if context is not None:
+                for meal in context.meals:
+                    if meal.id == meal_id:
+                        day = meal.created_at
+                        _apply_delta(context, meal, -1)
+                        meal.meal_name = meal_entry.meal_name
+                        meal.meal_description = meal_entry.meal_description
+                        meal.meal_calories = meal_entry.meal_calories
+                        meal.meal_protein = meal_entry.meal_protein
+                        meal.meal_carbs = meal_entry.meal_carbs
+                        meal.meal_fat = meal_entry.meal_fat
+                        _apply_delta(context, meal, 1)
+                        break
+        self._publish(user_id, "update", day)
+
+    def remove_meal(self, user_id: str, meal_id: str, created_at=None):
+        """Drop a deleted meal from the window and subtract it from the totals"""
+        day = created_at
+        with self._lock:
+            self._write_counter += 1
+            context = self._entries.get(user_id)
+            if context is not None:
+                for index, meal in enumerate(context.meals):
+                    if meal.id == meal_id:
+                        day = meal.created_at
+                        if len(context.meals) >= self.window:
+                            # The next-older meal slides into the window but
+                            # isn't cached, so reload on the next read
+                            del self._entries[user_id]
+                            self.invalidations += 1
+                        else:
+                            _apply_delta(context, context.meals.pop(index), -1)
+                        break
+        self._publish(user_id, "delete", day)
+
+    # Invalidation
+    def invalidate(self, user_id: str, publish: bool = True):
+        with self._lock:
+            self._write_counter += 1
+            if self._entries.pop(user_id, None) is not None:
+                self.invalidations += 1
+        if publish:
+            self._publish(user_id, "invalidate", None)
+
+    def clear(self):
+        with self._lock:
+            self._write_counter += 1
+            self._entries.clear()
+
+    def _on_meal_event(self, message: Dict[str, Any]):
+        # Our own writes were already applied incrementally
+        if message.get("origin") == self.cache_id:
+            return
+        self.invalidate(message["user_id"], publish=False)
+
+    def _publish(self, user_id: str, operation: str, created_at):
+        if self.bus is None:
+            return
+        self.bus.publish(MEAL_TOPIC, {
+            "origin": self.cache_id,
+            "user_id": user_id,
+            "operation": operation,
+            # The user's day, which rollups and summaries are keyed by
+            "day": local_date(user_id, created_at),
+        })
+
+    # Metrics
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_users": self.max_users,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+class SummaryCache:
+    """
+    LRU cache of rendered summaries keyed by (user, start, end, data version)
+
+    Meal writes announce the day they touched on the bus; only summaries
+    whose range contains that day are dropped. A write whose day isn't known
+    bumps the user's data version instead, retiring all their entries at once.
+    """
+
+    def __init__(self, max_entries: int = 4096, bus: Optional[LocalPubSub] = None):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, date, date, int], str]" = OrderedDict()
+        self._by_user: Dict[str, Set[Tuple[str, date, date, int]]] = {}
+        self._versions: Dict[str, int] = {}
+        # Write sequence numbers, to discard summaries built while a write landed
+        self._write_seq = 0
+        self._last_write: Dict[str, int] = {}
+        self._lock = threading.RLock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+        if bus is not None:
+            bus.subscribe(MEAL_TOPIC, self._on_meal_event)
+
+    def _key(self, user_id: str, start_date: date, end_date: date):
+        return (user_id, start_date, end_date, self._versions.get(user_id, 0))
+
+    def get(self, user_id: str, start_date: date, end_date: date) -> Optional[str]:
+        with self._lock:
+            key = self._key(user_id, start_date, end_date)
+            summary = self._entries.get(key)
+            if summary is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return summary
+
+    def write_marker(self) -> int:
+        """Take before building a summary; pass to put()"""
+        with self._lock:
+            return self._write_seq
+
+    def put(self, user_id: str, start_date: date, end_date: date, summary: str,
+            marker: Optional[int] = None):
+        with self._lock:
+            if marker is not None and self._last_write.get(user_id, -1) > marker:
+                return
+            key = self._key(user_id, start_date, end_date)
+            self._entries[key] = summary
+            self._entries.move_to_end(key)
+            self._by_user.setdefault(user_id, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                old_key, _ = self._entries.popitem(last=False)
+                self._forget(old_key)
+                self.evictions += 1
+
+    def invalidate(self, user_id: str, day: Optional[date] = None):
+        """Drop the user's summaries covering day, or all of them if day is None"""
+        with self._lock:
+            self._write_seq += 1
+            self._last_write[user_id] = self._write_seq
+            if day is None:
+                self._versions[user_id] = self._versions.get(user_id, 0) + 1
+                stale = list(self._by_user.get(user_id, ()))
+            else:
+                stale = [key for key in self._by_user.get(user_id, ())
+                         if key[1] <= day <= key[2]]
+            for key in stale:
+                if self._entries.pop(key, None) is not None:
+                    self.invalidations += 1
+                self._forget(key)
+
+    def _forget(self, key):
+        keys = self._by_user.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_user[key[0]]
+
+    def _on_meal_event(self, message: Dict[str, Any]):
+        self.invalidate(message["user_id"], message.get("day"))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+def _apply_delta(context: DailyContext, meal, sign: int):
+    context.total_calories += sign * meal.meal_calories
+    context.total_protein += sign * meal.meal_protein
+    context.total_carbs += sign * meal.meal_carbs
+    context.total_fat += sign * meal.meal_fat
+
+
+# Shared by all Database instances in this process (app, Meal_Tracker, ...)
+meal_events = LocalPubSub()
+daily_context_cache = DailyContextCache(
+    max_users=int(os.getenv("CONTEXT_CACHE_SIZE", "1024")),
+    bus=meal_events,
+)
+summary_cache = SummaryCache(
+    max_entries=int(os.getenv("SUMMARY_CACHE_SIZE", "4096")),
+    bus=meal_events,
+)
@@ -0,0 +1,257 @@
+# Workflow checkpoints, kept in memory for the run and written behind it to
+# the database, so a failed or interrupted run resumes from its last node
+
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Sequence
+import os
+import queue
+import threading
+import time
+
+from langgraph.checkpoint.memory import MemorySaver
+
+# "database" (write-behind), "memory" (in-process retries only) or "off"
+GRAPH_CHECKPOINTS = os.getenv("GRAPH_CHECKPOINTS", "database")
+# Runs nobody finished or resumed for this long are deleted
+CHECKPOINT_MAX_AGE_HOURS = float(os.getenv("CHECKPOINT_MAX_AGE_HOURS", "24"))
+CHECKPOINT_SWEEP_SECONDS = float(os.getenv("CHECKPOINT_SWEEP_SECONDS", "600"))
+# Jobs written per commit by the background writer
+CHECKPOINT_BATCH = 200
+
+
+class WriteBehindSaver(MemorySaver):
+    """
+    LangGraph checkpointer that serves the run from memory and persists behind it
+
+    put() and put_writes() only update memory and queue the rows; a writer
+    thread stores them in graph_checkpoints / graph_checkpoint_writes in
+    batches, so no graph step waits on the database. A run that isn't in
+    memory (after a restart) is loaded from the database on first access.
+    Completed runs are deleted with delete_thread(); runs nobody resumed
+    are swept after CHECKPOINT_MAX_AGE_HOURS.
+
+    A crash can lose the last few queued rows; the run then resumes from
+    an earlier node, which is still far cheaper than starting over.
+    """
+
+    def __init__(self, db):
+        super().__init__()
+        self.db = db
+        self._jobs: "queue.Queue" = queue.Queue()
+        self._loaded = set()
+        # Runs deleted by the batch being written (writer thread only)
+        self._deleted: List[str] = []
+        self._lock = threading.Lock()
+        self._writer = threading.Thread(target=self._write_loop, name="checkpoint-writer", daemon=True)
+        self._writer.start()
+
+        self.checkpoints_written = 0
+        self.writes_written = 0
+        self.threads_loaded = 0
+        self.threads_deleted = 0
+        self.threads_swept = 0
+        self.write_errors = 0
+
+    # Reads
+    def _ensure_loaded(self, thread_id: str):
+        with self._lock:
+            if thread_id in self._loaded:
+                return
+            self._loaded.add(thread_id)
+        checkpoints, writes = self.db.load_checkpoints(thread_id)
+        if not checkpoints:
+            return
+        for ns, checkpoint_id, parent_id, c_type, checkpoint, m_type, metadata in checkpoints:
+            self.storage[thread_id][ns][checkpoint_id] = (
+                (c_type, bytes(checkpoint)), (m_type, bytes(metadata)), parent_id
+            )
+        for ns, checkpoint_id, task_id, idx, channel, v_type, value, task_path in writes:
+            self.writes[(thread_id, ns, checkpoint_id)][(task_id, idx)] = (
+                task_id, channel, (v_type, bytes(value) if value is not None else None), task_path
+            )
+        self.threads_loaded += 1
+        print(f"Loaded {len(checkpoints)} checkpoint(s) for run {thread_id}")
+
+    def get_tuple(self, config):
+        self._ensure_loaded(config["configurable"]["thread_id"])
+        return super().get_tuple(config)
+
+    def list(self, config, **kwargs):
+        if config:
+            self._ensure_loaded(config["configurable"]["thread_id"])
+        return super().list(config, **kwargs)
+
+    # Writes
+    def put(self, config, checkpoint, metadata, new_versions):
+        result = super().put(config, checkpoint, metadata, new_versions)
+        thread_id = config["configurable"]["thread_id"]
+        ns = config["configurable"]["checkpoint_ns"]
+        (c_type, c_bytes), (m_type, m_bytes), parent_id = self.storage[thread_id][ns][checkpoint["id"]]
+        self._jobs.put(("checkpoint", {
+            "thread_id": thread_id, "checkpoint_ns": ns, "checkpoint_id": checkpoint["id"],
+            "parent_checkpoint_id": parent_id, "checkpoint_type": c_type, "checkpoint": c_bytes,
+            "metadata_type": m_type, "metadata": m_bytes,
+        }))
+        return result
+
+    def put_writes(self, config, writes: Sequence[tuple], task_id: str, task_path: str = ""):
+        super().put_writes(config, writes, task_id, task_path)
+        thread_id = config["configurable"]["thread_id"]
+        ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        for (saved_task, idx), (_, channel, (v_type, value), path) in list(
+                self.writes[(thread_id, ns, checkpoint_id)].items()):
+            if saved_task != task_id:
+                continue
+            self._jobs.put(("write", {
+                "thread_id": thread_id, "checkpoint_ns": ns, "checkpoint_id": checkpoint_id,
+                "task_id": task_id, "idx": idx, "channel": channel,
+                "value_type": v_type, "value": value, "task_path": path,
+            }))
+
+    # The in-memory saver's async methods call the sync ones, so they pick up the overrides
+    async def aget_tuple(self, config):
+        return self.get_tuple(config)
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        return self.put(config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config, writes, task_id, task_path: str = ""):
+        return self.put_writes(config, writes, task_id, task_path)
+
+    # Lifecycle of a run
+    def delete_thread(self, thread_id: str):
+        """Forget a run, here and (behind the caller) in the database"""
+        self.storage.pop(thread_id, None)
+        for key in [key for key in self.writes if key[0] == thread_id]:
+            self.writes.pop(key, None)
+        # Counts as loaded until the writer has deleted the rows, so they
+        # aren't read back in the meantime
+        with self._lock:
+            self._loaded.add(thread_id)
+        self._jobs.put(("delete", thread_id))
+
+    def evict(self, thread_id: str):
+        """Drop a run from memory only; it's reloaded from the database if resumed"""
+        self.storage.pop(thread_id, None)
+        for key in [key for key in self.writes if key[0] == thread_id]:
+            self.writes.pop(key, None)
+        with self._lock:
+            self._loaded.discard(thread_id)
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Wait for queued rows to be written; False on timeout"""
+        deadline = time.monotonic() + timeout
+        while self._jobs.unfinished_tasks:
+            if time.monotonic() > deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    # Writer
+    def _write_loop(self):
+        last_sweep = time.monotonic()
+        while True:
+            try:
+                jobs = [self._jobs.get(timeout=CHECKPOINT_SWEEP_SECONDS)]
+            except queue.Empty:
+                jobs = []
+            while jobs and len(jobs) < CHECKPOINT_BATCH:
+                try:
+                    jobs.append(self._jobs.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                if jobs:
+                    self._deleted = []
+                    self._write(jobs)
+                    # Committed: a later load finds nothing (or only newer rows)
+                    with self._lock:
+                        self._loaded.difference_update(self._deleted)
+            except Exception as e:
+                self.write_errors += 1
+                print(f"Could not write {len(jobs)} checkpoint row(s): {e}")
+            finally:
+                for _ in jobs:
+                    self._jobs.task_done()
+
+            if time.monotonic() - last_sweep >= CHECKPOINT_SWEEP_SECONDS:
+                last_sweep = time.monotonic()
+                self.sweep()
+
+    def _write(self, jobs: List[tuple]):
+        """Store a batch in order: consecutive rows of a kind go in one statement"""
+        with self.db.batch():
+            i = 0
+            while i < len(jobs):
+                kind = jobs[i][0]
+                j = i
+                while j < len(jobs) and jobs[j][0] == kind:
+                    j += 1
+                payloads = [job[1] for job in jobs[i:j]]
+                if kind == "checkpoint":
+                    self.db.save_checkpoints(payloads)
+                    self.checkpoints_written += len(payloads)
+                elif kind == "write":
+                    self.db.save_checkpoint_writes(payloads)
+                    self.writes_written += len(payloads)
+                else:
+                    self.db.delete_checkpoints(payloads)
+                    self.threads_deleted += len(payloads)
+                    self._deleted.extend(payloads)
+                i = j
+
+    def sweep(self) -> int:
+        """Delete runs nobody finished or resumed within CHECKPOINT_MAX_AGE_HOURS"""
+        try:
+            before = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(hours=CHECKPOINT_MAX_AGE_HOURS)
+            swept = self.db.delete_stale_checkpoints(before)
+        except Exception as e:
+            print(f"Checkpoint sweep failed: {e}")
+            return 0
+        if swept:
+            self.threads_swept += swept
+            print(f"Swept {swept} abandoned run(s) from graph_checkpoints")
+        return swept
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": "database",
+            "threads_in_memory": len(self.storage),
+            "queued_rows": self._jobs.qsize(),
+            "checkpoints_written": self.checkpoints_written,
+            "writes_written": self.writes_written,
+            "threads_loaded": self.threads_loaded,
+            "threads_deleted": self.threads_deleted,
+            "threads_swept": self.threads_swept,
+            "write_errors": self.write_errors,
+        }
+
+
+class RunMemorySaver(MemorySaver):
+    """In-memory checkpoints only: failed runs resume within the process"""
+
+    def delete_thread(self, thread_id: str):
+        self.evict(thread_id)
+
+    def evict(self, thread_id: str):
+        self.storage.pop(thread_id, None)
+        for key in [key for key in self.writes if key[0] == thread_id]:
+            self.writes.pop(key, None)
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": "memory", "threads_in_memory": len(self.storage)}
+
+
+def create_checkpointer(db, kind: str = GRAPH_CHECKPOINTS) -> Optional[MemorySaver]:
+    """The configured checkpointer, or None when checkpointing is off"""
+    if kind == "off":
+        return None
+    if kind == "memory":
+        return RunMemorySaver()
+    if kind == "database":
+        return WriteBehindSaver(db)
+    raise ValueError(f"Unknown GRAPH_CHECKPOINTS setting: {kind}")
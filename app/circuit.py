@@ -0,0 +1,238 @@
+# Circuit breakers around the services the bot depends on (OpenAI, speech
+# to text, Twilio): after repeated failures calls fail fast instead of
+# waiting out timeouts, and the bot switches to degraded mode
+
+from typing import Any, Callable, Dict, List, Optional
+import os
+import threading
+import time
+
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+# Seconds an open circuit waits before letting a probe call through
+CIRCUIT_RESET_SECONDS = float(os.getenv("CIRCUIT_RESET_SECONDS", "30"))
+# Client timeout for model calls; the SDK default of 10 minutes is what piles up workers
+OPENAI_TIMEOUT_SECONDS = float(os.getenv("OPENAI_TIMEOUT_SECONDS", "30"))
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "1"))
+
+# Degraded mode: messages that need a failing service are stored and answered with this
+DEFERRED_REPLY = os.getenv(
+    "DEFERRED_REPLY",
+    "📝 Got it, your message is logged. The analysis will follow as soon as I'm fully back."
+)
+# How often the backlog is checked when no circuit has closed in the meantime
+DEFERRED_POLL_SECONDS = float(os.getenv("DEFERRED_POLL_SECONDS", "30"))
+DEFERRED_BATCH = 100
+# A deferred message that fails for other reasons this often is given up on
+DEFERRED_MAX_ATTEMPTS = int(os.getenv("DEFERRED_MAX_ATTEMPTS", "3"))
+DEFERRED_LEASE_SECONDS = float(os.getenv("DEFERRED_LEASE_SECONDS", "300"))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling a service whose circuit is open"""
+
+    def __init__(self, name: str, retry_in: float):
+        super().__init__(f"{name} is unavailable (circuit open, retrying in {retry_in:.0f}s)")
+        self.name = name
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker
+
+    closed: calls go through; failure_threshold failures in a row open it.
+    open: calls raise CircuitOpenError until reset_seconds have passed.
+    half_open: one probe call goes through; success closes the circuit,
+    failure opens it again. A probe that never reports back (the caller
+    died) is given up on after reset_seconds and another one is let through.
+
+    Only exceptions is_failure() accepts count: a bad request or a parse
+    error says nothing about whether the service is up.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+                 reset_seconds: float = CIRCUIT_RESET_SECONDS,
+                 is_failure: Callable[[BaseException], bool] = None):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.is_failure = is_failure or (lambda e: True)
+
+        self.state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_started: Optional[float] = None
+        self._lock = threading.Lock()
+        self._listeners: List[Callable[[str, str], None]] = []
+
+        self.calls = 0
+        self.failures = 0
+        self.rejected = 0
+        self.opened = 0
+        self.last_error: Optional[str] = None
+
+    def add_listener(self, listener: Callable[[str, str], None]):
+        """listener(name, new_state) is called on every transition, from the caller's thread"""
+        self._listeners.append(listener)
+
+    def _transition(self, state: str):
+        # Caller holds the lock; listeners run after it's released
+        self.state = state
+        if state == OPEN:
+            self._opened_at = time.monotonic()
+            self.opened += 1
+        self._probe_started = None
+        return state
+
+    def _notify(self, state: Optional[str]):
+        if state is None:
+            return
+        print(f"Circuit {self.name} is now {state}")
+        for listener in self._listeners:
+            try:
+                listener(self.name, state)
+            except Exception as e:
+                print(f"Circuit listener error: {e}")
+
+    def retry_in(self) -> float:
+        """Seconds until an open circuit lets a probe through (0 if it would now)"""
+        with self._lock:
+            if self.state == CLOSED:
+                return 0.0
+            return max(0.0, self._opened_at + self.reset_seconds - time.monotonic())
+
+    def available(self) -> bool:
+        """Whether a call could go through now (closed, or due for a probe), without taking it"""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            now = time.monotonic()
+            if self.state == OPEN:
+                return now - self._opened_at >= self.reset_seconds
+            return self._probe_started is None or now - self._probe_started >= self.reset_seconds
+
+    def allow(self) -> bool:
+        """Take permission for one call; report its outcome with record_success/record_failure"""
+        changed = None
+        with self._lock:
+            now = time.monotonic()
+            if self.state == OPEN and now - self._opened_at >= self.reset_seconds:
+                changed = self._transition(HALF_OPEN)
+            if self.state == CLOSED:
+                allowed = True
+            elif self.state == HALF_OPEN and (
+                    self._probe_started is None or now - self._probe_started >= self.reset_seconds):
+                self._probe_started = now
+                allowed = True
+            else:
+                allowed = False
+                self.rejected += 1
+        self._notify(changed)
+        return allowed
+
+    def record_success(self):
+        changed = None
+        with self._lock:
+            self.calls += 1
+            self._failures = 0
+            if self.state != CLOSED:
+                changed = self._transition(CLOSED)
+        self._notify(changed)
+
+    def record_failure(self, error: BaseException = None):
+        changed = None
+        with self._lock:
+            self.calls += 1
+            self.failures += 1
+            self._failures += 1
+            if error is not None:
+                self.last_error = f"{type(error).__name__}: {error}"[:300]
+            if self.state == HALF_OPEN or (self.state == CLOSED and self._failures >= self.failure_threshold):
+                changed = self._transition(OPEN)
+        self._notify(changed)
+
+    def _check(self):
+        if not self.allow():
+            raise CircuitOpenError(self.name, self.retry_in())
+
+    def _record(self, error: BaseException):
+        if self.is_failure(error):
+            self.record_failure(error)
+        else:
+            # The service answered; the request itself was the problem
+            self.record_success()
+
+    def call(self, fn: Callable, *args, **kwargs):
+        """fn(*args, **kwargs) through the breaker"""
+        self._check()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            self._record(e)
+            raise
+        self.record_success()
+        return result
+
+    async def acall(self, fn: Callable, *args, **kwargs):
+        """await fn(*args, **kwargs) through the breaker"""
+        self._check()
+        try:
+            result = await fn(*args, **kwargs)
+        except Exception as e:
+            self._record(e)
+            raise
+        self.record_success()
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = {
+                "state": self.state,
+                "consecutive_failures": self._failures,
+                "calls": self.calls,
+                "failures": self.failures,
+                "rejected": self.rejected,
+                "opened": self.opened,
+                "last_error": self.last_error,
+            }
+        stats["retry_in_seconds"] = round(self.retry_in(), 1)
+        return stats
+
+
+def _openai_outage(error: BaseException) -> bool:
+    import openai
+    return isinstance(error, (openai.APIConnectionError, openai.InternalServerError,
+                              openai.RateLimitError))
+
+
+def _twilio_outage(error: BaseException) -> bool:
+    import httpx
+    import requests
+    from twilio.base.exceptions import TwilioRestException
+    if isinstance(error, (requests.ConnectionError, requests.Timeout, httpx.TransportError)):
+        return True
+    if isinstance(error, requests.HTTPError) and error.response is not None:
+        return error.response.status_code >= 500
+    if isinstance(error, TwilioRestException):
+        return error.status >= 500
+    return False
+
+
+openai_breaker = CircuitBreaker("openai", is_failure=_openai_outage)
+transcription_breaker = CircuitBreaker("transcription", is_failure=_openai_outage)
+twilio_breaker = CircuitBreaker("twilio", is_failure=_twilio_outage)
+
+BREAKERS = {breaker.name: breaker for breaker in (openai_breaker, transcription_breaker, twilio_breaker)}
+
+
+def degraded() -> bool:
+    """Whether any dependency is currently failing fast"""
+    return any(breaker.state != CLOSED for breaker in BREAKERS.values())
+
+
+def stats() -> Dict[str, Any]:
+    return {name: breaker.stats() for name, breaker in BREAKERS.items()}
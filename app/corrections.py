@@ -0,0 +1,215 @@
+# Local parser for corrections to meals that were already logged ("actually
+# it was 2 eggs, not 3", "make that 450 kcal", "delete the last one")
+
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+import re
+
+from app.date_parser import NUMBER_WORDS
+from app.models import MealEntry
+
+# How many of the latest meals a correction can refer to
+CORRECTION_WINDOW = 5
+
+NUTRIENT_WORDS = {
+    "kcal": "meal_calories", "calories": "meal_calories", "calorie": "meal_calories",
+    "cal": "meal_calories", "kalorien": "meal_calories",
+    "protein": "meal_protein", "eiweiß": "meal_protein", "eiweiss": "meal_protein",
+    "carbs": "meal_carbs", "carb": "meal_carbs", "carbohydrates": "meal_carbs",
+    "kohlenhydrate": "meal_carbs", "kh": "meal_carbs",
+    "fat": "meal_fat", "fats": "meal_fat", "fett": "meal_fat",
+}
+
+PORTION_WORDS = {
+    "half": 0.5, "halbe": 0.5, "hälfte": 0.5, "haelfte": 0.5, "halb": 0.5,
+    "third": 1 / 3, "drittel": 1 / 3,
+    "quarter": 0.25, "viertel": 0.25,
+    "double": 2.0, "twice": 2.0, "doppelte": 2.0, "doppelt": 2.0,
+}
+
+_NUMBER = r"\d+|" + "|".join(sorted((w for w in NUMBER_WORDS if len(w) > 1), key=len, reverse=True))
+_NUTRIENT = "|".join(sorted(NUTRIENT_WORDS, key=len, reverse=True))
+_PORTION = "|".join(sorted(PORTION_WORDS, key=len, reverse=True))
+
+_DELETE = re.compile(
+    r"^(?:please\s+|bitte\s+)?(?:"
+    r"(?:delete|remove|undo|cancel|drop)\s+(?:the\s+|my\s+)?(?:last|that|this|previous|it)(?:\s+(?:meal|one|entry|log))?"
+    r"|(?:lösche|loesche|entferne|streiche)\s+(?:die\s+|das\s+|den\s+)?(?:letzte|letzten|das)(?:\s+(?:mahlzeit|eintrag))?"
+    r"|undo|rückgängig|rueckgaengig)(?:\s+please|\s+bitte)?$"
+)
+# Words that make a number a correction rather than a new meal
+_MARKER = re.compile(
+    r"\b(?:actually|correction|correct|make (?:it|that)|change (?:it|that)|it was|that was|"
+    r"it were|there were|was only|were only|i meant|eigentlich|korrektur|korrigier\w*|"
+    r"es war|es waren|das war|das waren|waren nur|war nur|ich meinte|mach daraus)\b"
+)
+# Words that set a correction apart from a new meal, for the router's shortcut
+_CUE = re.compile(
+    _MARKER.pattern + r"|\b(?:not|nicht|instead|statt|anstatt|anstelle|sondern|war|waren)\b"
+)
+_SET = re.compile(r"\b(?P<value>\d+)\s*(?:g\s*|gramm?\s*)?(?P<nutrient>" + _NUTRIENT + r")\b")
+_COUNT = re.compile(
+    r"\b(?P<new>" + _NUMBER + r")\s+(?P<item>[a-zäöüß]+)\s*,?\s+"
+    r"(?:not|nicht|instead of|statt|anstatt|anstelle von)\s+(?P<old>" + _NUMBER + r")\b"
+    r"(?:\s+(?P<old_item>[a-zäöüß]+))?"
+)
+_COUNT_BUT = re.compile(
+    r"\b(?:not|nicht)\s+(?P<old>" + _NUMBER + r")(?:\s+(?P<old_item>[a-zäöüß]+))?\s*,?\s+(?:but|sondern)\s+"
+    r"(?P<new>" + _NUMBER + r")\s+(?P<item>[a-zäöüß]+)"
+)
+_SCALE = re.compile(r"\b(?P<portion>" + _PORTION + r")\b")
+# A meal name listing several foods can't be scaled by one item's count
+_COMPOUND = re.compile(r",|&|\+|\b(?:and|with|und|mit)\b")
+
+
+@dataclass
+class Correction:
+    """An edit to one of the latest meals, resolved from a message"""
+    kind: str                                       # delete, set, scale, count
+    values: Dict[str, int] = field(default_factory=dict)   # set: field -> new value
+    factor: Optional[float] = None                  # scale
+    item: Optional[str] = None                      # count
+    old_count: Optional[int] = None
+    new_count: Optional[int] = None
+
+
+def _number(word: str) -> int:
+    return int(word) if word.isdigit() else NUMBER_WORDS[word]
+
+
+def _normalize(message: str) -> str:
+    return " ".join(message.lower().replace("’", "'").split()).strip(" .!")
+
+
+def parse_correction(message: str) -> Optional[Correction]:
+    """Resolve a correction, or None if the message isn't one we can read locally"""
+    if not message:
+        return None
+    text = _normalize(message)
+
+    if _DELETE.match(text):
+        return Correction("delete")
+
+    for pattern in (_COUNT, _COUNT_BUT):
+        match = pattern.search(text)
+        if match:
+            old, new = _number(match.group("old")), _number(match.group("new"))
+            # "2 eggs instead of 3 pancakes" swaps one food for another
+            if _other_item(match.group("old_item"), match.group("item")):
+                continue
+            if old > 0 and old != new:
+                return Correction("count", item=match.group("item"), old_count=old, new_count=new)
+
+    if not _MARKER.search(text):
+        return None
+
+    values = {}
+    for match in _SET.finditer(text):
+        values[NUTRIENT_WORDS[match.group("nutrient")]] = int(match.group("value"))
+    if values:
+        return Correction("set", values=values)
+
+    match = _SCALE.search(text)
+    if match:
+        return Correction("scale", factor=PORTION_WORDS[match.group("portion")])
+    return None
+
+
+def local_correction(message: str, recent_meals) -> Optional[Correction]:
+    """
+    A correction the router can hand straight to the corrector, or None to
+    let the model route the message
+
+    Besides parsing, it needs a correction cue ("actually", "not", "war",
+    "statt") and, for a count, a recent meal naming the item.
+    """
+    correction = parse_correction(message)
+    if correction is None or not recent_meals:
+        return None
+    if correction.kind != "delete" and not _CUE.search(_normalize(message)):
+        return None
+    if correction.item and pick_target(recent_meals, correction) is None:
+        return None
+    return correction
+
+
+def _other_item(old_item: Optional[str], item: str) -> bool:
+    return bool(old_item) and not set(_stems(old_item)) & set(_stems(item))
+
+
+def _stems(item: str) -> List[str]:
+    """Rough singular forms, so "eggs" finds "egg" and "eier" finds "ei" """
+    stems = {item}
+    for suffix in ("es", "s", "er", "en", "n"):
+        if item.endswith(suffix) and len(item) - len(suffix) >= 2:
+            stems.add(item[:-len(suffix)])
+    return sorted(stems, key=len)
+
+
+def mentions(row, item: str) -> bool:
+    text = f"{row.meal_name} {row.meal_description or ''}".lower()
+    return any(re.search(rf"\b{re.escape(stem)}", text) for stem in _stems(item))
+
+
+def pick_target(recent_meals, correction: Optional[Correction], message: str = ""):
+    """
+    The meal a correction is about: the latest one naming its item, else the
+    latest one the message names ("the pasta was half"), else the latest one
+    """
+    if not recent_meals:
+        return None
+    if correction is not None and correction.item:
+        for row in recent_meals:
+            if mentions(row, correction.item):
+                return row
+        return None
+    words = set(re.findall(r"\w{4,}", message.lower()))
+    for row in recent_meals:
+        if words & set(re.findall(r"\w{4,}", row.meal_name.lower())):
+            return row
+    return recent_meals[0]
+
+
+def apply_correction(correction: Correction, row) -> Optional[MealEntry]:
+    """
+    The corrected meal, or None if the edit needs the model
+
+    Count edits are only applied locally when the meal is just that item
+    ("3 eggs"), since the share of one food in a mixed meal is unknown.
+    """
+    meal = MealEntry(
+        id=str(row.id),
+        meal_name=row.meal_name,
+        meal_description=row.meal_description or "",
+        meal_calories=row.meal_calories or 0,
+        meal_protein=row.meal_protein or 0,
+        meal_carbs=row.meal_carbs or 0,
+        meal_fat=row.meal_fat or 0,
+    )
+    if correction.kind == "set":
+        return meal.model_copy(update=correction.values)
+    if correction.kind == "scale":
+        return _scaled(meal, correction.factor)
+    if correction.kind == "count":
+        if _COMPOUND.search(meal.meal_name.lower()) or not mentions(row, correction.item):
+            return None
+        scaled = _scaled(meal, correction.new_count / correction.old_count)
+        old = re.compile(rf"\b(?:{correction.old_count}|{_word_for(correction.old_count)})\b", re.IGNORECASE)
+        scaled.meal_name = old.sub(str(correction.new_count), scaled.meal_name, count=1)
+        scaled.meal_description = old.sub(str(correction.new_count), scaled.meal_description, count=1)
+        return scaled
+    return None
+
+
+def _scaled(meal: MealEntry, factor: float) -> MealEntry:
+    return meal.model_copy(update={
+        "meal_calories": round(meal.meal_calories * factor),
+        "meal_protein": round(meal.meal_protein * factor),
+        "meal_carbs": round(meal.meal_carbs * factor),
+        "meal_fat": round(meal.meal_fat * factor),
+    })
+
+
+def _word_for(number: int) -> str:
+    words = [word for word, value in NUMBER_WORDS.items() if value == number and len(word) > 1]
+    return "|".join(words) if words else str(number)
@@ -1,20 +1,99 @@
-# Database connection to supabase
+# Database connection to supabase (Postgres) or a local SQLite file
 
-from sqlalchemy import create_engine, text
+from abc import ABC, abstractmethod
+from sqlalchemy import DateTime, bindparam, text
+from contextlib import contextmanager
 from dotenv import load_dotenv
 import os
-from datetime import datetime
-import uuid
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List
+import threading
 from app.models import MealEntry, MealContext, DailyContext
+from app.cache import daily_context_cache
+from app.ids import new_id
+from app.date_parser import local_date
 from langchain_core.tools import tool
 import json
 
 load_dotenv(override=True)
 
-class Database:
-    def __init__(self):
-        self.engine = create_engine(os.getenv("DATABASE_URL"))
-        self.connection = self.engine.connect()
+# Used when DATABASE_URL is not set, so the bot can run without a network database
+DEFAULT_DATABASE_URL = "sqlite:///nutrition_bot.db"
+
+class Database(ABC):
+    """
+    Storage backend interface for the bot.
+
+    Queries shared by every backend live here; dialect-specific pieces
+    (engine setup, table discovery, column types) are implemented by
+    PostgresDatabase and SQLiteDatabase in app/storage. Calling Database()
+    picks the implementation from DATABASE_URL.
+    """
+
+    # Column type used for JSON payloads
+    json_type = "JSONB"
+    # Column type used for row IDs (time-ordered UUIDv7 values)
+    id_type = "UUID"
+    # Column type used for binary payloads
+    blob_type = "BYTEA"
+    # Create missing tables on startup instead of asking for init_db
+    auto_create_tables = False
+
+    def __new__(cls, url: str = None):
+        if cls is Database:
+            cls = backend_for_url(url or os.getenv("DATABASE_URL") or DEFAULT_DATABASE_URL)
+        return super().__new__(cls)
+
+    def __init__(self, url: str = None):
+        self.url = url or os.getenv("DATABASE_URL") or DEFAULT_DATABASE_URL
+        self.engine = self._create_engine(self.url)
+        # One connection per thread; graph nodes run on worker threads
+        self._local = threading.local()
+        # Per-user context cache shared by every Database in this worker
+        self.context_cache = daily_context_cache
+
+    @abstractmethod
+    def _create_engine(self, url: str):
+        """The SQLAlchemy engine for url, configured for the backend"""
+
+    @property
+    def connection(self):
+        """The calling thread's connection, opened on first use"""
+        connection = getattr(self._local, "connection", None)
+        if connection is None or connection.closed:
+            connection = self.engine.connect()
+            self._local.connection = connection
+        return connection
+
+    def commit(self):
+        """Commit the current transaction, unless inside batch()"""
+        if getattr(self._local, "batch_depth", 0) == 0:
+            self.connection.commit()
+
+    @contextmanager
+    def batch(self):
+        """
+        Group several writes into a single commit
+
+        Usage:
+            with db.batch():
+                db.set_meal_entry(...)
+                db.save_state(...)
+        """
+        self._local.batch_depth = getattr(self._local, "batch_depth", 0) + 1
+        try:
+            yield self
+        except Exception:
+            self._local.batch_depth -= 1
+            if self._local.batch_depth == 0:
+                self.connection.rollback()
+                # Cached contexts may include writes that were rolled back
+                self.context_cache.clear()
+            raise
+        else:
+            self._local.batch_depth -= 1
+            if self._local.batch_depth == 0:
+                self.connection.commit()
 
     # Get a connection to the database
     def get_connection(self):
@@ -35,17 +114,17 @@ class Database:
             # Create workflow_states table if it doesn't exist
             if 'workflow_states' not in existing_tables:
                 print("Creating workflow_states table...")
-                self.connection.execute(text("""
+                self.connection.execute(text(f"""
                     CREATE TABLE workflow_states (
-                        id TEXT PRIMARY KEY,
+                        id {self.id_type} PRIMARY KEY,
                         user_id TEXT NOT NULL,
                         timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                         state_type TEXT NOT NULL,  -- 'initial' or 'final'
                         message_body TEXT,
                         message_sender TEXT,
                         num_media INTEGER,
-                        media_items JSONB,
-                        meal_entry_id TEXT,
+                        media_items {self.json_type},
+                        meal_entry_id {self.id_type},
                         response TEXT,
                         db_operation_status TEXT,
                         intent TEXT
@@ -70,9 +149,9 @@ class Database:
             # Create meal_entries table if it doesn't exist
             if 'meal_entries' not in existing_tables:
                 print("Creating meal_entries table...")
-                self.connection.execute(text("""
+                self.connection.execute(text(f"""
                     CREATE TABLE meal_entries (
-                        id TEXT PRIMARY KEY,
+                        id {self.id_type} PRIMARY KEY,
                         user_id TEXT NOT NULL,
                         meal_name TEXT NOT NULL,
                         meal_description TEXT,
@@ -99,7 +178,183 @@ class Database:
             else:
                 print("meal_entries table already exists")
             
-            self.connection.commit()
+            # Covers per-user range scans and keyset pagination
+            self.connection.execute(text("""
+                CREATE INDEX IF NOT EXISTS idx_meal_entries_user_id_created_at
+                ON meal_entries(user_id, created_at, id)
+            """))
+            
+            # Create daily_nutrition_rollups table if it doesn't exist
+            if 'daily_nutrition_rollups' not in existing_tables:
+                print("Creating daily_nutrition_rollups table...")
+                self.connection.execute(text("""
+                    CREATE TABLE daily_nutrition_rollups (
+                        user_id TEXT NOT NULL,
+                        log_date DATE NOT NULL,
+                        total_calories INTEGER NOT NULL DEFAULT 0,
+                        total_protein INTEGER NOT NULL DEFAULT 0,
+                        total_carbs INTEGER NOT NULL DEFAULT 0,
+                        total_fat INTEGER NOT NULL DEFAULT 0,
+                        meal_count INTEGER NOT NULL DEFAULT 0,
+                        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        PRIMARY KEY (user_id, log_date)
+                    )
+                """))
+                
+                print("daily_nutrition_rollups table created successfully")
+                
+                # Fill it from any meals that were logged before it existed
+                self.rebuild_daily_rollups(commit=False)
+            else:
+                print("daily_nutrition_rollups table already exists")
+            
+            # Create user_stats table if it doesn't exist
+            if 'user_stats' not in existing_tables:
+                print("Creating user_stats table...")
+                self.connection.execute(text(f"""
+                    CREATE TABLE user_stats (
+                        user_id TEXT PRIMARY KEY,
+                        stats {self.json_type} NOT NULL,
+                        computed_for DATE NOT NULL,
+                        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    )
+                """))
+                
+                print("user_stats table created successfully")
+            else:
+                print("user_stats table already exists")
+            
+            # Create meal_favorites table if it doesn't exist
+            if 'meal_favorites' not in existing_tables:
+                print("Creating meal_favorites table...")
+                self.connection.execute(text(f"""
+                    CREATE TABLE meal_favorites (
+                        id {self.id_type} PRIMARY KEY,
+                        user_id TEXT NOT NULL,
+                        alias TEXT NOT NULL,
+                        meal_name TEXT NOT NULL,
+                        meal_description TEXT,
+                        meal_calories INTEGER,
+                        meal_protein INTEGER,
+                        meal_carbs INTEGER,
+                        meal_fat INTEGER,
+                        use_count INTEGER NOT NULL DEFAULT 0,
+                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        last_used_at TIMESTAMP
+                    )
+                """))
+                
+                # One alias per user; also serves the alias lookup
+                self.connection.execute(text("""
+                    CREATE UNIQUE INDEX idx_meal_favorites_user_id_alias
+                    ON meal_favorites(user_id, alias)
+                """))
+                
+                print("meal_favorites table created successfully")
+            else:
+                print("meal_favorites table already exists")
+
+            # Create outbound_messages table if it doesn't exist
+            if 'outbound_messages' not in existing_tables:
+                print("Creating outbound_messages table...")
+                self.connection.execute(text(f"""
+                    CREATE TABLE outbound_messages (
+                        id {self.id_type} PRIMARY KEY,
+                        to_number TEXT NOT NULL,
+                        body TEXT NOT NULL,
+                        status TEXT NOT NULL DEFAULT 'pending',
+                        attempts INTEGER NOT NULL DEFAULT 0,
+                        next_attempt_at TIMESTAMP NOT NULL,
+                        lease_until TIMESTAMP,
+                        last_error TEXT,
+                        provider_sid TEXT,
+                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        sent_at TIMESTAMP
+                    )
+                """))
+
+                # Serves the recovery scan for undelivered messages
+                self.connection.execute(text("""
+                    CREATE INDEX idx_outbound_messages_status_next_attempt_at
+                    ON outbound_messages(status, next_attempt_at)
+                """))
+
+                print("outbound_messages table created successfully")
+            else:
+                print("outbound_messages table already exists")
+
+            # Create graph checkpoint tables if they don't exist
+            if 'graph_checkpoints' not in existing_tables:
+                print("Creating graph_checkpoints table...")
+                self.connection.execute(text(f"""
+                    CREATE TABLE graph_checkpoints (
+                        thread_id TEXT NOT NULL,
+                        checkpoint_ns TEXT NOT NULL DEFAULT '',
+                        checkpoint_id TEXT NOT NULL,
+                        parent_checkpoint_id TEXT,
+                        checkpoint_type TEXT NOT NULL,
+                        checkpoint {self.blob_type} NOT NULL,
+                        metadata_type TEXT NOT NULL,
+                        metadata {self.blob_type} NOT NULL,
+                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+                    )
+                """))
+
+                # Serves the sweep of abandoned runs
+                self.connection.execute(text("""
+                    CREATE INDEX idx_graph_checkpoints_created_at
+                    ON graph_checkpoints(created_at)
+                """))
+
+                self.connection.execute(text(f"""
+                    CREATE TABLE graph_checkpoint_writes (
+                        thread_id TEXT NOT NULL,
+                        checkpoint_ns TEXT NOT NULL DEFAULT '',
+                        checkpoint_id TEXT NOT NULL,
+                        task_id TEXT NOT NULL,
+                        idx INTEGER NOT NULL,
+                        channel TEXT NOT NULL,
+                        value_type TEXT NOT NULL,
+                        value {self.blob_type},
+                        task_path TEXT NOT NULL DEFAULT '',
+                        PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+                    )
+                """))
+
+                print("graph_checkpoints tables created successfully")
+            else:
+                print("graph_checkpoints table already exists")
+
+            if 'deferred_messages' not in existing_tables:
+                print("Creating deferred_messages table...")
+                self.connection.execute(text(f"""
+                    CREATE TABLE deferred_messages (
+                        id {self.id_type} PRIMARY KEY,
+                        message_sid TEXT NOT NULL,
+                        user_id TEXT,
+                        form {self.json_type} NOT NULL,
+                        reason TEXT,
+                        status TEXT NOT NULL DEFAULT 'pending',
+                        attempts INTEGER NOT NULL DEFAULT 0,
+                        lease_until TIMESTAMP,
+                        last_error TEXT,
+                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        processed_at TIMESTAMP
+                    )
+                """))
+
+                # A webhook Twilio retries during an outage is stored once
+                self.connection.execute(text("""
+                    CREATE UNIQUE INDEX idx_deferred_messages_message_sid
+                    ON deferred_messages(message_sid)
+                """))
+
+                print("deferred_messages table created successfully")
+            else:
+                print("deferred_messages table already exists")
+
+            self.commit()
             print("Database initialization completed successfully")
             
         except Exception as e:
@@ -107,16 +362,9 @@ class Database:
             import traceback
             traceback.print_exc()
 
+    @abstractmethod
     def get_existing_tables(self):
         """Get a list of existing tables in the database"""
-        # This query works for PostgreSQL
-        result = self.connection.execute(text("""
-            SELECT table_name 
-            FROM information_schema.tables 
-            WHERE table_schema = 'public'
-        """))
-        
-        return [row[0] for row in result.fetchall()]
 
     # State Operations
     def save_state(self, state, state_type='initial'):
@@ -129,7 +377,7 @@ class Database:
         """
         try:
             # Generate a unique ID for this state
-            state_id = str(uuid.uuid4())
+            state_id = new_id()
             
             # Handle different state object types
             if hasattr(state, 'message'):
@@ -177,7 +425,7 @@ class Database:
                     VALUES (
                         :id, :user_id, :state_type, :message_body, :message_sender,
                         :num_media, :media_items, :meal_entry_id, :response,
-                        :db_operation_status, :intent, NOW()
+                        :db_operation_status, :intent, CURRENT_TIMESTAMP
                     )
                 """),
                 {
@@ -194,7 +442,7 @@ class Database:
                     "intent": intent
                 }
             )
-            self.connection.commit()
+            self.commit()
             return state_id
         except Exception as e:
             print(f"Error saving state: {e}")
@@ -223,17 +471,65 @@ class Database:
         )
         return result.fetchall()
 
+    def iter_user_states(self, user_id: str, batch_size: int = 1000):
+        """
+        Stream all states for a user, newest first, without loading them at once
+        
+        Pages are fetched with keyset pagination on (timestamp, id), so each
+        query stays short no matter how far into the history we are.
+        """
+        last = None
+        with self.engine.connect() as connection:
+            while True:
+                keyset = "AND (timestamp, id) < (:last_timestamp, :last_id)" if last else ""
+                result = connection.execution_options(
+                    stream_results=True, yield_per=batch_size
+                ).execute(
+                    text(f"""
+                        SELECT * FROM workflow_states
+                        WHERE user_id = :user_id {keyset}
+                        ORDER BY timestamp DESC, id DESC
+                        LIMIT :batch_size
+                    """),
+                    {"user_id": user_id, "batch_size": batch_size,
+                     "last_timestamp": last[0] if last else None,
+                     "last_id": last[1] if last else None}
+                )
+                count = 0
+                for row in result:
+                    count += 1
+                    last = (row.timestamp, row.id)
+                    yield row
+                connection.commit()
+                if count < batch_size:
+                    break
+
     # Meal related functions
     # Include Get, Set, Update, Delete
     def get_meal_entry(self, user_id: str, meal_id: str):
         result = self.connection.execute(text("SELECT * FROM meal_entries WHERE user_id = :user_id AND id = :meal_id"), {"user_id": user_id, "meal_id": meal_id})
         return result.fetchone()    
     
+    def get_recent_meals(self, user_id: str, limit: int = 10):
+        """A user's latest meals, newest first (served by the user_id, created_at index)"""
+        result = self.connection.execute(
+            text("""
+                SELECT id, meal_name, meal_description, meal_calories,
+                       meal_protein, meal_carbs, meal_fat, created_at
+                FROM meal_entries
+                WHERE user_id = :user_id
+                ORDER BY created_at DESC, id DESC
+                LIMIT :limit
+            """).columns(created_at=DateTime),
+            {"user_id": user_id, "limit": limit}
+        )
+        return result.fetchall()
+    
     def set_meal_entry(self, user_id: str, meal_entry: MealEntry):  
-        # Create uuid by default
-        meal_entry_id = str(uuid.uuid4())
+        # Time-ordered UUIDv7 so inserts append to the primary key index
+        meal_entry_id = new_id()
         
-        self.connection.execute(text("""
+        result = self.connection.execute(text("""
             INSERT INTO meal_entries (
                 id, user_id, meal_name, meal_description, 
                 meal_calories, meal_protein, meal_carbs, meal_fat
@@ -242,7 +538,8 @@ class Database:
                 :id, :user_id, :meal_name, :meal_description, 
                 :meal_calories, :meal_protein, :meal_carbs, :meal_fat
             )
-        """), {
+            RETURNING created_at
+        """).columns(created_at=DateTime), {
             "id": meal_entry_id, 
             "user_id": user_id, 
             "meal_name": meal_entry.meal_name, 
@@ -252,45 +549,804 @@ class Database:
             "meal_carbs": meal_entry.meal_carbs, 
             "meal_fat": meal_entry.meal_fat
         })
+        created_at = result.scalar_one()
         
-        self.connection.commit()
+        # Maintain the per-day rollup in the same transaction
+        self._apply_rollup_delta(user_id, created_at, meal_entry.meal_calories,
+                                 meal_entry.meal_protein, meal_entry.meal_carbs,
+                                 meal_entry.meal_fat, 1)
+        
+        self.commit()
         
         # Set the ID on the meal entry so it's available later
         meal_entry.id = meal_entry_id
+
+        # Keep the cached context in step without another query
+        self.context_cache.add_meal(user_id, MealContext(
+            id=meal_entry_id,
+            created_at=created_at,
+            meal_name=meal_entry.meal_name,
+            meal_description=meal_entry.meal_description,
+            meal_calories=meal_entry.meal_calories,
+            meal_protein=meal_entry.meal_protein,
+            meal_carbs=meal_entry.meal_carbs,
+            meal_fat=meal_entry.meal_fat
+        ))
         
         return True
     
     def update_meal_entry(self, user_id: str, meal_id: str, meal_entry: MealEntry):
-        result = self.connection.execute(text("UPDATE meal_entries SET meal_name = :meal_name, meal_description = :meal_description, meal_calories = :meal_calories, meal_protein = :meal_protein, meal_carbs = :meal_carbs, meal_fat = :meal_fat WHERE user_id = :user_id AND id = :meal_id"), {"user_id": user_id, "meal_id": meal_id, "meal_name": meal_entry.meal_name, "meal_description": meal_entry.meal_description, "meal_calories": meal_entry.meal_calories, "meal_protein": meal_entry.meal_protein, "meal_carbs": meal_entry.meal_carbs, "meal_fat": meal_entry.meal_fat})
-        self.connection.commit()
+        # The rollup is adjusted by the difference to the values actually replaced
+        old = self._replace_meal_values(user_id, meal_id, meal_entry)
+        if old is not None:
+            self._apply_rollup_delta(user_id, old[0],
+                                     meal_entry.meal_calories - (old[1] or 0),
+                                     meal_entry.meal_protein - (old[2] or 0),
+                                     meal_entry.meal_carbs - (old[3] or 0),
+                                     meal_entry.meal_fat - (old[4] or 0), 0)
+        self.commit()
+        self.context_cache.update_meal(user_id, meal_id, meal_entry, old[0] if old else None)
         return True
 
-        
+    def _replace_meal_values(self, user_id: str, meal_id: str, meal_entry: MealEntry):
+        """
+        Overwrite a meal's values (caller commits)
+
+        Returns:
+            (created_at, calories, protein, carbs, fat) of the row replaced,
+            or None if there is no such meal. The row is locked before it is
+            read, so concurrent edits each see the other's result.
+        """
+        return self.connection.execute(text("""
+            UPDATE meal_entries AS m
+            SET meal_name = :meal_name, meal_description = :meal_description,
+                meal_calories = :meal_calories, meal_protein = :meal_protein,
+                meal_carbs = :meal_carbs, meal_fat = :meal_fat
+            FROM (
+                SELECT id, created_at, meal_calories, meal_protein, meal_carbs, meal_fat
+                FROM meal_entries
+                WHERE user_id = :user_id AND id = :meal_id
+                FOR UPDATE
+            ) AS old
+            WHERE m.id = old.id
+            RETURNING old.created_at, old.meal_calories, old.meal_protein, old.meal_carbs, old.meal_fat
+        """).columns(created_at=DateTime), self._meal_values(user_id, meal_id, meal_entry)).fetchone()
+
+    @staticmethod
+    def _meal_values(user_id: str, meal_id: str, meal_entry: MealEntry) -> Dict[str, Any]:
+        return {
+            "user_id": user_id,
+            "meal_id": meal_id,
+            "meal_name": meal_entry.meal_name,
+            "meal_description": meal_entry.meal_description,
+            "meal_calories": meal_entry.meal_calories,
+            "meal_protein": meal_entry.meal_protein,
+            "meal_carbs": meal_entry.meal_carbs,
+            "meal_fat": meal_entry.meal_fat
+        }
+
     def delete_meal_entry(self, user_id: str, meal_id: str):
-        self.connection.execute(text("DELETE FROM meal_entries WHERE user_id = :user_id AND id = :meal_id"), {"user_id": user_id, "meal_id": meal_id})
-        self.connection.commit() # Commits the current transaction, making all pending changes permanent in the database
+        result = self.connection.execute(text("DELETE FROM meal_entries WHERE user_id = :user_id AND id = :meal_id RETURNING created_at, meal_calories, meal_protein, meal_carbs, meal_fat").columns(created_at=DateTime), {"user_id": user_id, "meal_id": meal_id})
+        old = result.fetchone()
+        if old is not None:
+            self._apply_rollup_delta(user_id, old[0], -(old[1] or 0), -(old[2] or 0),
+                                     -(old[3] or 0), -(old[4] or 0), -1)
+        self.commit() # Commits the current transaction, making all pending changes permanent in the database
+        self.context_cache.remove_meal(user_id, meal_id, old[0] if old else None)
         return True
     
+    # Daily rollups
+    # One row per user and local day, kept in step with meal_entries on every write
+    def _apply_rollup_delta(self, user_id: str, created_at: datetime, calories: int,
+                            protein: int, carbs: int, fat: int, meal_count: int):
+        """Add a delta to a day's rollup row (caller commits)"""
+        log_date = local_date(user_id, created_at)
+        self.connection.execute(text("""
+            INSERT INTO daily_nutrition_rollups (
+                user_id, log_date, total_calories, total_protein,
+                total_carbs, total_fat, meal_count, updated_at
+            )
+            VALUES (
+                :user_id, :log_date, :calories, :protein,
+                :carbs, :fat, :meal_count, CURRENT_TIMESTAMP
+            )
+            ON CONFLICT (user_id, log_date) DO UPDATE SET
+                total_calories = daily_nutrition_rollups.total_calories + EXCLUDED.total_calories,
+                total_protein = daily_nutrition_rollups.total_protein + EXCLUDED.total_protein,
+                total_carbs = daily_nutrition_rollups.total_carbs + EXCLUDED.total_carbs,
+                total_fat = daily_nutrition_rollups.total_fat + EXCLUDED.total_fat,
+                meal_count = daily_nutrition_rollups.meal_count + EXCLUDED.meal_count,
+                updated_at = CURRENT_TIMESTAMP
+        """), {
+            "user_id": user_id,
+            "log_date": log_date,
+            "calories": calories or 0,
+            "protein": protein or 0,
+            "carbs": carbs or 0,
+            "fat": fat or 0,
+            "meal_count": meal_count
+        })
+        if meal_count < 0:
+            # Drop days whose last meal was deleted
+            self.connection.execute(text("""
+                DELETE FROM daily_nutrition_rollups
+                WHERE user_id = :user_id AND log_date = :log_date AND meal_count <= 0
+            """), {"user_id": user_id, "log_date": log_date})
+
+    def get_daily_rollups(self, user_id: str, start_date: datetime, end_date: datetime):
+        """Per-day totals for a user between two dates (inclusive), oldest first"""
+        result = self.connection.execute(
+            text("""
+                SELECT log_date, total_calories, total_protein, total_carbs,
+                       total_fat, meal_count
+                FROM daily_nutrition_rollups
+                WHERE user_id = :user_id
+                AND log_date BETWEEN DATE(:start_date) AND DATE(:end_date)
+                ORDER BY log_date
+            """),
+            {"user_id": user_id, "start_date": start_date, "end_date": end_date}
+        )
+        return result.fetchall()
+
+    def iter_daily_rollups(self, start_date: datetime, end_date: datetime,
+                           after_user_id: str = None, batch_size: int = 5000):
+        """
+        Stream every user's rollups for a date range, ordered by user then day
+        
+        One set-based pass for batch jobs (digests, stats). Pages use keyset
+        pagination on (user_id, log_date); after_user_id skips users up to and
+        including that id, for resuming.
+        """
+        last = None
+        with self.engine.connect() as connection:
+            while True:
+                params = {"start_date": start_date, "end_date": end_date,
+                          "batch_size": batch_size}
+                keyset = ""
+                if last:
+                    keyset = "AND (user_id, log_date) > (:last_user_id, :last_log_date)"
+                    params["last_user_id"], params["last_log_date"] = last
+                elif after_user_id:
+                    keyset = "AND user_id > :after_user_id"
+                    params["after_user_id"] = after_user_id
+                result = connection.execution_options(
+                    stream_results=True, yield_per=batch_size
+                ).execute(
+                    text(f"""
+                        SELECT user_id, log_date, total_calories, total_protein,
+                               total_carbs, total_fat, meal_count
+                        FROM daily_nutrition_rollups
+                        WHERE log_date BETWEEN DATE(:start_date) AND DATE(:end_date)
+                        {keyset}
+                        ORDER BY user_id, log_date
+                        LIMIT :batch_size
+                    """),
+                    params
+                )
+                count = 0
+                for row in result:
+                    count += 1
+                    last = (row.user_id, row.log_date)
+                    yield row
+                connection.commit()
+                if count < batch_size:
+                    break
+
+    def _iter_local_day_totals(self, user_id: str = None):
+        """
+        Aggregate meal_entries per user and local day, the way rollups store them
+
+        The day depends on each user's timezone, so meals are summed here
+        rather than grouped by DATE(created_at) in SQL; one user's meals are
+        held at a time.
+
+        Yields:
+            (user_id, log_date, calories, protein, carbs, fat, meal_count)
+        """
+        if user_id:
+            user_ids = [user_id]
+        else:
+            user_ids = [row[0] for row in self.connection.execute(
+                text("SELECT DISTINCT user_id FROM meal_entries ORDER BY user_id")
+            )]
+        for user in user_ids:
+            # On this connection: create_tables rebuilds inside its own transaction
+            meals = self.connection.execute(text("""
+                SELECT created_at, meal_calories, meal_protein, meal_carbs, meal_fat
+                FROM meal_entries
+                WHERE user_id = :user_id
+            """).columns(created_at=DateTime), {"user_id": user})
+            days = {}
+            for created_at, calories, protein, carbs, fat in meals:
+                totals = days.setdefault(local_date(user, created_at), [0, 0, 0, 0, 0])
+                totals[0] += calories or 0
+                totals[1] += protein or 0
+                totals[2] += carbs or 0
+                totals[3] += fat or 0
+                totals[4] += 1
+            for log_date in sorted(days):
+                yield (user, log_date, *days[log_date])
+
+    def rebuild_daily_rollups(self, user_id: str = None, commit: bool = True) -> int:
+        """
+        Recompute rollups from meal_entries, for one user or everyone
+        
+        Returns:
+            Number of rollup rows written
+        """
+        user_filter = "WHERE user_id = :user_id" if user_id else ""
+        params = {"user_id": user_id} if user_id else {}
+        self.connection.execute(
+            text(f"DELETE FROM daily_nutrition_rollups {user_filter}"), params
+        )
+        insert = text("""
+            INSERT INTO daily_nutrition_rollups (
+                user_id, log_date, total_calories, total_protein,
+                total_carbs, total_fat, meal_count, updated_at
+            )
+            VALUES (
+                :user_id, :log_date, :calories, :protein,
+                :carbs, :fat, :meal_count, CURRENT_TIMESTAMP
+            )
+        """)
+        rows = 0
+        batch = []
+        for row in self._iter_local_day_totals(user_id):
+            batch.append(dict(zip(("user_id", "log_date", "calories", "protein",
+                                   "carbs", "fat", "meal_count"), row)))
+            if len(batch) >= 1000:
+                self.connection.execute(insert, batch)
+                rows += len(batch)
+                batch = []
+        if batch:
+            self.connection.execute(insert, batch)
+            rows += len(batch)
+        if commit:
+            self.commit()
+        return rows
+
+    def check_daily_rollups(self, user_id: str = None):
+        """
+        Compare rollups against a fresh aggregate of meal_entries
+        
+        Returns:
+            List of (user_id, log_date, expected, actual) tuples for every
+            day that differs; expected/actual are None when a row is missing
+        """
+        user_filter = "WHERE user_id = :user_id" if user_id else ""
+        params = {"user_id": user_id} if user_id else {}
+        expected = {
+            (row[0], str(row[1])): tuple(row[2:])
+            for row in self._iter_local_day_totals(user_id)
+        }
+        actual = {
+            (row[0], str(row[1])): tuple(row[2:])
+            for row in self.connection.execute(text(f"""
+                SELECT user_id, log_date, total_calories, total_protein,
+                       total_carbs, total_fat, meal_count
+                FROM daily_nutrition_rollups
+                {user_filter}
+            """), params)
+        }
+        mismatches = []
+        for key in sorted(set(expected) | set(actual)):
+            if expected.get(key) != actual.get(key):
+                mismatches.append((key[0], key[1], expected.get(key), actual.get(key)))
+        return mismatches
+    
+    # Favorites
+    # Named meals a user can log again with a short alias
+    def save_favorite(self, user_id: str, alias: str, meal_entry: MealEntry):
+        """Store a meal under an alias, replacing any meal already saved under it"""
+        self.connection.execute(
+            text("""
+                INSERT INTO meal_favorites (
+                    id, user_id, alias, meal_name, meal_description,
+                    meal_calories, meal_protein, meal_carbs, meal_fat
+                )
+                VALUES (
+                    :id, :user_id, :alias, :meal_name, :meal_description,
+                    :meal_calories, :meal_protein, :meal_carbs, :meal_fat
+                )
+                ON CONFLICT (user_id, alias) DO UPDATE SET
+                    meal_name = EXCLUDED.meal_name,
+                    meal_description = EXCLUDED.meal_description,
+                    meal_calories = EXCLUDED.meal_calories,
+                    meal_protein = EXCLUDED.meal_protein,
+                    meal_carbs = EXCLUDED.meal_carbs,
+                    meal_fat = EXCLUDED.meal_fat
+            """),
+            {
+                "id": new_id(),
+                "user_id": user_id,
+                "alias": alias,
+                "meal_name": meal_entry.meal_name,
+                "meal_description": meal_entry.meal_description,
+                "meal_calories": meal_entry.meal_calories,
+                "meal_protein": meal_entry.meal_protein,
+                "meal_carbs": meal_entry.meal_carbs,
+                "meal_fat": meal_entry.meal_fat
+            }
+        )
+        self.commit()
+        return True
+
+    def get_favorite(self, user_id: str, alias: str):
+        result = self.connection.execute(
+            text("""
+                SELECT alias, meal_name, meal_description, meal_calories,
+                       meal_protein, meal_carbs, meal_fat, use_count
+                FROM meal_favorites
+                WHERE user_id = :user_id AND alias = :alias
+            """),
+            {"user_id": user_id, "alias": alias}
+        )
+        return result.fetchone()
+
+    def list_favorites(self, user_id: str, limit: int = 20):
+        """A user's favorites, most used first"""
+        result = self.connection.execute(
+            text("""
+                SELECT alias, meal_name, meal_description, meal_calories,
+                       meal_protein, meal_carbs, meal_fat, use_count
+                FROM meal_favorites
+                WHERE user_id = :user_id
+                ORDER BY use_count DESC, alias
+                LIMIT :limit
+            """),
+            {"user_id": user_id, "limit": limit}
+        )
+        return result.fetchall()
+
+    def use_favorite(self, user_id: str, alias: str):
+        """Count a re-log of a favorite (caller commits)"""
+        self.connection.execute(
+            text("""
+                UPDATE meal_favorites
+                SET use_count = use_count + 1, last_used_at = CURRENT_TIMESTAMP
+                WHERE user_id = :user_id AND alias = :alias
+            """),
+            {"user_id": user_id, "alias": alias}
+        )
+
+    def delete_favorite(self, user_id: str, alias: str) -> bool:
+        result = self.connection.execute(
+            text("DELETE FROM meal_favorites WHERE user_id = :user_id AND alias = :alias"),
+            {"user_id": user_id, "alias": alias}
+        )
+        self.commit()
+        return result.rowcount > 0
+    
+    # Outbound messages
+    # Replies waiting for delivery; see app/outbound.py
+    def enqueue_outbound(self, messages: List[tuple], next_attempt_at: datetime):
+        """Store (id, to_number, body) messages in one statement"""
+        self.connection.execute(
+            text("""
+                INSERT INTO outbound_messages (id, to_number, body, next_attempt_at)
+                VALUES (:id, :to_number, :body, :next_attempt_at)
+            """),
+            [
+                {"id": message_id, "to_number": to_number, "body": body,
+                 "next_attempt_at": next_attempt_at}
+                for message_id, to_number, body in messages
+            ]
+        )
+        self.commit()
+
+    def claim_outbound(self, message_id: str, now: datetime, lease_until: datetime) -> bool:
+        """
+        Take a message for one delivery attempt
+
+        Fails if it was delivered, given up on, or is being sent by another
+        worker whose lease hasn't run out.
+        """
+        result = self.connection.execute(
+            text("""
+                UPDATE outbound_messages
+                SET status = 'sending', lease_until = :lease_until, attempts = attempts + 1
+                WHERE id = :id
+                  AND (status = 'pending' OR (status = 'sending' AND lease_until < :now))
+            """),
+            {"id": message_id, "now": now, "lease_until": lease_until}
+        )
+        self.commit()
+        return result.rowcount > 0
+
+    def release_outbound(self, message_id: str):
+        """Give back a claim that wasn't used for an attempt"""
+        self.connection.execute(
+            text("""
+                UPDATE outbound_messages
+                SET status = 'pending', lease_until = NULL, attempts = attempts - 1
+                WHERE id = :id AND status = 'sending'
+            """),
+            {"id": message_id}
+        )
+        self.commit()
+
+    def finish_outbound(self, message_id: str, status: str, provider_sid: str = None,
+                        error: str = None, next_attempt_at: datetime = None):
+        """Record an attempt: 'sent', 'failed' for good, or back to 'pending' for a retry"""
+        self.connection.execute(
+            text("""
+                UPDATE outbound_messages
+                SET status = :status, lease_until = NULL,
+                    provider_sid = COALESCE(:provider_sid, provider_sid),
+                    last_error = :error,
+                    next_attempt_at = COALESCE(:next_attempt_at, next_attempt_at),
+                    sent_at = CASE WHEN :status = 'sent' THEN CURRENT_TIMESTAMP ELSE sent_at END
+                WHERE id = :id
+            """),
+            {"id": message_id, "status": status, "provider_sid": provider_sid,
+             "error": error, "next_attempt_at": next_attempt_at}
+        )
+        self.commit()
+
+    def get_undelivered_outbound(self, now: datetime, limit: int = 500):
+        """
+        Messages still to be sent, oldest first (ids are time-ordered)
+
+        Includes ones waiting for a retry and ones whose sender's lease
+        expired; callers hold each until its next_attempt_at.
+        """
+        result = self.connection.execute(
+            text("""
+                SELECT id, to_number, body, attempts, next_attempt_at, created_at
+                FROM outbound_messages
+                WHERE status = 'pending'
+                   OR (status = 'sending' AND lease_until < :now)
+                ORDER BY id
+                LIMIT :limit
+            """).columns(next_attempt_at=DateTime, created_at=DateTime),
+            {"now": now, "limit": limit}
+        )
+        return result.fetchall()
+
+    def count_outbound_by_status(self) -> Dict[str, int]:
+        result = self.connection.execute(
+            text("SELECT status, COUNT(*) FROM outbound_messages GROUP BY status")
+        )
+        return {status: count for status, count in result}
+
+    # Graph checkpoints
+    # Written behind the workflow by app/checkpoints.py, deleted when a run completes
+    def save_checkpoints(self, checkpoints: List[dict]):
+        """Insert checkpoints (dicts of graph_checkpoints columns); existing ones are kept"""
+        self.connection.execute(
+            text("""
+                INSERT INTO graph_checkpoints (
+                    thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id,
+                    checkpoint_type, checkpoint, metadata_type, metadata
+                )
+                VALUES (
+                    :thread_id, :checkpoint_ns, :checkpoint_id, :parent_checkpoint_id,
+                    :checkpoint_type, :checkpoint, :metadata_type, :metadata
+                )
+                ON CONFLICT (thread_id, checkpoint_ns, checkpoint_id) DO NOTHING
+            """),
+            checkpoints
+        )
+        self.commit()
+
+    def save_checkpoint_writes(self, writes: List[dict]):
+        """Insert pending node writes (dicts of graph_checkpoint_writes columns)"""
+        self.connection.execute(
+            text("""
+                INSERT INTO graph_checkpoint_writes (
+                    thread_id, checkpoint_ns, checkpoint_id, task_id, idx,
+                    channel, value_type, value, task_path
+                )
+                VALUES (
+                    :thread_id, :checkpoint_ns, :checkpoint_id, :task_id, :idx,
+                    :channel, :value_type, :value, :task_path
+                )
+                ON CONFLICT (thread_id, checkpoint_ns, checkpoint_id, task_id, idx) DO NOTHING
+            """),
+            writes
+        )
+        self.commit()
+
+    def load_checkpoints(self, thread_id: str):
+        """
+        Everything stored for one run
+        
+        Returns:
+            (checkpoint rows, write rows)
+        """
+        checkpoints = self.connection.execute(
+            text("""
+                SELECT checkpoint_ns, checkpoint_id, parent_checkpoint_id,
+                       checkpoint_type, checkpoint, metadata_type, metadata
+                FROM graph_checkpoints
+                WHERE thread_id = :thread_id
+            """),
+            {"thread_id": thread_id}
+        ).fetchall()
+        writes = self.connection.execute(
+            text("""
+                SELECT checkpoint_ns, checkpoint_id, task_id, idx,
+                       channel, value_type, value, task_path
+                FROM graph_checkpoint_writes
+                WHERE thread_id = :thread_id
+            """),
+            {"thread_id": thread_id}
+        ).fetchall()
+        return checkpoints, writes
+
+    def delete_checkpoints(self, thread_ids: List[str]):
+        self.connection.execute(
+            text("DELETE FROM graph_checkpoint_writes WHERE thread_id IN :thread_ids")
+            .bindparams(bindparam("thread_ids", expanding=True)),
+            {"thread_ids": list(thread_ids)}
+        )
+        self.connection.execute(
+            text("DELETE FROM graph_checkpoints WHERE thread_id IN :thread_ids")
+            .bindparams(bindparam("thread_ids", expanding=True)),
+            {"thread_ids": list(thread_ids)}
+        )
+        self.commit()
+
+    def delete_stale_checkpoints(self, before: datetime) -> int:
+        """Drop runs that haven't been touched since before (abandoned, never resumed)"""
+        stale = [row[0] for row in self.connection.execute(
+            text("""
+                SELECT thread_id FROM graph_checkpoints
+                GROUP BY thread_id
+                HAVING MAX(created_at) < :before
+            """),
+            {"before": before}
+        )]
+        if stale:
+            self.delete_checkpoints(stale)
+        return len(stale)
+
+    # Deferred messages
+    # Stored while OpenAI or Twilio is down, processed by app.py once the circuits close
+    def defer_message(self, message_id: str, message_sid: str, user_id: str,
+                      form: Dict[str, Any], reason: str) -> bool:
+        """Store a raw webhook form for later; False if this MessageSid is already stored"""
+        result = self.connection.execute(
+            text("""
+                INSERT INTO deferred_messages (id, message_sid, user_id, form, reason)
+                VALUES (:id, :message_sid, :user_id, :form, :reason)
+                ON CONFLICT (message_sid) DO NOTHING
+            """),
+            {"id": message_id, "message_sid": message_sid, "user_id": user_id,
+             "form": json.dumps(form), "reason": reason}
+        )
+        self.commit()
+        return result.rowcount > 0
+
+    def get_deferred(self, now: datetime, limit: int = 100):
+        """
+        Deferred messages still to be processed, oldest first (ids are time-ordered)
+        
+        Includes ones whose processor's lease expired. Returns (id, form dict, attempts).
+        """
+        rows = self.connection.execute(
+            text("""
+                SELECT id, form, attempts FROM deferred_messages
+                WHERE status = 'pending'
+                   OR (status = 'processing' AND lease_until < :now)
+                ORDER BY id
+                LIMIT :limit
+            """),
+            {"now": now, "limit": limit}
+        ).fetchall()
+        return [(str(message_id), json.loads(form) if isinstance(form, str) else form, attempts)
+                for message_id, form, attempts in rows]
+
+    def claim_deferred(self, message_id: str, now: datetime, lease_until: datetime) -> bool:
+        """Take a deferred message for processing, unless another worker holds it"""
+        result = self.connection.execute(
+            text("""
+                UPDATE deferred_messages
+                SET status = 'processing', lease_until = :lease_until
+                WHERE id = :id
+                  AND (status = 'pending' OR (status = 'processing' AND lease_until < :now))
+            """),
+            {"id": message_id, "now": now, "lease_until": lease_until}
+        )
+        self.commit()
+        return result.rowcount > 0
+
+    def finish_deferred(self, message_id: str, status: str, error: str = None, attempted: bool = True):
+        """
+        Release a claimed message: 'done', 'failed' for good, or back to 'pending'
+        
+        attempted=False puts it back without counting an attempt (the outage isn't over).
+        """
+        self.connection.execute(
+            text("""
+                UPDATE deferred_messages
+                SET status = :status, lease_until = NULL, last_error = :error,
+                    attempts = attempts + :attempted,
+                    processed_at = CASE WHEN :status = 'pending' THEN processed_at ELSE CURRENT_TIMESTAMP END
+                WHERE id = :id
+            """),
+            {"id": message_id, "status": status, "error": error, "attempted": int(attempted)}
+        )
+        self.commit()
+
+    def count_deferred(self) -> int:
+        """Messages waiting for (or in) processing"""
+        return self.connection.execute(
+            text("SELECT COUNT(*) FROM deferred_messages WHERE status IN ('pending', 'processing')")
+        ).scalar()
+
+    # Per-user stats
+    # Recomputed nightly by app/scripts/recompute_user_stats.py
+    def iter_user_ids(self, batch_size: int = 10000):
+        """Stream every user id with logged meals, in user_id order"""
+        last = None
+        while True:
+            keyset = "WHERE user_id > :last" if last else ""
+            rows = self.connection.execute(
+                text(f"""
+                    SELECT DISTINCT user_id FROM daily_nutrition_rollups
+                    {keyset}
+                    ORDER BY user_id
+                    LIMIT :batch_size
+                """),
+                {"last": last, "batch_size": batch_size}
+            ).fetchall()
+            for row in rows:
+                yield row[0]
+            if len(rows) < batch_size:
+                break
+            last = rows[-1][0]
+
+    def get_meal_name_counts(self, user_ids: List[str], limit: int = 5):
+        """
+        Most-logged meal names per user, case-insensitive
+        
+        Returns:
+            Dict of user_id -> [(meal_name, count), ...], most logged first
+        """
+        result = self.connection.execute(
+            text("""
+                SELECT user_id, MIN(meal_name), COUNT(*) AS times
+                FROM meal_entries
+                WHERE user_id IN :user_ids
+                GROUP BY user_id, LOWER(meal_name)
+                ORDER BY user_id, times DESC, MIN(meal_name)
+            """).bindparams(bindparam("user_ids", expanding=True)),
+            {"user_ids": list(user_ids)}
+        )
+        counts = {}
+        for user_id, meal_name, times in result:
+            names = counts.setdefault(user_id, [])
+            if len(names) < limit:
+                names.append((meal_name, times))
+        return counts
+
+    def upsert_user_stats(self, stats: Dict[str, dict], computed_for: date):
+        """Write precomputed stats for many users in one statement"""
+        if not stats:
+            return
+        self.connection.execute(
+            text("""
+                INSERT INTO user_stats (user_id, stats, computed_for, updated_at)
+                VALUES (:user_id, :stats, :computed_for, CURRENT_TIMESTAMP)
+                ON CONFLICT (user_id) DO UPDATE SET
+                    stats = EXCLUDED.stats,
+                    computed_for = EXCLUDED.computed_for,
+                    updated_at = CURRENT_TIMESTAMP
+            """),
+            [
+                {"user_id": user_id, "stats": json.dumps(user_stats),
+                 "computed_for": computed_for}
+                for user_id, user_stats in stats.items()
+            ]
+        )
+        self.commit()
+
+    def get_user_stats(self, user_id: str):
+        """
+        Stored stats for a user
+        
+        Returns:
+            (stats dict, date they were computed for), or None
+        """
+        row = self.connection.execute(
+            text("SELECT stats, computed_for FROM user_stats WHERE user_id = :user_id"),
+            {"user_id": user_id}
+        ).fetchone()
+        if row is None:
+            return None
+        stats, computed_for = row
+        if isinstance(stats, str):
+            stats = json.loads(stats)
+        if isinstance(computed_for, str):
+            computed_for = date.fromisoformat(computed_for)
+        return stats, computed_for
+    
     #Retrieve Meals for specific user and timeframe
     def get_meals_for_user_and_timeframe(self, user_id: str, start_date: datetime, end_date: datetime):
         """Retrieve meals for a specific user and timeframe"""
         print("Getting meals for user: ", user_id, " between dates: ", start_date, " and ", end_date)
-        result = self.connection.execute(
-            text("""
-                SELECT * FROM meal_entries 
-                WHERE user_id = :user_id 
-                AND DATE(created_at) BETWEEN DATE(:start_date) AND DATE(:end_date)
-            """), 
-            {"user_id": "whatsapp:" + user_id, "start_date": start_date, "end_date": end_date}
-        )
-        results = result.fetchall()
-        print("Result: ", results)
+        results = list(self.iter_meals(user_id, start_date, end_date))
+        print(f"Result: {len(results)} meals")
         
         return results
 
+    def iter_meals(self, user_id: str = None, start_date: datetime = None,
+                   end_date: datetime = None, batch_size: int = 1000, after=None):
+        """
+        Stream meals oldest first, for one user or all users, in bounded memory
+        
+        Args:
+            user_id: Only this user's meals; None for everyone
+            start_date: First day to include (inclusive); None for no lower bound
+            end_date: Last day to include (inclusive); None for no upper bound
+            batch_size: Rows per page and per server-side cursor fetch
+            after: (created_at, id) of the last row already seen, to resume
+            
+        Pages are fetched with keyset pagination on (created_at, id) through a
+        server-side cursor, so neither the database nor this process holds
+        more than one page at a time.
+        """
+        filters = []
+        params = {"batch_size": batch_size}
+        if user_id:
+            filters.append("user_id = :user_id")
+            params["user_id"] = user_id
+        if start_date:
+            filters.append("created_at >= :start_date")
+            params["start_date"] = start_date.strftime("%Y-%m-%d")
+        if end_date:
+            filters.append("created_at < :end_date")
+            params["end_date"] = (end_date + timedelta(days=1)).strftime("%Y-%m-%d")
+
+        last = tuple(after) if after else None
+        with self.engine.connect() as connection:
+            while True:
+                conditions = list(filters)
+                if last:
+                    conditions.append("(created_at, id) > (:last_created_at, :last_id)")
+                    params["last_created_at"], params["last_id"] = last
+                where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+                result = connection.execution_options(
+                    stream_results=True, yield_per=batch_size
+                ).execute(
+                    text(f"""
+                        SELECT id, user_id, meal_name, meal_description,
+                               meal_calories, meal_protein, meal_carbs, meal_fat,
+                               created_at
+                        FROM meal_entries
+                        {where}
+                        ORDER BY created_at, id
+                        LIMIT :batch_size
+                    """),
+                    params
+                )
+                count = 0
+                for row in result:
+                    count += 1
+                    last = (row.created_at, row.id)
+                    yield row
+                # End the read transaction between pages
+                connection.commit()
+                if count < batch_size:
+                    break
+
     def get_daily_context(self, user_id: str, date: datetime) -> DailyContext:
         """Get all meals for a user on a specific date and create a context object"""
         
+        # Serve from the per-user cache when possible
+        cached = self.context_cache.get(user_id)
+        if cached is not None:
+            return cached
+        
+        marker = self.context_cache.write_marker()
+        context = self._load_daily_context(user_id)
+        self.context_cache.put(user_id, context, marker)
+        return context
+
+    def _load_daily_context(self, user_id: str) -> DailyContext:
+        """Build the context object straight from the database"""
+        
         # Query meals for the day
         result = self.connection.execute(
             text("""
@@ -325,11 +1381,19 @@ class Database:
         context.calculate_totals()
         return context
 
+
+def backend_for_url(url: str):
+    """Pick the Database implementation for a SQLAlchemy URL"""
+    if url.startswith("sqlite"):
+        from app.storage.sqlite import SQLiteDatabase
+        return SQLiteDatabase
+    from app.storage.postgres import PostgresDatabase
+    return PostgresDatabase
+
+
 if __name__ == "__main__":
     db = Database()
-    connection = db.get_connection()
-    print(connection)
-    #test query
-    result = connection.execute(text("SELECT * FROM meal_entries"))
-    print(result.fetchall())
-    db.close_connection(connection)
\ No newline at end of file
+    print(db.engine)
+    #test query, streamed rather than fetched all at once
+    for row in db.iter_meals():
+        print(row)
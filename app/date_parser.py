@@ -0,0 +1,248 @@
+# Local parser for the date ranges users ask summaries for, in English and German
+
+from datetime import date, datetime, timedelta, timezone
+from typing import Optional, Tuple
+from zoneinfo import ZoneInfo
+import os
+import re
+
+# Range used when a summary request doesn't name a period
+DEFAULT_RANGE_DAYS = 7
+# "Last N days" is capped here, so a huge N can't step past date.min
+MAX_RANGE_DAYS = 366
+
+DEFAULT_TIMEZONE = os.getenv("DEFAULT_TIMEZONE", "Europe/Berlin")
+
+# Calling code -> timezone, longest prefix wins; good enough for "today"
+PHONE_TIMEZONES = {
+    "+1": "America/New_York",
+    "+31": "Europe/Amsterdam",
+    "+33": "Europe/Paris",
+    "+34": "Europe/Madrid",
+    "+39": "Europe/Rome",
+    "+41": "Europe/Zurich",
+    "+43": "Europe/Vienna",
+    "+44": "Europe/London",
+    "+45": "Europe/Copenhagen",
+    "+46": "Europe/Stockholm",
+    "+48": "Europe/Warsaw",
+    "+49": "Europe/Berlin",
+    "+61": "Australia/Sydney",
+    "+972": "Asia/Jerusalem",
+}
+
+WEEKDAYS = {
+    "monday": 0, "mon": 0, "montag": 0,
+    "tuesday": 1, "tue": 1, "dienstag": 1,
+    "wednesday": 2, "wed": 2, "mittwoch": 2,
+    "thursday": 3, "thu": 3, "donnerstag": 3,
+    "friday": 4, "fri": 4, "freitag": 4,
+    "saturday": 5, "sat": 5, "samstag": 5, "sonnabend": 5,
+    "sunday": 6, "sun": 6, "sonntag": 6,
+}
+
+MONTHS = {
+    "january": 1, "jan": 1, "januar": 1, "jänner": 1,
+    "february": 2, "feb": 2, "februar": 2,
+    "march": 3, "mar": 3, "märz": 3, "maerz": 3, "mär": 3,
+    "april": 4, "apr": 4,
+    "may": 5, "mai": 5,
+    "june": 6, "jun": 6, "juni": 6,
+    "july": 7, "jul": 7, "juli": 7,
+    "august": 8, "aug": 8,
+    "september": 9, "sep": 9, "sept": 9,
+    "october": 10, "oct": 10, "oktober": 10, "okt": 10,
+    "november": 11, "nov": 11,
+    "december": 12, "dec": 12, "dezember": 12, "dez": 12,
+}
+
+NUMBER_WORDS = {
+    "one": 1, "a": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6,
+    "seven": 7, "eight": 8, "nine": 9, "ten": 10, "fourteen": 14, "thirty": 30,
+    "ein": 1, "eine": 1, "einen": 1, "zwei": 2, "drei": 3, "vier": 4, "fünf": 5,
+    "sechs": 6, "sieben": 7, "acht": 8, "neun": 9, "zehn": 10, "vierzehn": 14,
+    "dreißig": 30,
+}
+
+_WEEKDAY = "|".join(sorted(WEEKDAYS, key=len, reverse=True))
+_MONTH = "|".join(sorted(MONTHS, key=len, reverse=True))
+_NUMBER = r"\d+|" + "|".join(sorted(NUMBER_WORDS, key=len, reverse=True))
+
+# Absolute dates: 2024-10-03, 3.10.2024, 3.10., 3/10, 3 october, 3. oktober, october 3
+_DATE = re.compile(
+    r"(?P<iso>\b\d{4}-\d{1,2}-\d{1,2}\b)"
+    r"|(?P<dmy>\b\d{1,2}[./]\d{1,2}(?:[./](?:\d{4}|\d{2})\b|\.|\b))"
+    r"|(?P<day_month>\b\d{1,2}\.?\s*(?:" + _MONTH + r")\b)"
+    r"|(?P<month_day>\b(?:" + _MONTH + r")\s+\d{1,2}(?:st|nd|rd|th)?\b)"
+)
+_SINCE = re.compile(r"\b(?:since|from|starting|seit|ab|vom|von)\b")
+_DAY_BEFORE_YESTERDAY = re.compile(r"\b(?:day before yesterday|vorgestern)\b")
+_YESTERDAY = re.compile(r"\b(?:yesterday|gestern)\b")
+_SINCE_YESTERDAY = re.compile(r"\b(?:since|seit|ab)\s+(?:yesterday|gestern)\b")
+_TODAY = re.compile(r"\b(?:today|heute|tonight|heut)\b")
+_LAST_N = re.compile(
+    r"\b(?P<n>" + _NUMBER + r")[\s-]+(?P<unit>days?|tagen?|weeks?|wochen?|months?|monate?n?)\b"
+)
+_SINCE_WEEKDAY = re.compile(r"\b(?:since|seit|from|ab)\s+(?:last\s+|letztem\s+|dem\s+)?(?P<day>" + _WEEKDAY + r")\b")
+_ON_WEEKDAY = re.compile(r"\b(?P<day>" + _WEEKDAY + r")\b")
+_THIS_WEEK = re.compile(r"\b(?:this week|current week|diese woche|dieser woche|aktuelle woche|aktuellen woche)\b")
+_LAST_WEEK = re.compile(r"\b(?:last week|previous week|letzte woche|letzten woche|vorige woche|vorigen woche|vergangene woche|vergangenen woche|vorwoche)\b")
+_WEEK = re.compile(r"\b(?:week|weekly|woche|wochen|wöchentlich|wochenübersicht)\b")
+_THIS_MONTH = re.compile(r"\b(?:this month|current month|diesen monat|dieser monat|diesem monat|aktuellen monat)\b")
+_LAST_MONTH = re.compile(r"\b(?:last month|previous month|letzten monat|letzter monat|vorigen monat|vergangenen monat|vormonat)\b")
+_MONTH_WORD = re.compile(r"\b(?:month|monthly|monat|monatlich|monats)\b")
+# Anything that looks like a date we didn't manage to read; short forms
+# like "may" or "sun" are left out since they are common words
+_UNREAD_NAMES = "|".join(name for name in (*WEEKDAYS, *MONTHS) if len(name) > 3)
+_UNREAD = re.compile(r"\d|\b(?:" + _UNREAD_NAMES + r"|until|bis|before|between|zwischen)\b")
+
+
+def user_timezone(user_id: str) -> ZoneInfo:
+    """Guess a user's timezone from the calling code of their WhatsApp number"""
+    number = user_id.replace("whatsapp:", "") if user_id else ""
+    for prefix in sorted(PHONE_TIMEZONES, key=len, reverse=True):
+        if number.startswith(prefix):
+            return ZoneInfo(PHONE_TIMEZONES[prefix])
+    return ZoneInfo(DEFAULT_TIMEZONE)
+
+
+def today_for(user_id: str) -> date:
+    """The current date where the user is"""
+    return datetime.now(user_timezone(user_id)).date()
+
+
+def local_time(moment: datetime, tz: ZoneInfo) -> datetime:
+    """A stored timestamp (naive UTC) as naive wall-clock time in tz"""
+    return moment.replace(tzinfo=timezone.utc).astimezone(tz).replace(tzinfo=None)
+
+
+def local_date(user_id: str, moment) -> date:
+    """The user's date at a stored timestamp (naive UTC, or its ISO string)"""
+    if isinstance(moment, str):
+        moment = datetime.fromisoformat(moment)
+    if not isinstance(moment, datetime):
+        return moment
+    return local_time(moment, user_timezone(user_id)).date()
+
+
+def parse_date_range(message: str, today: date) -> Optional[Tuple[date, date]]:
+    """
+    Resolve the period a summary request talks about, relative to today
+
+    Handles English and German phrases such as "last 3 days", "die letzten
+    drei Tage", "this week", "seit Montag", "yesterday", "vom 1.10. bis
+    5.10.". A request without any period gets the last DEFAULT_RANGE_DAYS.
+
+    Returns:
+        (start_date, end_date), both inclusive, or None if the message names
+        a period that couldn't be read
+    """
+    text = message.lower()
+
+    # Absolute dates win over relative words
+    dates = []
+    for match in _DATE.finditer(text):
+        parsed = _parse_date(match, today)
+        if parsed is None:
+            return None
+        dates.append(parsed)
+    if len(dates) >= 2:
+        return min(dates), max(dates)
+    if len(dates) == 1:
+        if _SINCE.search(text):
+            return (dates[0], today) if dates[0] <= today else None
+        return dates[0], dates[0]
+
+    match = _SINCE_WEEKDAY.search(text)
+    if match:
+        return _last_weekday(today, WEEKDAYS[match.group("day")]), today
+
+    if _DAY_BEFORE_YESTERDAY.search(text):
+        day = today - timedelta(days=2)
+        return day, day
+    if _YESTERDAY.search(text):
+        day = today - timedelta(days=1)
+        # "since yesterday" / "seit gestern" runs through today
+        return (day, today) if _SINCE_YESTERDAY.search(text) else (day, day)
+    if _TODAY.search(text):
+        return today, today
+
+    match = _LAST_N.search(text)
+    if match:
+        count = _number(match.group("n"))
+        if count is None or count < 1:
+            return None
+        unit = match.group("unit")
+        if unit.startswith(("day", "tag")):
+            days = count
+        elif unit.startswith(("week", "woche")):
+            days = count * 7
+        else:
+            days = count * 30
+        days = min(days, MAX_RANGE_DAYS)
+        return today - timedelta(days=days - 1), today
+
+    if _THIS_WEEK.search(text):
+        return today - timedelta(days=today.weekday()), today
+    if _LAST_WEEK.search(text):
+        end = today - timedelta(days=today.weekday() + 1)
+        return end - timedelta(days=6), end
+    if _THIS_MONTH.search(text):
+        return today.replace(day=1), today
+    if _LAST_MONTH.search(text):
+        end = today.replace(day=1) - timedelta(days=1)
+        return end.replace(day=1), end
+
+    match = _ON_WEEKDAY.search(text)
+    if match:
+        day = _last_weekday(today, WEEKDAYS[match.group("day")])
+        return day, day
+
+    if _WEEK.search(text):
+        return today - timedelta(days=6), today
+    if _MONTH_WORD.search(text):
+        return today - timedelta(days=29), today
+
+    if _UNREAD.search(text):
+        return None
+    return today - timedelta(days=DEFAULT_RANGE_DAYS - 1), today
+
+
+def _number(token: str) -> Optional[int]:
+    if token.isdigit():
+        return int(token)
+    return NUMBER_WORDS.get(token)
+
+
+def _last_weekday(today: date, weekday: int) -> date:
+    """Most recent given weekday, today included"""
+    return today - timedelta(days=(today.weekday() - weekday) % 7)
+
+
+def _parse_date(match, today: date) -> Optional[date]:
+    """Turn one _DATE match into a date; year defaults to the last occurrence"""
+    token = match.group(0)
+    year = None
+    try:
+        if match.group("iso"):
+            return date.fromisoformat("-".join(part.zfill(2) for part in token.split("-")))
+        if match.group("dmy"):
+            parts = [part for part in re.split(r"[./]", token) if part]
+            day, month = int(parts[0]), int(parts[1])
+            if len(parts) > 2:
+                year = int(parts[2])
+                year = year + 2000 if year < 100 else year
+        elif match.group("day_month"):
+            day = int(re.match(r"\d+", token).group(0))
+            month = MONTHS[re.search(_MONTH, token).group(0)]
+        else:
+            month = MONTHS[re.match(_MONTH, token).group(0)]
+            day = int(re.search(r"\d+", token).group(0))
+
+        if year is not None:
+            return date(year, month, day)
+        parsed = date(today.year, month, day)
+        # "3.12." asked in January means last December
+        return parsed if parsed <= today else date(today.year - 1, month, day)
+    except ValueError:
+        return None
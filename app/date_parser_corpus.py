@@ -0,0 +1,73 @@
+# Summary requests in English and German with the ranges they should
+# resolve to; shared by the tests and scripts/bench_date_parser.py
+
+from datetime import date
+
+# Anchor for every case: Wednesday 16 October 2024
+TODAY = date(2024, 10, 16)
+
+# (message, expected (start, end) or None for "hand to the agent")
+CORPUS = [
+    # No period named -> default range
+    ("summary", (date(2024, 10, 10), TODAY)),
+    ("Can I get a summary please?", (date(2024, 10, 10), TODAY)),
+    ("Zusammenfassung bitte", (date(2024, 10, 10), TODAY)),
+    # Single days
+    ("today", (TODAY, TODAY)),
+    ("How did I do today?", (TODAY, TODAY)),
+    ("Wie war heute?", (TODAY, TODAY)),
+    ("yesterday", (date(2024, 10, 15), date(2024, 10, 15))),
+    ("Zusammenfassung von gestern", (date(2024, 10, 15), date(2024, 10, 15))),
+    ("vorgestern", (date(2024, 10, 14), date(2024, 10, 14))),
+    ("the day before yesterday", (date(2024, 10, 14), date(2024, 10, 14))),
+    ("since yesterday", (date(2024, 10, 15), TODAY)),
+    ("seit gestern", (date(2024, 10, 15), TODAY)),
+    # Last N days / weeks / months
+    ("Summary of the last 3 days", (date(2024, 10, 14), TODAY)),
+    ("last three days", (date(2024, 10, 14), TODAY)),
+    ("past 10 days", (date(2024, 10, 7), TODAY)),
+    ("my 3-day summary", (date(2024, 10, 14), TODAY)),
+    ("die letzten 3 Tage", (date(2024, 10, 14), TODAY)),
+    ("Übersicht der letzten drei Tage", (date(2024, 10, 14), TODAY)),
+    ("letzte 5 tage", (date(2024, 10, 12), TODAY)),
+    ("last 2 weeks", (date(2024, 10, 3), TODAY)),
+    ("die letzten zwei Wochen", (date(2024, 10, 3), TODAY)),
+    ("letzten 2 Monate", (date(2024, 8, 18), TODAY)),
+    # Weeks
+    ("this week", (date(2024, 10, 14), TODAY)),
+    ("diese Woche", (date(2024, 10, 14), TODAY)),
+    ("last week", (date(2024, 10, 7), date(2024, 10, 13))),
+    ("letzte Woche", (date(2024, 10, 7), date(2024, 10, 13))),
+    ("vergangene Woche bitte", (date(2024, 10, 7), date(2024, 10, 13))),
+    ("weekly summary", (date(2024, 10, 10), TODAY)),
+    ("Wochenübersicht", (date(2024, 10, 10), TODAY)),
+    # Months
+    ("this month", (date(2024, 10, 1), TODAY)),
+    ("diesen Monat", (date(2024, 10, 1), TODAY)),
+    ("last month", (date(2024, 9, 1), date(2024, 9, 30))),
+    ("letzten Monat", (date(2024, 9, 1), date(2024, 9, 30))),
+    ("monthly summary", (date(2024, 9, 17), TODAY)),
+    # Weekdays
+    ("since Monday", (date(2024, 10, 14), TODAY)),
+    ("seit Montag", (date(2024, 10, 14), TODAY)),
+    ("since last friday", (date(2024, 10, 11), TODAY)),
+    ("ab Sonntag", (date(2024, 10, 13), TODAY)),
+    ("since wednesday", (TODAY, TODAY)),
+    ("what did I eat on Tuesday", (date(2024, 10, 15), date(2024, 10, 15))),
+    ("am Samstag", (date(2024, 10, 12), date(2024, 10, 12))),
+    # Absolute dates
+    ("2024-10-01", (date(2024, 10, 1), date(2024, 10, 1))),
+    ("from 2024-10-01 to 2024-10-05", (date(2024, 10, 1), date(2024, 10, 5))),
+    ("vom 1.10. bis 5.10.", (date(2024, 10, 1), date(2024, 10, 5))),
+    ("vom 01.10.2024 bis 05.10.2024", (date(2024, 10, 1), date(2024, 10, 5))),
+    ("seit 10.10.", (date(2024, 10, 10), TODAY)),
+    ("since October 3rd", (date(2024, 10, 3), TODAY)),
+    ("3. Oktober", (date(2024, 10, 3), date(2024, 10, 3))),
+    ("between 28 september and 2 october", (date(2024, 9, 28), date(2024, 10, 2))),
+    ("20.12.", (date(2023, 12, 20), date(2023, 12, 20))),
+    # Things we should not guess at
+    ("since the 32.13.", None),
+    ("until christmas", None),
+    ("summary for 2", None),
+    ("bis Weihnachten", None),
+]
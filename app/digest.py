@@ -0,0 +1,171 @@
+# Proactive end-of-day and weekly nutrition digests for every active user
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from itertools import groupby
+from typing import Dict, Iterator, Optional, Tuple
+import json
+import os
+import threading
+import time
+
+from app import summary_engine
+from app.rate_limit import TokenBucket
+
+DIGEST_TITLES = {
+    "daily": "🌙 Your end-of-day nutrition digest",
+    "weekly": "🗓️ Your weekly nutrition digest",
+}
+
+
+def digest_range(kind: str, day: date) -> Tuple[date, date]:
+    """Date range a digest covers, ending on day"""
+    if kind == "daily":
+        return day, day
+    if kind == "weekly":
+        return day - timedelta(days=6), day
+    raise ValueError(f"Unknown digest kind: {kind}")
+
+
+def iter_digests(db, kind: str, start_date: date, end_date: date,
+                 after_user_id: str = None) -> Iterator[Tuple[str, str]]:
+    """
+    Yield (user_id, rendered digest) for every user with meals in the range
+
+    Reads all users' rollups in a single streamed pass, ordered by user, and
+    renders locally without calling a model.
+    """
+    rows = db.iter_daily_rollups(start_date, end_date, after_user_id=after_user_id)
+    for user_id, user_rows in groupby(rows, key=lambda row: row[0]):
+        summary = summary_engine.build_summary(
+            [row[1:] for row in user_rows], start_date, end_date
+        )
+        yield user_id, render_digest(kind, summary)
+
+
+def render_digest(kind: str, summary: summary_engine.NutritionSummary) -> str:
+    return "\n\n".join([
+        DIGEST_TITLES[kind],
+        summary_engine.render_summary_table(summary),
+        summary_engine.fallback_comment(summary),
+    ])
+
+
+class DigestCheckpoint:
+    """
+    Progress of a digest run, saved as JSON so an interrupted run can resume
+
+    Users are processed in user_id order; `watermark` is the highest user_id
+    such that every user up to it has been handled, so resuming skips them.
+    """
+
+    def __init__(self, path: str, run_key: str):
+        self.path = path
+        self.run_key = run_key
+        self.watermark: Optional[str] = None
+        self.sent = 0
+        self.failed = 0
+        self._lock = threading.Lock()
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return self
+        with open(self.path) as f:
+            data = json.load(f)
+        if data.get("run_key") != self.run_key:
+            print(f"Checkpoint {self.path} belongs to another run ({data.get('run_key')}); starting fresh")
+            return self
+        self.watermark = data.get("watermark")
+        self.sent = data.get("sent", 0)
+        self.failed = data.get("failed", 0)
+        return self
+
+    def save(self):
+        with self._lock:
+            data = {"run_key": self.run_key, "watermark": self.watermark,
+                    "sent": self.sent, "failed": self.failed}
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+
+class DigestSender:
+    """
+    Fans digests out to Twilio from a pool of threads behind one rate limiter
+
+    Sends complete out of order, so the checkpoint watermark only advances
+    over the contiguous prefix of finished users.
+    """
+
+    def __init__(self, twilio_client, checkpoint: DigestCheckpoint,
+                 rate: float = None, workers: int = 32, dry_run: bool = False,
+                 checkpoint_every: float = 2.0, failures_path: str = None):
+        self.twilio_client = twilio_client
+        self.checkpoint = checkpoint
+        self.bucket = TokenBucket(rate) if rate else TokenBucket()
+        self.workers = workers
+        self.dry_run = dry_run
+        self.checkpoint_every = checkpoint_every
+        self.failures_path = failures_path or f"{checkpoint.path}.failures"
+
+        self._lock = threading.Lock()
+        self._order = []            # user_ids in submission order, not yet folded into the watermark
+        self._done: Dict[str, bool] = {}
+        # Bounds how far submission can run ahead of the senders
+        self._slots = threading.BoundedSemaphore(workers * 4)
+
+    def _send(self, user_id: str, body: str):
+        ok = False
+        try:
+            self.bucket.acquire()
+            if self.dry_run:
+                ok = True
+            else:
+                ok = self.twilio_client.send_message(message=body, to=user_id) is not None
+        except Exception as e:
+            print(f"Error sending digest to {user_id}: {e}")
+        finally:
+            self._finish(user_id, ok)
+            self._slots.release()
+
+    def _finish(self, user_id: str, ok: bool):
+        with self._lock:
+            self._done[user_id] = ok
+            if ok:
+                self.checkpoint.sent += 1
+            else:
+                self.checkpoint.failed += 1
+                with open(self.failures_path, "a") as f:
+                    f.write(f"{user_id}\n")
+            # Advance the watermark over the finished prefix
+            while self._order and self._order[0] in self._done:
+                finished = self._order.pop(0)
+                self._done.pop(finished)
+                self.checkpoint.watermark = finished
+
+    def run(self, digests: Iterator[Tuple[str, str]]):
+        started = time.perf_counter()
+        last_save = started
+        submitted = 0
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            for user_id, body in digests:
+                self._slots.acquire()
+                with self._lock:
+                    self._order.append(user_id)
+                pool.submit(self._send, user_id, body)
+                submitted += 1
+
+                now = time.perf_counter()
+                if now - last_save >= self.checkpoint_every:
+                    self.checkpoint.save()
+                    last_save = now
+                    print(f"{submitted} submitted, {self.checkpoint.sent} sent, "
+                          f"{self.checkpoint.failed} failed, "
+                          f"{self.checkpoint.sent / (now - started):,.1f} msg/s")
+        self.checkpoint.save()
+        elapsed = time.perf_counter() - started
+        print(f"Done: {self.checkpoint.sent} sent, {self.checkpoint.failed} failed "
+              f"in {elapsed:.1f}s")
@@ -0,0 +1,47 @@
+# Time-ordered identifiers for database rows
+
+import secrets
+import threading
+import time
+import uuid
+
+_lock = threading.Lock()
+_last_ms = 0
+_counter = 0
+
+
+def uuid7() -> uuid.UUID:
+    """
+    Generate a UUIDv7 (RFC 9562): 48-bit Unix milliseconds, then random bits.
+
+    IDs created later sort later, so new rows land at the right edge of the
+    primary key index instead of scattering across it. Within the same
+    millisecond a 12-bit counter (seeded randomly) keeps IDs monotonic.
+    """
+    global _last_ms, _counter
+    with _lock:
+        now_ms = time.time_ns() // 1_000_000
+        if now_ms > _last_ms:
+            _last_ms = now_ms
+            # Leave half the counter space for IDs in the same millisecond
+            _counter = secrets.randbits(11)
+        else:
+            _counter += 1
+            if _counter > 0xFFF:
+                # Counter exhausted: borrow the next millisecond
+                _last_ms += 1
+                _counter = 0
+        timestamp_ms = _last_ms
+        counter = _counter
+
+    value = (timestamp_ms & 0xFFFFFFFFFFFF) << 80
+    value |= 0x7 << 76
+    value |= counter << 64
+    value |= 0b10 << 62
+    value |= secrets.randbits(62)
+    return uuid.UUID(int=value)
+
+
+def new_id() -> str:
+    """A new UUIDv7 as its canonical string, ready to bind as a query parameter"""
+    return str(uuid7())
@@ -0,0 +1,296 @@
+# Durable local inbox: raw inbound webhooks are appended to a write-ahead log
+# before they are processed, and replayed on startup if processing never finished
+
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import fcntl
+import json
+import os
+import struct
+import threading
+import time
+import zlib
+
+from app.ids import new_id
+
+INBOX_DIR = os.getenv("INBOX_DIR", "inbox")
+# A segment is sealed and a new one started past this size
+INBOX_SEGMENT_BYTES = int(os.getenv("INBOX_SEGMENT_BYTES", str(16 * 1024 * 1024)))
+# Compact once this many sealed segments have piled up
+INBOX_COMPACT_SEGMENTS = int(os.getenv("INBOX_COMPACT_SEGMENTS", "4"))
+# "group" batches concurrent fsyncs, "always" fsyncs every record, "off" leaves it to the OS
+INBOX_SYNC = os.getenv("INBOX_SYNC", "group")
+# A message that took the process down this many times isn't replayed again
+INBOX_MAX_REPLAYS = int(os.getenv("INBOX_MAX_REPLAYS", "3"))
+# Worker processes each lock one slot directory of their own
+INBOX_SLOTS = 64
+
+_HEADER = struct.Struct(">II")    # payload length, crc32 of the payload
+
+
+def encode_record(record: Dict[str, Any]) -> bytes:
+    payload = json.dumps(record, separators=(",", ":")).encode("utf-8")
+    return _HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def read_segment(path: str) -> Iterator[Dict[str, Any]]:
+    """
+    Records of one segment in order
+
+    Stops at the first torn or corrupt record: that is where a crash cut
+    the last write short, and nothing after it was acknowledged.
+    """
+    with open(path, "rb") as f:
+        while True:
+            header = f.read(_HEADER.size)
+            if len(header) < _HEADER.size:
+                return
+            length, crc = _HEADER.unpack(header)
+            payload = f.read(length)
+            if len(payload) < length or zlib.crc32(payload) != crc:
+                print(f"Inbox segment {path} ends in a torn record; ignoring the rest")
+                return
+            yield json.loads(payload)
+
+
+def _fsync_dir(path: str):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class InboundLog:
+    """
+    Append-only log of inbound webhook payloads, in numbered segment files
+
+    Each payload is written as a "received" record and made durable before
+    the workflow runs; a "done" record follows once the turn has finished.
+    With sync="group", concurrent writers share fsyncs: the first writer to
+    need one becomes the leader and syncs everything written so far while
+    the others wait for it, so one fsync covers a whole burst.
+
+    Segments are sealed at segment_bytes. Once compact_segments of them
+    have piled up, the received records still without a done record are
+    carried forward into the active segment and the sealed ones deleted.
+    """
+
+    def __init__(self, root: str, segment_bytes: int = INBOX_SEGMENT_BYTES,
+                 sync: str = INBOX_SYNC, compact_segments: int = INBOX_COMPACT_SEGMENTS):
+        if sync not in ("group", "always", "off"):
+            raise ValueError(f"Unknown inbox sync mode: {sync}")
+        self.root = root
+        self.segment_bytes = segment_bytes
+        self.sync = sync
+        self.compact_segments = compact_segments
+
+        self._cond = threading.Condition()
+        self._file = None
+        self._segment = 0
+        self._size = 0
+        self._written = 0       # records handed to the OS
+        self._synced = 0        # records known to be on disk
+        self._syncing = False
+        self._compacting = False
+
+        self.records = 0
+        self.fsyncs = 0
+        self.rotations = 0
+        self.compactions = 0
+
+    # Segments
+    def _segments(self) -> List[Tuple[int, str]]:
+        segments = []
+        for name in os.listdir(self.root):
+            if name.endswith(".wal"):
+                segments.append((int(name[:-4]), os.path.join(self.root, name)))
+        return sorted(segments)
+
+    def _open_segment(self, number: int):
+        path = os.path.join(self.root, f"{number:08d}.wal")
+        # Unbuffered: every write goes straight to the OS, fsync makes it durable
+        self._file = open(path, "ab", buffering=0)
+        self._segment = number
+        self._size = self._file.tell()
+        _fsync_dir(self.root)
+
+    def open(self) -> "InboundLog":
+        """Start a fresh segment; earlier ones are kept for replay()"""
+        os.makedirs(self.root, exist_ok=True)
+        segments = self._segments()
+        self._open_segment(segments[-1][0] + 1 if segments else 1)
+        return self
+
+    def close(self):
+        with self._cond:
+            while self._syncing:
+                self._cond.wait()
+            if self._file is not None:
+                if self.sync != "off":
+                    os.fsync(self._file.fileno())
+                self._file.close()
+                self._file = None
+
+    def _rotate(self):
+        """Seal the active segment (caller holds the lock)"""
+        while self._syncing:
+            self._cond.wait()
+        if self.sync != "off":
+            os.fsync(self._file.fileno())
+            self._synced = self._written
+        self._file.close()
+        self._open_segment(self._segment + 1)
+        self.rotations += 1
+        if len(self._segments()) - 1 >= self.compact_segments and not self._compacting:
+            self._compacting = True
+            threading.Thread(target=self.compact, name="inbox-compact", daemon=True).start()
+
+    # Writes
+    def append(self, record: Dict[str, Any], durable: bool = True):
+        """Append a record; with durable, return only once it's on disk"""
+        data = encode_record(record)
+        with self._cond:
+            if self._size + len(data) > self.segment_bytes and self._size > 0:
+                self._rotate()
+            self._file.write(data)
+            self._size += len(data)
+            self._written += 1
+            self.records += 1
+            seq = self._written
+
+            if self.sync == "off" or not durable:
+                return
+            if self.sync == "always":
+                os.fsync(self._file.fileno())
+                self.fsyncs += 1
+                self._synced = seq
+                return
+
+            # Group commit: lead an fsync or wait for the one in progress
+            while self._synced < seq:
+                if self._syncing:
+                    self._cond.wait()
+                    continue
+                self._syncing = True
+                target = self._written
+                fd = self._file.fileno()
+                self._cond.release()
+                try:
+                    os.fsync(fd)
+                finally:
+                    self._cond.acquire()
+                    self._syncing = False
+                    self.fsyncs += 1
+                    self._synced = max(self._synced, target)
+                    self._cond.notify_all()
+
+    def record_received(self, form: Dict[str, Any]) -> str:
+        """Durably log a webhook payload; returns its entry id (the MessageSid when there is one)"""
+        entry_id = form.get("MessageSid") or new_id()
+        self.append({"type": "received", "id": entry_id, "at": time.time(), "form": form})
+        return entry_id
+
+    def record_replay(self, entry_id: str):
+        self.append({"type": "replay", "id": entry_id})
+
+    def record_done(self, entry_id: str):
+        # Not waited for: it rides along with the next fsync, and losing it
+        # only means the entry is replayed once more
+        self.append({"type": "done", "id": entry_id}, durable=False)
+
+    # Reads
+    def _scan(self, segments: List[Tuple[int, str]]):
+        """Received records without a done record, in log order, and their replay counts"""
+        received: Dict[str, Dict[str, Any]] = {}
+        replays: Dict[str, int] = {}
+        done = set()
+        for _, path in segments:
+            if not os.path.exists(path):
+                # Removed by a compaction that finished meanwhile
+                continue
+            for record in read_segment(path):
+                entry_id = record["id"]
+                if record["type"] == "received":
+                    # A webhook retried by Twilio has the same MessageSid; keep the first
+                    received.setdefault(entry_id, record)
+                elif record["type"] == "replay":
+                    replays[entry_id] = replays.get(entry_id, 0) + 1
+                elif record["type"] == "done":
+                    done.add(entry_id)
+        pending = [record for entry_id, record in received.items() if entry_id not in done]
+        return pending, replays
+
+    def pending(self) -> List[Tuple[Dict[str, Any], int]]:
+        """(received record, times already replayed) for every unfinished entry"""
+        pending, replays = self._scan(self._segments())
+        return [(record, replays.get(record["id"], 0)) for record in pending]
+
+    # Compaction
+    def compact(self):
+        """Carry unfinished entries into the active segment and delete the sealed ones"""
+        try:
+            with self._cond:
+                sealed = [s for s in self._segments() if s[0] < self._segment]
+            if not sealed:
+                return
+            pending, replays = self._scan(sealed)
+            # Entries finished since the scan have their done record in the active
+            # segment, so carrying them forward is harmless
+            for record in pending:
+                self.append(record, durable=False)
+                for _ in range(replays.get(record["id"], 0)):
+                    self.append({"type": "replay", "id": record["id"]}, durable=False)
+            with self._cond:
+                if self.sync != "off":
+                    while self._syncing:
+                        self._cond.wait()
+                    os.fsync(self._file.fileno())
+                    self._synced = self._written
+            for _, path in sealed:
+                os.remove(path)
+            _fsync_dir(self.root)
+            self.compactions += 1
+            print(f"Inbox compacted {len(sealed)} segment(s), carried {len(pending)} unfinished entries forward")
+        except Exception as e:
+            print(f"Inbox compaction failed: {e}")
+        finally:
+            self._compacting = False
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            stats = {
+                "root": self.root,
+                "sync": self.sync,
+                "active_segment": self._segment,
+                "active_segment_bytes": self._size,
+                "records": self.records,
+                "fsyncs": self.fsyncs,
+                "records_per_fsync": round(self.records / self.fsyncs, 2) if self.fsyncs else None,
+                "rotations": self.rotations,
+                "compactions": self.compactions,
+            }
+        stats["segments"] = len(self._segments())
+        return stats
+
+
+def open_inbox(root: str = INBOX_DIR, **kwargs) -> Tuple[InboundLog, Any]:
+    """
+    Open this process's inbox
+
+    Every worker process locks the first free slot directory under root and
+    keeps the lock for its lifetime, so workers never share a log, and after
+    a restart each slot (with whatever it left unfinished) is taken over by
+    one of the new workers. Returns the log and the lock file to keep open.
+    """
+    os.makedirs(root, exist_ok=True)
+    for slot in range(INBOX_SLOTS):
+        slot_dir = os.path.join(root, f"slot-{slot:02d}")
+        os.makedirs(slot_dir, exist_ok=True)
+        lock = open(os.path.join(slot_dir, "lock"), "w")
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock.close()
+            continue
+        return InboundLog(slot_dir, **kwargs).open(), lock
+    raise RuntimeError(f"All {INBOX_SLOTS} inbox slots under {root} are locked")
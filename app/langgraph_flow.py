@@ -1,33 +1,50 @@
 from langgraph.graph import StateGraph, START, END
 from IPython.display import Image, display
+import asyncio
+import os
 
 
 import app.models as models
+from app.database import Database
 from app.agents.router import Router
 from app.agents.meal_tracking import Meal_Tracker
 from app.agents.synthesizer import Synthesizer
 from app.agents.transcriber import Transcriber
 from app.agents.summary import Summary_Creator
+from app.agents.quick_log import Quick_Logger
+from app.agents.correction import Meal_Corrector
+from app.checkpoints import create_checkpointer
+from app.circuit import CircuitOpenError
+from app.ids import new_id
+
+# Runs of one message (the failed node onwards) before the error is returned
+GRAPH_ATTEMPTS = int(os.getenv("GRAPH_ATTEMPTS", "2"))
 
 class Workflow:
     """Workflow class for the LangGraph flow"""
    
-    def __init__(self):
+    def __init__(self, db: Database = None):
         # Create the state graph with the State class as the schema
         self.graph = StateGraph(state_schema=models.State)
+        # One pooled data-access object shared by every agent
+        self.db = db or Database()
         
         # Initialize agents
         self.transcriber = Transcriber()
-        self.router = Router()
-        self.meal_tracking_agent = Meal_Tracker()
-        self.synthesizer = Synthesizer()
-        self.summary_creator = Summary_Creator()
+        self.quick_logger = Quick_Logger(self.db)
+        self.router = Router(self.db)
+        self.meal_tracking_agent = Meal_Tracker(self.db)
+        self.synthesizer = Synthesizer(self.db)
+        self.summary_creator = Summary_Creator(self.db)
+        self.meal_corrector = Meal_Corrector(self.db)
         # Initialize nodes
         self.graph.add_node("transcriber", self.transcriber)
+        self.graph.add_node("quick_logger", self.quick_logger)
         self.graph.add_node("router", self.router)
         self.graph.add_node("meal_tracking_agent", self.meal_tracking_agent)
         self.graph.add_node("synthesizer", self.synthesizer)
         self.graph.add_node("summary_creator", self.summary_creator)
+        self.graph.add_node("meal_corrector", self.meal_corrector)
 
     
         # Add edges
@@ -36,11 +53,18 @@ class Workflow:
         self.graph.add_conditional_edges(
             START,
             # check if audio is present
-            lambda state: len(state.message.media_items) > 0 and state.message.media_items[0]["type"].startswith("audio"),
-            {True: "transcriber", False: "router"}
+            lambda state: any(media["type"].startswith("audio") for media in state.message.media_items or []),
+            {True: "transcriber", False: "quick_logger"}
         )
 
-        self.graph.add_edge("transcriber", "router")
+        self.graph.add_edge("transcriber", "quick_logger")
+        
+        # Quick-log commands are answered locally; everything else goes to the router
+        self.graph.add_conditional_edges(
+            "quick_logger",
+            lambda state: state.response is not None,
+            {True: END, False: "router"}
+        )
         
         #Conditional edge based on whether the router set a response
         self.graph.add_conditional_edges(
@@ -49,15 +73,18 @@ class Workflow:
             {
                 "meal_tracking": "meal_tracking_agent", 
                 "summary": "summary_creator", 
+                "correction": "meal_corrector",
                 "other": END
             }
         )
         self.graph.add_edge("meal_tracking_agent", "synthesizer")
         self.graph.add_edge("summary_creator", END)
+        self.graph.add_edge("meal_corrector", END)
         self.graph.add_edge("synthesizer", END)
         
-        # Compile the graph
-        self.compiled_graph = self.graph.compile()
+        # Compile the graph; checkpoints let a failed run resume from its last completed node
+        self.checkpointer = create_checkpointer(self.db)
+        self.compiled_graph = self.graph.compile(checkpointer=self.checkpointer)
         
     # Display graph
     def save_display_graph(self):
@@ -65,19 +92,58 @@ class Workflow:
         self.compiled_graph.get_graph().draw_mermaid_png(output_file_path="graph.png")
 
     # Run graph with a state instance
-    async def run_graph(self, state_instance):
+    async def run_graph(self, state_instance, run_id: str = None):
         """
         Run the workflow with a specific state instance
         
         Args:
             state_instance: An instance of the State class
+            run_id: Checkpoint key, the message's MessageSid. A run with this id
+                that was interrupted (crash, failed node) resumes where it
+                stopped instead of starting over, so meals aren't analysed
+                and logged twice.
             
         Returns: 
             Final state after running the workflow
         """
         #clip initial state to 100 characters
         print(f"Running graph with initial state: {str(state_instance)[:100]}...")
-        result = await self.compiled_graph.ainvoke(state_instance)
-        #print(f"Graph result type: {type(result)}")
-        #print(f"Graph result contents: {result}")
-        return result
\ No newline at end of file
+        if self.checkpointer is None:
+            return await self.compiled_graph.ainvoke(state_instance)
+        # Without a MessageSid the run can still resume after a failed node, but only here
+        run_id = run_id or new_id()
+
+        config = {"configurable": {"thread_id": run_id}}
+        snapshot = await self.compiled_graph.aget_state(config)
+        graph_input = state_instance
+        if snapshot.next == ("transcriber",):
+            # Nothing ran yet, and the stored message points at audio that was
+            # released with the old request; this one has just downloaded it again
+            print(f"Restarting run {run_id} from the start")
+            self.checkpointer.delete_thread(run_id)
+        elif snapshot.next:
+            print(f"Resuming run {run_id} at {', '.join(snapshot.next)}")
+            graph_input = None
+        elif snapshot.values:
+            # Finished before, but the completion wasn't recorded; don't run it again
+            print(f"Run {run_id} already completed")
+            self.checkpointer.delete_thread(run_id)
+            return snapshot.values
+
+        for attempt in range(1, GRAPH_ATTEMPTS + 1):
+            try:
+                result = await self.compiled_graph.ainvoke(graph_input, config)
+                break
+            except Exception as e:
+                # An open circuit won't have closed by the next attempt
+                if attempt == GRAPH_ATTEMPTS or isinstance(e, CircuitOpenError):
+                    # Kept in the database for a replay, but not in memory
+                    self.checkpointer.evict(run_id)
+                    raise
+                print(f"Run {run_id} failed ({e}); resuming from the last completed node")
+                graph_input = None
+                await asyncio.sleep(0.5 * attempt)
+        
+        # Completed: the checkpoints aren't needed any more
+        self.checkpointer.delete_thread(run_id)
+        return result
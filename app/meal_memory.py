@@ -0,0 +1,301 @@
+# Per-user nearest-neighbour memory of past meals, so "my usual breakfast"
+# or a small variation reuses the numbers the user already logged
+
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+import json
+import os
+import re
+import threading
+import time
+import zlib
+
+import numpy as np
+
+EMBEDDING_DIM = 512
+# Similarity at which a past meal is reused without asking the model
+REUSE_THRESHOLD = float(os.getenv("MEAL_MEMORY_REUSE_THRESHOLD", "0.9"))
+# Similarity at which a past meal is shown to the model as a reference
+HINT_THRESHOLD = float(os.getenv("MEAL_MEMORY_HINT_THRESHOLD", "0.5"))
+# Users' indexes are spread over this many directories
+SHARDS = 256
+# Users hashing to the same stripe share a lock
+LOCK_STRIPES = 64
+# Changed indexes are written to disk at most this often
+SAVE_INTERVAL_SECONDS = float(os.getenv("MEAL_MEMORY_SAVE_SECONDS", "30"))
+
+_WORD = re.compile(r"\w+")
+_NUMBER = re.compile(r"\d+(?:[.,]\d+)?|[½¼¾]")
+# Amounts spelled out; articles are left out, the model's descriptions use them freely
+NUMBER_WORDS = {
+    "one": "1", "single": "1", "two": "2", "couple": "2", "three": "3", "four": "4",
+    "five": "5", "six": "6", "half": "0.5", "quarter": "0.25", "double": "2",
+    "zwei": "2", "drei": "3", "vier": "4", "fünf": "5", "sechs": "6",
+    "halb": "0.5", "halbe": "0.5", "halben": "0.5", "viertel": "0.25", "doppelt": "2", "doppelte": "2",
+    "½": "0.5", "¼": "0.25", "¾": "0.75",
+}
+
+
+def embed(text: str) -> np.ndarray:
+    """
+    Hashed bag of words and character trigrams, L2-normalised
+
+    Cheap and deterministic, so indexes can be rebuilt from meal_entries
+    without an API call; trigrams make "oats w/ blueberries" land close to
+    "oatmeal with blueberries".
+    """
+    vector = np.zeros(EMBEDDING_DIM, dtype=np.float32)
+    for word in _WORD.findall(text.lower()):
+        features = [word] + [f"#{word}#"[i:i + 3] for i in range(len(word))]
+        for feature in features:
+            h = zlib.crc32(feature.encode("utf-8"))
+            # One hash bit picks the sign so collisions tend to cancel out
+            vector[h % EMBEDDING_DIM] += 1.0 if h & 0x80000000 else -1.0
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm > 0 else vector
+
+
+def meal_text(meal_name: str, meal_description: str = None) -> str:
+    return f"{meal_name} {meal_description or ''}".strip()
+
+
+def quantities(text: str) -> List[str]:
+    """Amounts mentioned in a meal text, as sorted numbers ("2 eggs, 200g" -> ["2", "200"])"""
+    text = text.lower()
+    amounts = [NUMBER_WORDS.get(n, n.replace(",", ".")) for n in _NUMBER.findall(text)]
+    amounts += [NUMBER_WORDS[word] for word in _WORD.findall(text)
+                if word in NUMBER_WORDS and not _NUMBER.fullmatch(word)]
+    return sorted(amounts)
+
+
+def can_reuse(message: str, similarity: float, meal: dict) -> bool:
+    """
+    Whether a past meal's numbers can be logged again as they are
+
+    The embedding barely tells "2 eggs" from "3 eggs", so a close match is
+    only reused when it mentions exactly the same amounts; otherwise it is
+    just a hint for the model.
+    """
+    if similarity < REUSE_THRESHOLD:
+        return False
+    return quantities(message) == quantities(meal_text(meal["meal_name"], meal["meal_description"]))
+
+
+class UserMealIndex:
+    """HNSW index over one user's meals, plus the metadata for each label"""
+
+    def __init__(self, hnswlib, capacity: int = 64, index=None):
+        if index is None:
+            index = hnswlib.Index(space="cosine", dim=EMBEDDING_DIM)
+            index.init_index(max_elements=capacity, ef_construction=100, M=16)
+        self.index = index
+        self.meals: List[dict] = []        # label -> meal
+        self.meal_ids = set()
+        # (created_at, id) of the newest meal_entries row indexed
+        self.watermark: Optional[Tuple[str, str]] = None
+        self.dirty = False
+
+    def add(self, meal: dict):
+        if meal["id"] in self.meal_ids:
+            return
+        if len(self.meals) >= self.index.get_max_elements():
+            self.index.resize_index(len(self.meals) * 2)
+        self.index.add_items(embed(meal_text(meal["meal_name"], meal["meal_description"]))[None, :],
+                             [len(self.meals)])
+        self.meals.append(meal)
+        self.meal_ids.add(meal["id"])
+        self.dirty = True
+
+    def search(self, text: str, k: int) -> List[Tuple[float, dict]]:
+        if not self.meals:
+            return []
+        k = min(k, len(self.meals))
+        self.index.set_ef(max(50, k))
+        labels, distances = self.index.knn_query(embed(text)[None, :], k=k)
+        # Cosine distance -> similarity
+        return [(1.0 - float(distance), self.meals[int(label)])
+                for label, distance in zip(labels[0], distances[0])]
+
+    def save(self, path: str):
+        self.index.save_index(f"{path}.bin.tmp")
+        with open(f"{path}.json.tmp", "w") as f:
+            json.dump({"watermark": self.watermark, "meals": self.meals}, f)
+        os.replace(f"{path}.bin.tmp", f"{path}.bin")
+        os.replace(f"{path}.json.tmp", f"{path}.json")
+        self.dirty = False
+
+    @classmethod
+    def load(cls, hnswlib, path: str) -> Optional["UserMealIndex"]:
+        if not (os.path.exists(f"{path}.bin") and os.path.exists(f"{path}.json")):
+            return None
+        with open(f"{path}.json") as f:
+            data = json.load(f)
+        index = hnswlib.Index(space="cosine", dim=EMBEDDING_DIM)
+        index.load_index(f"{path}.bin", max_elements=max(64, len(data["meals"]) * 2))
+        if index.get_current_count() != len(data["meals"]):
+            # The two files were written by different saves; rebuild instead
+            return None
+        user_index = cls(hnswlib, index=index)
+        user_index.meals = data["meals"]
+        user_index.meal_ids = {meal["id"] for meal in data["meals"]}
+        user_index.watermark = tuple(data["watermark"]) if data["watermark"] else None
+        return user_index
+
+
+class MealMemory:
+    """
+    Size-bounded LRU of per-user meal indexes, persisted under `root`
+
+    A user's index lives in root/<shard>/<user>.{bin,json}. On load it is
+    caught up from meal_entries past its watermark, so meals written by
+    other workers (or before the memory existed) are picked up incrementally.
+    Edits and deletes aren't tracked here; callers re-read the row before
+    reusing a match.
+
+    Each user's index is guarded by a striped per-user lock; the shared
+    lock only covers the LRU itself, so loading, catching up and saving one
+    user never blocks the others. Changed indexes are written by a
+    background thread every SAVE_INTERVAL_SECONDS and by flush(); what a
+    crash loses is re-read from meal_entries on the next load.
+    """
+
+    def __init__(self, root: str, max_users: int = 256):
+        self.root = root
+        self.max_users = max_users
+        self._indexes: "OrderedDict[str, UserMealIndex]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._user_locks = [threading.Lock() for _ in range(LOCK_STRIPES)]
+        self._saver: Optional[threading.Thread] = None
+        self.evictions = 0
+        self.saves = 0
+        try:
+            import hnswlib
+            self.hnswlib = hnswlib
+        except ImportError:
+            print("hnswlib is not installed; meal memory is disabled")
+            self.hnswlib = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.hnswlib is not None
+
+    def _path(self, user_id: str) -> str:
+        shard = zlib.crc32(user_id.encode("utf-8")) % SHARDS
+        directory = os.path.join(self.root, f"{shard:03d}")
+        os.makedirs(directory, exist_ok=True)
+        return os.path.join(directory, re.sub(r"[^\w.+-]", "_", user_id))
+
+    def _user_lock(self, user_id: str) -> threading.Lock:
+        return self._user_locks[zlib.crc32(user_id.encode("utf-8")) % LOCK_STRIPES]
+
+    def _get(self, db, user_id: str) -> Tuple[UserMealIndex, List[Tuple[str, UserMealIndex]]]:
+        """
+        Loaded, caught-up index for a user (caller holds the user's lock),
+        and the indexes evicted to make room for it, still to be saved
+        """
+        with self._lock:
+            user_index = self._indexes.get(user_id)
+            if user_index is not None:
+                self._indexes.move_to_end(user_id)
+                return user_index, []
+
+        user_index = UserMealIndex.load(self.hnswlib, self._path(user_id)) or UserMealIndex(self.hnswlib)
+        self._catch_up(db, user_id, user_index)
+        evicted = []
+        with self._lock:
+            self._indexes[user_id] = user_index
+            while len(self._indexes) > self.max_users:
+                evicted.append(self._indexes.popitem(last=False))
+                self.evictions += 1
+        self._ensure_saver()
+        return user_index, evicted
+
+    def _catch_up(self, db, user_id: str, user_index: UserMealIndex):
+        for row in db.iter_meals(user_id, after=user_index.watermark):
+            user_index.add({
+                "id": str(row.id),
+                "meal_name": row.meal_name,
+                "meal_description": row.meal_description,
+                "meal_calories": row.meal_calories,
+                "meal_protein": row.meal_protein,
+                "meal_carbs": row.meal_carbs,
+                "meal_fat": row.meal_fat,
+            })
+            user_index.watermark = (str(row.created_at), str(row.id))
+
+    def _save(self, user_id: str, user_index: UserMealIndex):
+        """Write an index if it changed (caller must not hold another user's lock)"""
+        with self._user_lock(user_id):
+            if user_index.dirty:
+                user_index.save(self._path(user_id))
+                self.saves += 1
+
+    def search(self, db, user_id: str, text: str, k: int = 3) -> List[Tuple[float, dict]]:
+        """Most similar past meals as (similarity, meal), best first"""
+        if not self.enabled:
+            return []
+        with self._user_lock(user_id):
+            user_index, evicted = self._get(db, user_id)
+            results = user_index.search(text, k)
+        for evicted_user, evicted_index in evicted:
+            self._save(evicted_user, evicted_index)
+        return results
+
+    def add(self, db, user_id: str, meal_id: str, meal_entry):
+        """Index a meal that was just saved; written to disk by the next flush"""
+        if not self.enabled:
+            return
+        with self._user_lock(user_id):
+            user_index, evicted = self._get(db, user_id)
+            user_index.add({
+                "id": str(meal_id),
+                "meal_name": meal_entry.meal_name,
+                "meal_description": meal_entry.meal_description,
+                "meal_calories": meal_entry.meal_calories,
+                "meal_protein": meal_entry.meal_protein,
+                "meal_carbs": meal_entry.meal_carbs,
+                "meal_fat": meal_entry.meal_fat,
+            })
+        for evicted_user, evicted_index in evicted:
+            self._save(evicted_user, evicted_index)
+
+    def flush(self):
+        """Write every changed index"""
+        with self._lock:
+            loaded = list(self._indexes.items())
+        for user_id, user_index in loaded:
+            if user_index.dirty:
+                self._save(user_id, user_index)
+
+    def _ensure_saver(self):
+        if self._saver is not None and self._saver.is_alive():
+            return
+        with self._lock:
+            if self._saver is not None and self._saver.is_alive():
+                return
+            self._saver = threading.Thread(target=self._save_loop, name="meal-memory-saver", daemon=True)
+            self._saver.start()
+
+    def _save_loop(self):
+        while True:
+            time.sleep(SAVE_INTERVAL_SECONDS)
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Meal memory save error: {e}")
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "loaded_users": len(self._indexes),
+                "max_users": self.max_users,
+                "indexed_meals": sum(len(i.meals) for i in self._indexes.values()),
+                "evictions": self.evictions,
+                "saves": self.saves,
+            }
+
+
+meal_memory = MealMemory(
+    os.getenv("MEAL_MEMORY_DIR", "meal_memory"),
+    max_users=int(os.getenv("MEAL_MEMORY_MAX_USERS", "256")),
+)
@@ -0,0 +1,227 @@
+# Request-scoped spooling of downloaded media: small payloads stay in memory,
+# larger ones go to a managed directory that is cleaned up after the request
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterable, Optional
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+
+# Payloads up to this size are never written to disk
+MEMORY_LIMIT = int(os.getenv("MEDIA_MEMORY_LIMIT", str(512 * 1024)))
+# Anything older than this is removed by the janitor, scoped or not
+MAX_AGE_SECONDS = float(os.getenv("MEDIA_MAX_AGE_SECONDS", "900"))
+JANITOR_INTERVAL_SECONDS = float(os.getenv("MEDIA_JANITOR_INTERVAL_SECONDS", "60"))
+
+_current_scope: ContextVar[Optional[str]] = ContextVar("media_scope", default=None)
+
+
+class _Entry:
+    __slots__ = ("media_id", "scope", "data", "path", "size", "created")
+
+    def __init__(self, media_id: str, scope: Optional[str], data: Optional[bytes],
+                 path: Optional[str], size: int):
+        self.media_id = media_id
+        self.scope = scope
+        self.data = data
+        self.path = path
+        self.size = size
+        self.created = time.monotonic()
+
+
+class MediaStore:
+    """
+    Holds media payloads by id for the lifetime of a request
+
+    Media items in the graph state only carry the id (they are also saved
+    as JSON in workflow_states), and nodes read the bytes back with read().
+    Everything spooled inside request_scope() is released when the scope
+    exits; a janitor thread removes whatever a crashed request or another
+    process left behind.
+    """
+
+    def __init__(self, root: str = None, memory_limit: int = MEMORY_LIMIT,
+                 max_age_seconds: float = MAX_AGE_SECONDS):
+        self.root = root or os.path.join(tempfile.gettempdir(), "nutrition_bot_media")
+        self.memory_limit = memory_limit
+        self.max_age_seconds = max_age_seconds
+        self._entries: Dict[str, _Entry] = {}
+        self._lock = threading.Lock()
+        self._janitor: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+        self.spooled_in_memory = 0
+        self.spooled_to_disk = 0
+        self.released = 0
+        self.janitor_removed = 0
+
+    # Scopes
+    @contextmanager
+    def request_scope(self):
+        """Release every payload spooled inside the block when it exits"""
+        scope = uuid.uuid4().hex
+        token = _current_scope.set(scope)
+        try:
+            yield scope
+        finally:
+            _current_scope.reset(token)
+            self.release_scope(scope)
+
+    def release_scope(self, scope: str):
+        with self._lock:
+            entries = [e for e in self._entries.values() if e.scope == scope]
+        for entry in entries:
+            self.release(entry.media_id)
+
+    # Payloads
+    def spool(self, chunks: Iterable[bytes], suffix: str = "") -> str:
+        """
+        Store a payload streamed in chunks; returns its media id
+
+        Chunks are buffered in memory until the total passes memory_limit,
+        then everything is moved to a file and the rest streams to disk.
+        """
+        media_id = uuid.uuid4().hex
+        buffer = bytearray()
+        file = None
+        path = None
+        size = 0
+        try:
+            for chunk in chunks:
+                if not chunk:
+                    continue
+                size += len(chunk)
+                if file is None and size <= self.memory_limit:
+                    buffer.extend(chunk)
+                    continue
+                if file is None:
+                    os.makedirs(self.root, exist_ok=True)
+                    path = os.path.join(self.root, f"{media_id}{suffix}")
+                    file = open(path, "wb")
+                    file.write(buffer)
+                    buffer = bytearray()
+                file.write(chunk)
+        except Exception:
+            if file is not None:
+                file.close()
+                os.remove(path)
+            raise
+        if file is not None:
+            file.close()
+
+        entry = _Entry(media_id, _current_scope.get(), bytes(buffer) if path is None else None, path, size)
+        with self._lock:
+            self._entries[media_id] = entry
+            if path is None:
+                self.spooled_in_memory += 1
+            else:
+                self.spooled_to_disk += 1
+        self._ensure_janitor()
+        return media_id
+
+    def read(self, media_id: str) -> bytes:
+        with self._lock:
+            entry = self._entries.get(media_id)
+        if entry is None:
+            raise KeyError(f"Media {media_id} has expired or was never stored")
+        if entry.data is not None:
+            return entry.data
+        with open(entry.path, "rb") as f:
+            return f.read()
+
+    def release(self, media_id: str):
+        with self._lock:
+            entry = self._entries.pop(media_id, None)
+            if entry is None:
+                return
+            self.released += 1
+        if entry.path:
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+
+    # Janitor
+    def _ensure_janitor(self):
+        if self._janitor is not None and self._janitor.is_alive():
+            return
+        with self._lock:
+            if self._janitor is not None and self._janitor.is_alive():
+                return
+            self._janitor = threading.Thread(target=self._janitor_loop, name="media-janitor", daemon=True)
+            self._janitor.start()
+
+    def _janitor_loop(self):
+        while not self._stop.wait(JANITOR_INTERVAL_SECONDS):
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"Media janitor error: {e}")
+
+    def sweep(self) -> int:
+        """Drop payloads older than max_age_seconds and orphaned files; returns how many"""
+        removed = 0
+        now = time.monotonic()
+        with self._lock:
+            expired = [e.media_id for e in self._entries.values() if now - e.created > self.max_age_seconds]
+            known = {e.path for e in self._entries.values() if e.path}
+        for media_id in expired:
+            self.release(media_id)
+            removed += 1
+
+        # Files this process doesn't know about (other workers, crashes) go by mtime
+        if os.path.isdir(self.root):
+            cutoff = time.time() - self.max_age_seconds
+            for name in os.listdir(self.root):
+                path = os.path.join(self.root, name)
+                try:
+                    if path not in known and os.path.getmtime(path) < cutoff:
+                        os.remove(path)
+                        removed += 1
+                except FileNotFoundError:
+                    pass
+
+        with self._lock:
+            self.janitor_removed += removed
+        if removed:
+            print(f"Media janitor removed {removed} item(s)")
+        return removed
+
+    def _directory_bytes(self) -> int:
+        total = 0
+        for entry in os.scandir(self.root):
+            try:
+                total += entry.stat().st_size
+            except FileNotFoundError:
+                pass
+        return total
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            memory = [e.size for e in self._entries.values() if e.path is None]
+            disk = [e.size for e in self._entries.values() if e.path]
+            stats = {
+                "in_memory_items": len(memory),
+                "in_memory_bytes": sum(memory),
+                "on_disk_items": len(disk),
+                "on_disk_bytes": sum(disk),
+                "spooled_in_memory": self.spooled_in_memory,
+                "spooled_to_disk": self.spooled_to_disk,
+                "released": self.released,
+                "janitor_removed": self.janitor_removed,
+            }
+        if os.path.isdir(self.root):
+            usage = shutil.disk_usage(self.root)
+            stats["directory_bytes"] = self._directory_bytes()
+            stats["disk_free_bytes"] = usage.free
+        return stats
+
+
+media_store = MediaStore(os.getenv("MEDIA_DIR") or None)
@@ -0,0 +1,104 @@
+# Splitting long replies into WhatsApp-sized parts without breaking lines,
+# words or the summary table
+
+from typing import List, Optional
+import os
+import re
+
+# Twilio rejects WhatsApp bodies longer than this (in UTF-16 code units)
+WHATSAPP_BODY_LIMIT = int(os.getenv("WHATSAPP_BODY_LIMIT", "1600"))
+
+# Header row of a table followed by its rule, e.g. the summary table's
+# "Day |Carbs (g)|..." and "------|---..."
+_RULE = re.compile(r"^\s*[-=+|:\s]{3,}$")
+
+
+def body_length(text: str) -> int:
+    """Length as Twilio counts it; emoji outside the BMP take two units"""
+    return len(text.encode("utf-16-le")) // 2
+
+
+def _is_table_row(line: str) -> bool:
+    return "|" in line
+
+
+def _split_long_line(line: str, limit: int) -> List[str]:
+    """A single line over the limit, cut at spaces (or hard, if there are none)"""
+    pieces = []
+    current = ""
+    for word in re.split(r"(?<= )", line):
+        while body_length(word) > limit:
+            # No space to cut at; take as many characters as fit
+            room = limit - body_length(current)
+            cut = room
+            while cut > 0 and body_length(word[:cut]) > room:
+                cut -= 1
+            if cut == 0:
+                pieces.append(current.rstrip())
+                current = ""
+                continue
+            pieces.append(current + word[:cut])
+            current, word = "", word[cut:]
+        if body_length(current + word) > limit:
+            pieces.append(current.rstrip())
+            current = ""
+        current += word
+    if current.strip():
+        pieces.append(current.rstrip())
+    return [piece for piece in pieces if piece]
+
+
+def split_message(text: str, limit: int = WHATSAPP_BODY_LIMIT) -> List[str]:
+    """
+    Parts of a reply, in order, each within limit
+
+    Parts end at a paragraph break when one falls in the second half of
+    the part, otherwise at the last line that fits. A table that continues
+    into the next part gets its header row and rule repeated there, so
+    every part reads on its own.
+    """
+    text = text.strip()
+    if body_length(text) <= limit:
+        return [text] if text else []
+
+    lines = []
+    for line in text.split("\n"):
+        if body_length(line) > limit:
+            lines.extend(_split_long_line(line, limit))
+        else:
+            lines.append(line)
+
+    parts: List[str] = []
+    current: List[str] = []
+    header: Optional[List[str]] = None     # header and rule of the table being read
+
+    def size(block: List[str]) -> int:
+        return body_length("\n".join(block))
+
+    for i, line in enumerate(lines):
+        if _is_table_row(line) and i + 1 < len(lines) and _RULE.match(lines[i + 1]):
+            header = [line, lines[i + 1]]
+        elif not _is_table_row(line) and not _RULE.match(line):
+            header = None
+
+        if current and size(current + [line]) > limit:
+            # Prefer ending at a paragraph break in the second half of the part
+            breaks = [j for j, l in enumerate(current) if not l.strip() and j > 0]
+            cut = breaks[-1] if breaks and size(current[:breaks[-1]]) >= limit // 2 else len(current)
+            parts.append("\n".join(current[:cut]).strip())
+            current = current[cut:]
+            while current and not current[0].strip():
+                current.pop(0)
+            # Continuing a table: repeat its header, unless the part starts with it
+            first = current[0] if current else line
+            if header and _is_table_row(first) and first not in header:
+                if size(header + current + [line]) <= limit:
+                    current = header + current
+            if current and size(current + [line]) > limit:
+                parts.append("\n".join(current).strip())
+                current = []
+        current.append(line)
+
+    if current and "\n".join(current).strip():
+        parts.append("\n".join(current).strip())
+    return [part for part in parts if part]
@@ -55,6 +55,12 @@ class MealEntry(BaseModel):
     meal_carbs: int
     meal_fat: int
 
+class MealCorrection(BaseModel):
+    """Model's answer to a correction of an already logged meal"""
+    meal_number: int  # 1-based position in the list of latest meals shown
+    delete: bool = False
+    meal: Optional[MealEntry] = None
+
 # Add these new models
 class MealContext(BaseModel):
     """Model representing a single meal in the context"""
@@ -0,0 +1,405 @@
+# Asynchronous delivery of replies to Twilio: a persistent queue, a pooled
+# HTTP client behind the sender's rate limit, and retries with jittered backoff
+
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, Deque, Dict, List, Optional
+import asyncio
+import importlib.util
+import os
+import random
+import threading
+import time
+import traceback
+
+import httpx
+
+from app.circuit import twilio_breaker
+from app.ids import new_id
+from app.message_parts import split_message
+from app.rate_limit import DEFAULT_TWILIO_MPS, TokenBucket
+
+TWILIO_API_URL = "https://api.twilio.com/2010-04-01"
+# Concurrent requests to Twilio (and pooled connections)
+OUTBOUND_WORKERS = int(os.getenv("OUTBOUND_WORKERS", "8"))
+OUTBOUND_MAX_ATTEMPTS = int(os.getenv("OUTBOUND_MAX_ATTEMPTS", "8"))
+# Backoff before retry n is uniform in [0, min(MAX, BASE * 2^(n-1))] ("full jitter")
+OUTBOUND_BACKOFF_BASE_SECONDS = float(os.getenv("OUTBOUND_BACKOFF_BASE_SECONDS", "0.5"))
+OUTBOUND_BACKOFF_MAX_SECONDS = float(os.getenv("OUTBOUND_BACKOFF_MAX_SECONDS", "60"))
+# A worker that dies mid-send gives the message up to others after this long
+OUTBOUND_LEASE_SECONDS = float(os.getenv("OUTBOUND_LEASE_SECONDS", "60"))
+# How often the table is scanned for messages left by restarts or other workers
+OUTBOUND_POLL_SECONDS = float(os.getenv("OUTBOUND_POLL_SECONDS", "30"))
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def backoff_delay(attempt: int, retry_after: float = None) -> float:
+    """Seconds to wait after a failed attempt, never less than the server asked for"""
+    ceiling = min(OUTBOUND_BACKOFF_MAX_SECONDS, OUTBOUND_BACKOFF_BASE_SECONDS * 2 ** (attempt - 1))
+    delay = random.uniform(0, ceiling)
+    if retry_after:
+        delay = max(delay, retry_after)
+    return delay
+
+
+class LatencyWindow:
+    """Percentiles over the most recent samples"""
+
+    def __init__(self, size: int = 2000):
+        self._samples: Deque[float] = deque(maxlen=size)
+        self._lock = threading.Lock()
+        self.count = 0
+
+    def add(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+            self.count += 1
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            samples = sorted(self._samples)
+            count = self.count
+        if not samples:
+            return {"count": count}
+
+        def percentile(p):
+            return round(samples[min(len(samples) - 1, int(p * len(samples)))] * 1000, 1)
+
+        return {
+            "count": count,
+            "p50_ms": percentile(0.50),
+            "p95_ms": percentile(0.95),
+            "p99_ms": percentile(0.99),
+            "max_ms": round(samples[-1] * 1000, 1),
+        }
+
+
+@dataclass
+class OutboundMessage:
+    id: str
+    to: str
+    body: str
+    attempts: int = 0
+    # monotonic time it was queued in this process; None if recovered from the table
+    enqueued: Optional[float] = None
+    # monotonic time before which it isn't sent (retries, recovered backoffs)
+    due: float = 0.0
+
+
+class OutboundQueue:
+    """
+    Delivers replies to Twilio without holding up the webhook
+
+    enqueue() writes the message to outbound_messages and hands it to a pool
+    of asyncio workers sharing one pooled httpx client. Every attempt waits
+    on the sender number's token bucket (TWILIO_MPS), claims the row with a
+    lease so another worker can't send it twice, and records the outcome.
+    429s, 5xx and network errors are retried with jittered exponential
+    backoff; other 4xx responses (bad number, opted out) fail for good.
+    While the Twilio circuit is open, messages are held without using up
+    attempts, and sent once a probe gets through. Messages still undelivered when the process stops are picked up from
+    the table by the next start(), or by another worker's poll.
+
+    Messages to one recipient are sent strictly in order: each recipient
+    has a lane, and a message only goes to the workers once the one before
+    it was accepted by Twilio (or given up on). Different recipients are
+    sent concurrently over the same kept-alive connections (multiplexed
+    over HTTP/2 when h2 is installed).
+    """
+
+    def __init__(self, db, twilio_client, rate: float = DEFAULT_TWILIO_MPS,
+                 workers: int = OUTBOUND_WORKERS, max_attempts: int = OUTBOUND_MAX_ATTEMPTS):
+        self.db = db
+        self.account_sid = twilio_client.TWILIO_ACCOUNT_SID
+        self.auth_token = twilio_client.TWILIO_AUTH_TOKEN
+        self.from_number = twilio_client.TWILIO_WHATSAPP_NUMBER
+        # Twilio's throughput limit applies per sender number; this queue has one
+        self.bucket = TokenBucket(rate)
+        self.workers = workers
+        self.max_attempts = max_attempts
+
+        self.client: Optional[httpx.AsyncClient] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks = []
+        # Ids queued, waiting for a retry or in flight here, so polls don't add them twice
+        self._tracked = set()
+        # recipient -> messages waiting behind the one being sent; only touched on the loop
+        self._lanes: Dict[str, Deque[OutboundMessage]] = {}
+
+        self.enqueued = 0
+        self.recovered = 0
+        self.sent = 0
+        self.retries = 0
+        self.failed = 0
+        self.held = 0
+        self.errors: Dict[str, int] = {}
+        self.delivery_latency = LatencyWindow()
+        self.request_latency = LatencyWindow()
+
+    # Lifecycle
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue()
+        self.client = httpx.AsyncClient(
+            base_url=TWILIO_API_URL,
+            http2=importlib.util.find_spec("h2") is not None,
+            auth=(self.account_sid or "", self.auth_token or ""),
+            timeout=httpx.Timeout(15.0, connect=5.0),
+            limits=httpx.Limits(max_connections=self.workers,
+                                max_keepalive_connections=self.workers),
+        )
+        self._tasks = [asyncio.create_task(self._worker(), name=f"outbound-{i}")
+                       for i in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._poll(), name="outbound-poll"))
+        print(f"Outbound queue started with {self.workers} workers")
+
+    async def stop(self, drain_seconds: float = 5.0):
+        """Finish what's queued (up to drain_seconds); the rest stays in the table"""
+        if self._queue is not None:
+            try:
+                await asyncio.wait_for(self._queue.join(), drain_seconds)
+            except asyncio.TimeoutError:
+                print(f"Outbound queue stopped with {self._queue.qsize()} message(s) left for the next start")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    # Producers
+    def enqueue(self, body: str, to: str) -> List[str]:
+        """
+        Persist a reply and queue it for delivery; returns the ids of its parts
+
+        Replies over WhatsApp's body limit are split into parts that are
+        delivered in order. The first part is queued as soon as it's
+        stored; the rest follow in one batched insert. Safe to call from
+        graph nodes running on worker threads.
+        """
+        parts = split_message(body) or [body]
+        now = _utcnow()
+        messages = [OutboundMessage(new_id(), to, part, enqueued=time.monotonic()) for part in parts]
+
+        self.db.enqueue_outbound([(messages[0].id, to, messages[0].body)], now)
+        self._schedule(messages[0])
+        if len(messages) > 1:
+            self.db.enqueue_outbound([(m.id, to, m.body) for m in messages[1:]], now)
+            for message in messages[1:]:
+                self._schedule(message)
+        self.enqueued += len(messages)
+        return [message.id for message in messages]
+
+    def _schedule(self, message: OutboundMessage):
+        """Add a message to its recipient's lane (from any thread)"""
+        if self._loop is None:
+            # Not started; the row is picked up by the first poll
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self._loop:
+            self._admit(message)
+        else:
+            self._loop.call_soon_threadsafe(self._admit, message)
+
+    def _admit(self, message: OutboundMessage):
+        if message.id in self._tracked:
+            return
+        self._tracked.add(message.id)
+        lane = self._lanes.get(message.to)
+        if lane is not None:
+            # Something to this recipient is in flight; wait behind it
+            lane.append(message)
+            return
+        self._lanes[message.to] = deque()
+        self._put(message)
+
+    def _put(self, message: OutboundMessage):
+        delay = message.due - time.monotonic()
+        if delay > 0:
+            self._loop.call_later(delay, self._queue.put_nowait, message)
+        else:
+            self._queue.put_nowait(message)
+
+    def _done(self, message: OutboundMessage):
+        """A message left its lane for good; release the next one to the same recipient"""
+        self._tracked.discard(message.id)
+        lane = self._lanes.get(message.to)
+        if lane:
+            self._put(lane.popleft())
+        else:
+            self._lanes.pop(message.to, None)
+
+    # Workers
+    async def _worker(self):
+        while True:
+            message = await self._queue.get()
+            try:
+                await self._deliver(message)
+            except Exception as e:
+                print(f"Error delivering outbound message {message.id}: {e}")
+                traceback.print_exc()
+                self._done(message)
+            finally:
+                self._queue.task_done()
+
+    def _hold(self, message: OutboundMessage):
+        """Twilio is failing: hold the lane without spending an attempt"""
+        self.held += 1
+        message.due = time.monotonic() + max(1.0, twilio_breaker.retry_in())
+        self._put(message)
+
+    async def _deliver(self, message: OutboundMessage):
+        # Only a look: a half-open probe is taken right before the request,
+        # so nothing between here and there can leave it unreported
+        if not twilio_breaker.available():
+            self._hold(message)
+            return
+
+        now = _utcnow()
+        claimed = await asyncio.to_thread(
+            self.db.claim_outbound, message.id, now,
+            now + timedelta(seconds=OUTBOUND_LEASE_SECONDS)
+        )
+        if not claimed:
+            # Delivered or taken by another worker in the meantime
+            self._done(message)
+            return
+
+        await self.bucket.acquire_async()
+        if not twilio_breaker.allow():
+            # Another lane took the probe in the meantime
+            await asyncio.to_thread(self.db.release_outbound, message.id)
+            self._hold(message)
+            return
+        message.attempts += 1
+        # _post reports the outcome to the breaker
+        sid, error, retryable, retry_after = await self._post(message)
+
+        if sid is not None:
+            await asyncio.to_thread(self.db.finish_outbound, message.id, "sent", provider_sid=sid)
+            self._done(message)
+            self.sent += 1
+            if message.enqueued is not None:
+                self.delivery_latency.add(time.monotonic() - message.enqueued)
+            return
+
+        if retryable and message.attempts < self.max_attempts:
+            delay = backoff_delay(message.attempts, retry_after)
+            await asyncio.to_thread(
+                self.db.finish_outbound, message.id, "pending", error=error,
+                next_attempt_at=_utcnow() + timedelta(seconds=delay)
+            )
+            self.retries += 1
+            print(f"Outbound message {message.id} failed ({error}); "
+                  f"retry {message.attempts} in {delay:.1f}s")
+            # Stays at the head of its lane, so later messages keep waiting
+            message.due = time.monotonic() + delay
+            self._put(message)
+            return
+
+        await asyncio.to_thread(self.db.finish_outbound, message.id, "failed", error=error)
+        self._done(message)
+        self.failed += 1
+        print(f"Giving up on outbound message {message.id} to {message.to} "
+              f"after {message.attempts} attempt(s): {error}")
+
+    async def _post(self, message: OutboundMessage):
+        """
+        One request to Twilio's Messages API
+
+        Returns:
+            (message sid or None, error, retryable, seconds the server asked to wait)
+        """
+        started = time.monotonic()
+        try:
+            response = await self.client.post(
+                f"/Accounts/{self.account_sid}/Messages.json",
+                data={"From": self.from_number, "To": message.to, "Body": message.body},
+            )
+        except httpx.HTTPError as e:
+            self._count_error(type(e).__name__)
+            twilio_breaker.record_failure(e)
+            return None, f"{type(e).__name__}: {e}", True, None
+        finally:
+            self.request_latency.add(time.monotonic() - started)
+
+        # Throttling and rejected requests still mean Twilio is up
+        if response.status_code >= 500:
+            twilio_breaker.record_failure(RuntimeError(f"HTTP {response.status_code}"))
+        else:
+            twilio_breaker.record_success()
+
+        if response.status_code < 300:
+            return response.json().get("sid"), None, False, None
+
+        self._count_error(str(response.status_code))
+        try:
+            details = response.json()
+            error = f"{response.status_code} ({details.get('code')}): {details.get('message')}"
+        except ValueError:
+            error = f"{response.status_code}: {response.text[:200]}"
+        retryable = response.status_code == 429 or response.status_code >= 500
+        retry_after = response.headers.get("Retry-After")
+        try:
+            retry_after = float(retry_after) if retry_after else None
+        except ValueError:
+            retry_after = None
+        return None, error, retryable, retry_after
+
+    def _count_error(self, kind: str):
+        self.errors[kind] = self.errors.get(kind, 0) + 1
+
+    # Recovery
+    async def _poll(self):
+        """Queue undelivered messages this process isn't already handling; runs at start, then periodically"""
+        while True:
+            try:
+                now = _utcnow()
+                rows = await asyncio.to_thread(self.db.get_undelivered_outbound, now)
+                recovered = 0
+                # Oldest first, so each recipient's lane keeps the original order
+                for message_id, to, body, attempts, next_attempt_at, _ in rows:
+                    message_id = str(message_id)
+                    if message_id in self._tracked:
+                        continue
+                    wait = (next_attempt_at - now).total_seconds() if next_attempt_at else 0.0
+                    self._admit(OutboundMessage(message_id, to, body, attempts=attempts,
+                                                due=time.monotonic() + max(0.0, wait)))
+                    recovered += 1
+                if recovered:
+                    self.recovered += recovered
+                    print(f"Recovered {recovered} undelivered outbound message(s)")
+            except Exception as e:
+                print(f"Outbound poll failed: {e}")
+            await asyncio.sleep(OUTBOUND_POLL_SECONDS)
+
+    def stats(self) -> Dict[str, Any]:
+        stats = {
+            "workers": self.workers,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "tracked": len(self._tracked),
+            "recipients_in_flight": len(self._lanes),
+            "enqueued": self.enqueued,
+            "recovered": self.recovered,
+            "sent": self.sent,
+            "retries": self.retries,
+            "failed": self.failed,
+            "held_by_circuit": self.held,
+            "errors": dict(self.errors),
+            "delivery_latency": self.delivery_latency.summary(),
+            "request_latency": self.request_latency.summary(),
+        }
+        try:
+            stats["by_status"] = self.db.count_outbound_by_status()
+        except Exception as e:
+            stats["by_status"] = f"unavailable: {e}"
+        return stats
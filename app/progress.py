@@ -0,0 +1,139 @@
+# Progress messages for slow turns: an acknowledgement and finished parts of
+# the reply are sent while the workflow is still running, but only once the
+# turn has taken longer than a threshold, so fast turns still get one message
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional
+import asyncio
+import os
+import threading
+import time
+
+# A turn that finishes within this many seconds sends nothing early
+PROGRESS_THRESHOLD_SECONDS = float(os.getenv("PROGRESS_THRESHOLD_SECONDS", "4"))
+PROGRESS_MESSAGES = os.getenv("PROGRESS_MESSAGES", "1") not in ("0", "false", "no")
+
+_current: ContextVar[Optional["ProgressReporter"]] = ContextVar("progress_reporter", default=None)
+
+_stats = {"turns": 0, "acknowledgements": 0, "partials": 0, "suppressed": 0}
+_stats_lock = threading.Lock()
+
+
+def _count(key: str):
+    with _stats_lock:
+        _stats[key] += 1
+
+
+class ProgressReporter:
+    """
+    Decides which intermediate messages of one turn go out
+
+    acknowledge() arms a timer on the event loop: the text is sent at the
+    threshold unless the turn has finished or already sent something.
+    partial() is called by graph nodes (on worker threads) with a finished
+    piece of the reply; it's sent right away if the turn is already past
+    the threshold, and the node producing the final reply checks sent()
+    so it doesn't repeat it.
+    """
+
+    def __init__(self, send: Callable[[str], Any], threshold_seconds: float = PROGRESS_THRESHOLD_SECONDS,
+                 started: float = None):
+        self.send = send
+        self.threshold_seconds = threshold_seconds
+        # monotonic time the turn began, e.g. when the webhook was received
+        self.started = started if started is not None else time.monotonic()
+        self.delivered: List[str] = []
+        self._acknowledged = False
+        self._armed = False
+        self._finished = False
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._lock = threading.Lock()
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    def acknowledge(self, text: str):
+        """Send text at the threshold if the turn is still running (call on the event loop)"""
+        delay = max(0.0, self.threshold_seconds - self.elapsed)
+        self._armed = True
+        self._timer = asyncio.get_running_loop().call_later(delay, self._send_acknowledgement, text)
+
+    def _send_acknowledgement(self, text: str):
+        with self._lock:
+            if self._finished or self.delivered:
+                return
+            self._acknowledged = True
+        _count("acknowledgements")
+        self.send(text)
+
+    def partial(self, key: str, text: str) -> bool:
+        """Send a finished part of the reply now if the turn is slow; True if it was sent"""
+        with self._lock:
+            if self._finished or self.elapsed < self.threshold_seconds:
+                return False
+            self.delivered.append(key)
+        _count("partials")
+        self.send(text)
+        return True
+
+    def sent(self, key: str) -> bool:
+        with self._lock:
+            return key in self.delivered
+
+    def finish(self):
+        with self._lock:
+            self._finished = True
+            suppressed = self._armed and not self._acknowledged and not self.delivered
+        if self._timer is not None:
+            self._timer.cancel()
+        if suppressed:
+            _count("suppressed")
+
+
+def current() -> Optional[ProgressReporter]:
+    """The reporter for the turn being processed, if progress messages are on"""
+    return _current.get()
+
+
+@contextmanager
+def reporting(send: Callable[[str], Any], threshold_seconds: float = PROGRESS_THRESHOLD_SECONDS,
+              started: float = None):
+    """
+    Make a reporter available to every node of the turn run inside the block
+
+    Usage:
+        with progress.reporting(lambda text: outbound.enqueue(text, to=sender)) as reporter:
+            reporter.acknowledge("Got your photo...")
+            final_state = await workflow.run_graph(state)
+    """
+    if not PROGRESS_MESSAGES:
+        yield None
+        return
+    reporter = ProgressReporter(send, threshold_seconds, started)
+    token = _current.set(reporter)
+    _count("turns")
+    try:
+        yield reporter
+    finally:
+        _current.reset(token)
+        reporter.finish()
+
+
+def acknowledgement_for(media_items) -> Optional[str]:
+    """What to say while a turn with media is being worked on; None for text-only turns"""
+    types = [media["type"] for media in media_items or []]
+    if any(t.startswith("image/") for t in types):
+        return "📸 Got your photo, analysing it…"
+    if any(t.startswith("audio/") for t in types):
+        return "🎙️ Got your voice note, listening…"
+    return None
+
+
+def stats() -> Dict[str, Any]:
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["threshold_seconds"] = PROGRESS_THRESHOLD_SECONDS
+    stats["enabled"] = PROGRESS_MESSAGES
+    return stats
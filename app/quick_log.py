@@ -0,0 +1,151 @@
+# Local parser for quick-log commands ("repeat last", "same as yesterday
+# lunch", favorites by alias), in English and German
+
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta, timezone
+from typing import Optional, Tuple
+from zoneinfo import ZoneInfo
+import re
+
+# Hours (local to the user) each meal slot covers, end exclusive
+MEAL_SLOTS = {
+    "breakfast": (4, 11),
+    "lunch": (11, 16),
+    "dinner": (16, 24),
+}
+
+SLOT_WORDS = {
+    "breakfast": "breakfast", "frühstück": "breakfast", "fruehstueck": "breakfast",
+    "morning": "breakfast", "morgen": "breakfast",
+    "lunch": "lunch", "mittag": "lunch", "mittagessen": "lunch", "noon": "lunch",
+    "dinner": "dinner", "supper": "dinner", "abend": "dinner", "abendessen": "dinner",
+    "abendbrot": "dinner", "evening": "dinner", "night": "dinner",
+}
+
+DAY_WORDS = {
+    "today": 0, "heute": 0,
+    "yesterday": 1, "yesterdays": 1, "gestern": 1,
+    "vorgestern": 2,
+}
+
+# Words that may surround a "same as <day> <slot>" request; anything else
+# means the message says more than that and goes to the model
+FILLER_WORDS = {
+    "same", "as", "the", "like", "log", "again", "please", "pls", "i", "had", "ate",
+    "have", "having", "for", "my", "me", "just", "one", "s", "day", "before",
+    "das", "gleiche", "gleiches", "gleichen", "selbe", "selbes", "dasselbe",
+    "wie", "nochmal", "noch", "einmal", "bitte", "ich", "hatte", "habe", "esse",
+    "zum", "zu", "am", "beim", "von", "vom", "this",
+}
+
+# "Same as ..." needs one of these, so "yesterday" alone isn't a command
+_SAME = re.compile(r"\b(?:same|again|repeat|gleiche[sn]?|selbe[sn]?|dasselbe|nochmal|wie)\b")
+_DAY_BEFORE_YESTERDAY = re.compile(r"\bday before yesterday\b")
+
+_REPEAT_LAST = re.compile(
+    r"^(?:(?:repeat|redo|log|same as)\s+(?:the\s+|my\s+)?last(?:\s+(?:meal|one|entry|time))?(?:\s+again)?"
+    r"|same again|same as before|again"
+    r"|(?:das\s+)?letzte(?:\s+mahlzeit)?\s+(?:nochmal|wiederholen)"
+    r"|(?:das gleiche|dasselbe|nochmal das gleiche)(?:\s+nochmal)?|nochmal|noch einmal)$"
+)
+_SAVE_FAVORITE = re.compile(
+    r"^(?:save|favou?rite|fav|speicher[en]?|merke?n?)"
+    r"(?:\s+(?:the\s+|my\s+|das\s+|die\s+)?(?:last|letzte)(?:\s+(?:meal|one|mahlzeit))?)?"
+    r"\s+(?:as|als)\s+(?P<alias>.{1,40})$"
+)
+_LIST_FAVORITES = re.compile(r"^(?:(?:my|show|list|meine|zeige?)\s+)*(?:favou?rites|favs|favoriten)$")
+# The favorite keyword is required: "delete the last one" is a correction
+_DELETE_FAVORITE = re.compile(
+    r"^(?:(?:forget|delete|remove|vergiss|lösche|loesche|entferne)\s+"
+    r"(?:the\s+|my\s+|den\s+|meinen\s+)?(?:favou?rite|fav|favorit(?:en)?)|unfavou?rite)\s+"
+    r"(?P<alias>.{1,40})$"
+)
+_LOG_ALIAS = re.compile(r"^(?:log\s+|again\s+)?(?P<alias>.{1,40}?)(?:\s+again|\s+nochmal)?$")
+# Aliases are short names, not meal descriptions
+MAX_ALIAS_WORDS = 4
+
+
+@dataclass
+class QuickCommand:
+    """A quick-log request resolved from a message"""
+    kind: str                           # repeat_last, same_as, log_favorite, save_favorite, list_favorites, delete_favorite
+    day: Optional[date] = None          # same_as: the day to copy
+    slot: Optional[str] = None          # same_as: breakfast/lunch/dinner, None for the whole day
+    alias: Optional[str] = None         # favorites
+
+
+def normalize(message: str) -> str:
+    """Lowercase, drop punctuation (keeping umlauts), collapse whitespace"""
+    text = re.sub(r"['’]s\b", "", message.lower())
+    text = re.sub(r"[^\w\s]", " ", text)
+    return " ".join(text.split())
+
+
+def parse_command(message: str, today: date) -> Optional[QuickCommand]:
+    """
+    Resolve a quick-log command, or None if the message is anything else
+
+    Alias matches (log_favorite) still have to be checked against the
+    user's favorites; everything else is decided here.
+    """
+    if not message:
+        return None
+    text = normalize(message)
+    if not text:
+        return None
+
+    if _REPEAT_LAST.match(text):
+        return QuickCommand("repeat_last")
+    if _LIST_FAVORITES.match(text):
+        return QuickCommand("list_favorites")
+    match = _SAVE_FAVORITE.match(text)
+    if match:
+        return QuickCommand("save_favorite", alias=match.group("alias").strip())
+    match = _DELETE_FAVORITE.match(text)
+    if match:
+        return QuickCommand("delete_favorite", alias=match.group("alias").strip())
+
+    same_as = _parse_same_as(text, today)
+    if same_as:
+        return same_as
+
+    match = _LOG_ALIAS.match(text)
+    if match and len(match.group("alias").split()) <= MAX_ALIAS_WORDS:
+        return QuickCommand("log_favorite", alias=match.group("alias").strip())
+    return None
+
+
+def _parse_same_as(text: str, today: date) -> Optional[QuickCommand]:
+    if not _SAME.search(text):
+        return None
+    offset = 2 if _DAY_BEFORE_YESTERDAY.search(text) else None
+    words = _DAY_BEFORE_YESTERDAY.sub(" ", text).split()
+
+    slot = None
+    for word in words:
+        if word in DAY_WORDS:
+            if offset is None:
+                offset = DAY_WORDS[word]
+        elif word in SLOT_WORDS:
+            slot = slot or SLOT_WORDS[word]
+        elif word not in FILLER_WORDS:
+            return None
+    if offset is None:
+        return None
+    return QuickCommand("same_as", day=today - timedelta(days=offset), slot=slot)
+
+
+def slot_window(day: date, slot: Optional[str], tz: ZoneInfo = None) -> Tuple[datetime, datetime]:
+    """
+    [start, end) of a meal slot on a day; the whole day without a slot
+
+    The hours are read in tz and returned as naive UTC, like created_at;
+    without tz they are returned as they are.
+    """
+    start_hour, end_hour = MEAL_SLOTS[slot] if slot else (0, 24)
+    midnight = datetime.combine(day, datetime.min.time())
+    start, end = midnight + timedelta(hours=start_hour), midnight + timedelta(hours=end_hour)
+    if tz is None:
+        return start, end
+    return tuple(moment.replace(tzinfo=tz).astimezone(timezone.utc).replace(tzinfo=None)
+                 for moment in (start, end))
@@ -0,0 +1,57 @@
+# Rate limiting for outbound Twilio traffic
+
+import asyncio
+import os
+import threading
+import time
+
+# Twilio's default WhatsApp sender throughput (messages per second)
+DEFAULT_TWILIO_MPS = float(os.getenv("TWILIO_MPS", "80"))
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: `rate` tokens per second, bursts up to `capacity`
+
+    Usage:
+        bucket = TokenBucket(rate=80)
+        bucket.acquire()  # blocks until a token is available
+        await bucket.acquire_async()  # same, without blocking the event loop
+    """
+
+    def __init__(self, rate: float = DEFAULT_TWILIO_MPS, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, tokens: float = 1) -> float:
+        """Take tokens if available; otherwise return the seconds to wait"""
+        with self._lock:
+            self._refill()
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return 0.0
+            return (tokens - self._tokens) / self.rate
+
+    def acquire(self, tokens: float = 1):
+        """Block until the tokens are taken"""
+        while True:
+            wait = self.try_acquire(tokens)
+            if wait == 0.0:
+                return
+            time.sleep(wait)
+
+    async def acquire_async(self, tokens: float = 1):
+        """Wait for the tokens on the event loop instead of blocking the thread"""
+        while True:
+            wait = self.try_acquire(tokens)
+            if wait == 0.0:
+                return
+            await asyncio.sleep(wait)
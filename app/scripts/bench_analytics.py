@@ -0,0 +1,66 @@
+import argparse
+import os
+import sys
+import time
+from datetime import date
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from app import analytics
+
+
+def synthetic_meals(rows: int, users: int, days: int, seed: int = 0) -> analytics.MealArrays:
+    """Random meal history shaped like production: 2-5 meals a day, gaps included"""
+    rng = np.random.default_rng(seed)
+    user = np.sort(rng.integers(0, users, rows)).astype(np.int32)
+    first_day = date(2024, 1, 1).toordinal()
+    day = np.empty(rows, dtype=np.int32)
+    # Sorted by user then day, like the database stream
+    day[:] = first_day + rng.integers(0, days, rows)
+    order = np.lexsort((day, user))
+    return analytics.MealArrays(
+        users=[f"whatsapp:+49{n:09d}" for n in range(users)],
+        user=user[order],
+        day=day[order],
+        hour=rng.integers(6, 23, rows).astype(np.int8),
+        calories=rng.integers(100, 1200, rows).astype(np.int32),
+        protein=rng.integers(0, 80, rows).astype(np.int32),
+        carbs=rng.integers(0, 150, rows).astype(np.int32),
+        fat=rng.integers(0, 60, rows).astype(np.int32),
+    )
+
+
+def timed(label, func, *args):
+    started = time.perf_counter()
+    result = func(*args)
+    print(f"  {label:<22} {(time.perf_counter() - started) * 1000:8.1f} ms")
+    return result
+
+
+def main():
+    """Time the analytics pipeline on synthetic meal history"""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("--rows", type=int, default=2_000_000)
+    parser.add_argument("--users", type=int, default=20_000)
+    parser.add_argument("--days", type=int, default=365)
+    args = parser.parse_args()
+
+    meals = synthetic_meals(args.rows, args.users, args.days)
+    today = date.fromordinal(int(meals.day.max()))
+    print(f"{args.rows:,} meals, {args.users:,} users, {args.days} days")
+
+    started = time.perf_counter()
+    daily = timed("daily_totals", analytics.daily_totals, meals)
+    timed("rolling_average", analytics.rolling_average, daily, daily.calories)
+    timed("macro_ratios", analytics.macro_ratios, daily.protein, daily.carbs, daily.fat)
+    timed("goal_adherence", analytics.goal_adherence, daily)
+    timed("streaks", analytics.streaks, daily, today)
+    timed("typical_meal_hours", analytics.typical_meal_hours, meals)
+    timed("user_trends (all)", analytics.user_trends, meals, today)
+    print(f"  {'total':<22} {(time.perf_counter() - started) * 1000:8.1f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+import argparse
+import os
+import sys
+import time
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.date_parser import parse_date_range
+from app.date_parser_corpus import CORPUS, TODAY
+
+
+def check():
+    failures = 0
+    for message, expected in CORPUS:
+        actual = parse_date_range(message, TODAY)
+        if actual != expected:
+            failures += 1
+            print(f"FAIL {message!r}: expected {expected}, got {actual}")
+    print(f"{len(CORPUS) - failures}/{len(CORPUS)} cases pass")
+    return failures
+
+
+def bench(iterations):
+    messages = [message for message, _ in CORPUS]
+    started = time.perf_counter()
+    for _ in range(iterations):
+        for message in messages:
+            parse_date_range(message, TODAY)
+    elapsed = time.perf_counter() - started
+    calls = iterations * len(messages)
+    print(f"{calls} parses in {elapsed:.3f}s ({elapsed / calls * 1e6:.1f} µs/parse)")
+
+
+def main():
+    """Check the date parser against its corpus, then time it"""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    failures = check()
+    bench(args.iterations)
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+import argparse
+import os
+import sys
+import time
+import uuid
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import column, insert, table, text
+
+from app.database import Database
+from app.ids import uuid7
+
+# Same shape as meal_entries, differing only in the key
+VARIANTS = {
+    "text_uuid4": ("TEXT", lambda: str(uuid.uuid4())),
+    "uuid_v7": ("UUID", uuid7),
+}
+
+
+def run_variant(db, name, id_type, make_id, rows, batch_size):
+    table_name = f"bench_ids_{name}"
+    db.connection.execute(text(f"DROP TABLE IF EXISTS {table_name}"))
+    db.connection.execute(text(f"""
+        CREATE TABLE {table_name} (
+            id {id_type} PRIMARY KEY,
+            user_id TEXT NOT NULL,
+            meal_name TEXT NOT NULL,
+            meal_calories INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """))
+    db.connection.commit()
+
+    target = table(table_name, column("id"), column("user_id"),
+                   column("meal_name"), column("meal_calories"))
+    inserted = 0
+    started = time.perf_counter()
+    while inserted < rows:
+        count = min(batch_size, rows - inserted)
+        db.connection.execute(insert(target), [
+            {"id": make_id(), "user_id": f"whatsapp:+49{(inserted + i) % 100000}",
+             "meal_name": "bench", "meal_calories": 500}
+            for i in range(count)
+        ])
+        db.connection.commit()
+        inserted += count
+        if inserted % (batch_size * 100) == 0:
+            elapsed = time.perf_counter() - started
+            print(f"  {name}: {inserted} rows, {inserted / elapsed:,.0f} rows/s")
+    elapsed = time.perf_counter() - started
+
+    index_bytes = db.connection.execute(
+        text("SELECT pg_relation_size(:index)"), {"index": f"{table_name}_pkey"}
+    ).scalar()
+    table_bytes = db.connection.execute(
+        text("SELECT pg_total_relation_size(:table)"), {"table": table_name}
+    ).scalar()
+    return {
+        "rows_per_second": rows / elapsed,
+        "seconds": elapsed,
+        "pkey_mb": index_bytes / 1024 / 1024,
+        "total_mb": table_bytes / 1024 / 1024,
+    }
+
+
+def main():
+    """Compare insert throughput and index size of TEXT uuid4 vs native UUIDv7 keys"""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--keep", action="store_true", help="Keep the bench tables")
+    args = parser.parse_args()
+
+    db = Database()
+    if db.id_type != "UUID":
+        print("This benchmark needs Postgres (DATABASE_URL=postgresql://...)")
+        sys.exit(1)
+
+    results = {}
+    for name, (id_type, make_id) in VARIANTS.items():
+        print(f"Inserting {args.rows} rows into {name}...")
+        results[name] = run_variant(db, name, id_type, make_id, args.rows, args.batch_size)
+        if not args.keep:
+            db.connection.execute(text(f"DROP TABLE bench_ids_{name}"))
+            db.connection.commit()
+
+    print()
+    print(f"{'variant':<12} | {'rows/s':>10} | {'seconds':>8} | {'pkey MB':>8} | {'total MB':>8}")
+    for name, result in results.items():
+        print(f"{name:<12} | {result['rows_per_second']:>10,.0f} | {result['seconds']:>8.1f} | "
+              f"{result['pkey_mb']:>8.1f} | {result['total_mb']:>8.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.inbox import InboundLog
+
+# Roughly the size of a Twilio WhatsApp webhook form
+SAMPLE_FORM = {
+    "SmsMessageSid": "SM" + "0" * 32,
+    "NumMedia": "0",
+    "ProfileName": "Bench",
+    "MessageType": "text",
+    "SmsSid": "SM" + "0" * 32,
+    "WaId": "4915112345678",
+    "SmsStatus": "received",
+    "Body": "2 scrambled eggs with toast and a cappuccino",
+    "To": "whatsapp:+14155238886",
+    "NumSegments": "1",
+    "ReferralNumMedia": "0",
+    "AccountSid": "AC" + "0" * 32,
+    "From": "whatsapp:+4915112345678",
+    "ApiVersion": "2010-04-01",
+}
+
+
+def run_mode(root, sync, messages, threads, segment_bytes):
+    directory = os.path.join(root, sync)
+    log = InboundLog(directory, segment_bytes=segment_bytes, sync=sync).open()
+    latencies = []
+    lock = threading.Lock()
+    per_thread = messages // threads
+
+    def writer(worker):
+        local = []
+        for i in range(per_thread):
+            form = dict(SAMPLE_FORM, MessageSid=f"SM{worker:04d}{i:08d}")
+            started = time.perf_counter()
+            entry_id = log.record_received(form)
+            local.append(time.perf_counter() - started)
+            log.record_done(entry_id)
+        with lock:
+            latencies.extend(local)
+
+    started = time.perf_counter()
+    workers = [threading.Thread(target=writer, args=(w,)) for w in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started
+    log.close()
+
+    latencies.sort()
+    return {
+        "messages_per_second": len(latencies) / elapsed,
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p99_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000,
+        "fsyncs": log.fsyncs,
+        "records_per_fsync": log.records / log.fsyncs if log.fsyncs else float("nan"),
+        "rotations": log.rotations,
+    }
+
+
+def main():
+    """Compare inbox throughput with group commit against an fsync per message"""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 8, 32],
+                        help="Concurrent writers, e.g. the webhook's worker threads")
+    parser.add_argument("--modes", nargs="+", default=["always", "group"],
+                        choices=["always", "group", "off"])
+    parser.add_argument("--segment-bytes", type=int, default=16 * 1024 * 1024)
+    parser.add_argument("--dir", help="Directory on the disk to measure (default: a temp dir)")
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix="bench_inbox_", dir=args.dir)
+    try:
+        print(f"{'threads':>7} {'mode':>7} {'msg/s':>10} {'p50 ms':>8} {'p99 ms':>8} "
+              f"{'fsyncs':>8} {'rec/fsync':>9}")
+        for threads in args.threads:
+            for mode in args.modes:
+                result = run_mode(os.path.join(root, f"t{threads}"), mode,
+                                  args.messages, threads, args.segment_bytes)
+                print(f"{threads:>7} {mode:>7} {result['messages_per_second']:>10,.0f} "
+                      f"{result['p50_ms']:>8.3f} {result['p99_ms']:>8.3f} "
+                      f"{result['fsyncs']:>8} {result['records_per_fsync']:>9.1f}")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+import argparse
+import os
+import sys
+import time
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import audio
+from app.transcription import create_backend
+
+AUDIO_EXTENSIONS = (".ogg", ".opus", ".mp3", ".m4a", ".wav", ".amr", ".webm")
+
+
+def word_error_rate(reference: str, hypothesis: str) -> float:
+    """Word-level edit distance over the reference length"""
+    ref = "".join(c if c.isalnum() or c.isspace() else " " for c in reference.lower()).split()
+    hyp = "".join(c if c.isalnum() or c.isspace() else " " for c in hypothesis.lower()).split()
+    if not ref:
+        return float(bool(hyp))
+    previous = list(range(len(hyp) + 1))
+    for i, ref_word in enumerate(ref, start=1):
+        current = [i] + [0] * len(hyp)
+        for j, hyp_word in enumerate(hyp, start=1):
+            current[j] = min(previous[j] + 1, current[j - 1] + 1,
+                             previous[j - 1] + (ref_word != hyp_word))
+        previous = current
+    return previous[-1] / len(ref)
+
+
+def load_clips(directory: str):
+    """(name, audio bytes, reference text or None) for every clip; references are <clip>.txt"""
+    clips = []
+    for name in sorted(os.listdir(directory)):
+        if not name.lower().endswith(AUDIO_EXTENSIONS):
+            continue
+        with open(os.path.join(directory, name), "rb") as f:
+            data = f.read()
+        reference_path = os.path.join(directory, os.path.splitext(name)[0] + ".txt")
+        reference = None
+        if os.path.exists(reference_path):
+            with open(reference_path) as f:
+                reference = f.read().strip()
+        clips.append((name, data, reference))
+    return clips
+
+
+def main():
+    """Compare latency and accuracy of transcription backends on sample clips"""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("clips", help="Directory of voice notes, each optionally with a <name>.txt reference")
+    parser.add_argument("--backends", default="openai,local", help="Comma-separated backends to compare")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per clip; the fastest counts")
+    args = parser.parse_args()
+
+    clips = load_clips(args.clips)
+    if not clips:
+        print(f"No audio clips found in {args.clips}")
+        sys.exit(1)
+    # Same preprocessing as the bot, done once and outside the timings
+    prepared = []
+    for name, data, reference in clips:
+        samples = audio.trim_silence(audio.decode_audio(data))
+        seconds = len(samples) / audio.SAMPLE_RATE
+        chunks = [audio.encode_wav(samples[start:end]) for start, end in audio.split_on_silence(samples)]
+        prepared.append((name, seconds, chunks, reference))
+    total_audio = sum(seconds for _, seconds, _, _ in prepared)
+    print(f"{len(prepared)} clips, {total_audio:.1f}s of speech")
+
+    for backend_name in args.backends.split(","):
+        started = time.perf_counter()
+        backend = create_backend(backend_name)
+        print(f"\n{backend.name} (loaded in {time.perf_counter() - started:.1f}s)")
+
+        total_time = 0.0
+        errors = []
+        for name, seconds, chunks, reference in prepared:
+            best = None
+            for _ in range(args.repeat):
+                started = time.perf_counter()
+                text = " ".join(backend.transcribe(f"chunk{i}.wav", chunk) for i, chunk in enumerate(chunks))
+                elapsed = time.perf_counter() - started
+                best = elapsed if best is None else min(best, elapsed)
+            total_time += best
+            wer = word_error_rate(reference, text) if reference is not None else None
+            if wer is not None:
+                errors.append(wer)
+            print(f"  {name:<30} {seconds:6.1f}s audio  {best * 1000:8.0f} ms  "
+                  f"RTF {best / max(seconds, 1e-6):5.2f}  "
+                  f"WER {'-' if wer is None else f'{wer:.1%}'}")
+        print(f"  {'total':<30} {total_audio:6.1f}s audio  {total_time * 1000:8.0f} ms  "
+              f"RTF {total_time / max(total_audio, 1e-6):5.2f}  "
+              f"WER {'-' if not errors else f'{sum(errors) / len(errors):.1%}'}")
+
+if __name__ == "__main__":
+    main()
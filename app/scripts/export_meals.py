@@ -0,0 +1,134 @@
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database import Database
+
+COLUMNS = [
+    "id", "user_id", "meal_name", "meal_description", "meal_calories",
+    "meal_protein", "meal_carbs", "meal_fat", "created_at",
+]
+
+
+def to_record(row):
+    record = dict(zip(COLUMNS, row))
+    record["id"] = str(record["id"])
+    if record["created_at"] is not None:
+        record["created_at"] = str(record["created_at"])
+    return record
+
+
+class CsvWriter:
+    def __init__(self, output):
+        self.writer = csv.DictWriter(output, fieldnames=COLUMNS)
+        self.writer.writeheader()
+
+    def write(self, records):
+        self.writer.writerows(records)
+
+    def close(self):
+        pass
+
+
+class JsonlWriter:
+    def __init__(self, output):
+        self.output = output
+
+    def write(self, records):
+        for record in records:
+            self.output.write(json.dumps(record, ensure_ascii=False))
+            self.output.write("\n")
+
+    def close(self):
+        pass
+
+
+class ParquetWriter:
+    """Writes each batch as its own row group so memory stays bounded"""
+
+    def __init__(self, path):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise SystemExit("Parquet export needs pyarrow: pip install pyarrow")
+        self.pa = pa
+        self.schema = pa.schema([
+            ("id", pa.string()),
+            ("user_id", pa.string()),
+            ("meal_name", pa.string()),
+            ("meal_description", pa.string()),
+            ("meal_calories", pa.int64()),
+            ("meal_protein", pa.int64()),
+            ("meal_carbs", pa.int64()),
+            ("meal_fat", pa.int64()),
+            ("created_at", pa.string()),
+        ])
+        self.writer = pq.ParquetWriter(path, self.schema)
+
+    def write(self, records):
+        self.writer.write_table(self.pa.Table.from_pylist(records, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+
+def main():
+    """Stream meal history for one user or all users to CSV, JSONL or Parquet"""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("--user", help="Only this user id (e.g. whatsapp:+4917...)")
+    parser.add_argument("--start", help="First day, YYYY-MM-DD")
+    parser.add_argument("--end", help="Last day, YYYY-MM-DD")
+    parser.add_argument("--format", choices=["csv", "jsonl", "parquet"], default="csv")
+    parser.add_argument("--output", help="Output file (default: stdout; required for parquet)")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    args = parser.parse_args()
+
+    if args.format == "parquet" and not args.output:
+        parser.error("--output is required for parquet")
+
+    db = Database()
+    start = datetime.fromisoformat(args.start) if args.start else None
+    end = datetime.fromisoformat(args.end) if args.end else None
+
+    output = None
+    if args.format == "parquet":
+        writer = ParquetWriter(args.output)
+    else:
+        output = open(args.output, "w", newline="", encoding="utf-8") if args.output else sys.stdout
+        writer = CsvWriter(output) if args.format == "csv" else JsonlWriter(output)
+
+    # Progress goes to stderr so stdout can be piped
+    started = time.perf_counter()
+    total = 0
+    batch = []
+    try:
+        for row in db.iter_meals(args.user, start, end, batch_size=args.batch_size):
+            batch.append(to_record(row))
+            if len(batch) >= args.batch_size:
+                writer.write(batch)
+                total += len(batch)
+                batch = []
+                elapsed = time.perf_counter() - started
+                print(f"{total} rows, {total / elapsed:,.0f} rows/s", file=sys.stderr)
+        if batch:
+            writer.write(batch)
+            total += len(batch)
+    finally:
+        writer.close()
+        if output is not None and output is not sys.stdout:
+            output.close()
+
+    elapsed = time.perf_counter() - started
+    rate = total / elapsed if elapsed else 0
+    print(f"Exported {total} rows in {elapsed:.1f}s ({rate:,.0f} rows/s)", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
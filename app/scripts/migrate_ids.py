@@ -0,0 +1,198 @@
+import argparse
+import os
+import re
+import sys
+import time
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+
+from app.database import Database
+
+# (table, column, is primary key)
+ID_COLUMNS = [
+    ("meal_entries", "id", True),
+    ("workflow_states", "id", True),
+    ("workflow_states", "meal_entry_id", False),
+]
+
+
+def column_type(db, table, column):
+    return db.connection.execute(text("""
+        SELECT data_type FROM information_schema.columns
+        WHERE table_schema = 'public' AND table_name = :table AND column_name = :column
+    """), {"table": table, "column": column}).scalar()
+
+
+def prepare(db, table, column, primary_key):
+    """Add the shadow uuid column and a trigger that fills it for new writes"""
+    shadow = f"{column}_uuid"
+    db.connection.execute(text(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {shadow} UUID"))
+    db.connection.execute(text(f"""
+        CREATE OR REPLACE FUNCTION {table}_{shadow}_sync() RETURNS trigger AS $$
+        BEGIN
+            NEW.{shadow} := NEW.{column}::uuid;
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+    """))
+    db.connection.execute(text(f"DROP TRIGGER IF EXISTS {table}_{shadow}_sync ON {table}"))
+    db.connection.execute(text(f"""
+        CREATE TRIGGER {table}_{shadow}_sync
+        BEFORE INSERT OR UPDATE OF {column} ON {table}
+        FOR EACH ROW EXECUTE FUNCTION {table}_{shadow}_sync()
+    """))
+    if primary_key:
+        # NOT VALID is instant; validating later only takes a light lock
+        db.connection.execute(text(f"""
+            ALTER TABLE {table} DROP CONSTRAINT IF EXISTS {table}_{shadow}_not_null
+        """))
+        db.connection.execute(text(f"""
+            ALTER TABLE {table} ADD CONSTRAINT {table}_{shadow}_not_null
+            CHECK ({shadow} IS NOT NULL) NOT VALID
+        """))
+    db.connection.commit()
+
+
+def backfill(db, table, column, batch_size, pause):
+    """Copy existing values into the shadow column in small transactions"""
+    shadow = f"{column}_uuid"
+    total = 0
+    while True:
+        result = db.connection.execute(text(f"""
+            UPDATE {table} SET {shadow} = {column}::uuid
+            WHERE ctid IN (
+                SELECT ctid FROM {table}
+                WHERE {shadow} IS NULL AND {column} IS NOT NULL
+                LIMIT :batch_size
+            )
+        """), {"batch_size": batch_size})
+        db.connection.commit()
+        total += result.rowcount
+        if result.rowcount == 0:
+            break
+        print(f"  {table}.{column}: {total} rows backfilled")
+        if pause:
+            time.sleep(pause)
+    return total
+
+
+def build_index(db, table, column):
+    """Build the unique index for the new key without blocking writes"""
+    shadow = f"{column}_uuid"
+    with db.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        connection.execute(text(f"""
+            CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS {table}_{shadow}_key
+            ON {table} ({shadow})
+        """))
+        connection.execute(text(f"ALTER TABLE {table} VALIDATE CONSTRAINT {table}_{shadow}_not_null"))
+
+
+def dependent_indexes(db, table, column):
+    """(name, definition) of every index besides the primary key that uses the column"""
+    return db.connection.execute(text("""
+        SELECT DISTINCT i.relname, pg_get_indexdef(i.oid)
+        FROM pg_index x
+        JOIN pg_class i ON i.oid = x.indexrelid
+        JOIN pg_class t ON t.oid = x.indrelid
+        JOIN pg_namespace n ON n.oid = t.relnamespace
+        JOIN pg_attribute a ON a.attrelid = t.oid AND a.attnum = ANY(x.indkey)
+        WHERE n.nspname = 'public' AND t.relname = :table AND a.attname = :column
+          AND NOT x.indisprimary
+    """), {"table": table, "column": column}).fetchall()
+
+
+def build_dependent_indexes(db, table, column):
+    """
+    Copy the column's other indexes onto the shadow column, without blocking writes
+
+    Dropping the old column in swap() drops its indexes with it (e.g.
+    idx_meal_entries_user_id_created_at, which keyset pagination needs), so
+    the copies are built first and take over the original names in swap().
+
+    Returns:
+        (copy name, original name) pairs
+    """
+    shadow = f"{column}_uuid"
+    indexes = dependent_indexes(db, table, column)
+    # A concurrent build waits for open transactions, including this connection's
+    db.connection.commit()
+    renames = []
+    for name, definition in indexes:
+        copy = f"{name}_uuid"[:63]
+        head, body = definition.split(" USING ", 1)
+        head = re.sub(r"^CREATE (UNIQUE )?INDEX \S+",
+                      lambda m: f"CREATE {m.group(1) or ''}INDEX CONCURRENTLY IF NOT EXISTS {copy}", head)
+        body = re.sub(rf"\b{column}\b", shadow, body)
+        print(f"  building {copy}")
+        with db.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+            connection.execute(text(f"{head} USING {body}"))
+        renames.append((copy, name))
+    return renames
+
+
+def swap(db, table, column, primary_key, index_renames=()):
+    """Replace the text column with the uuid column in one short transaction"""
+    shadow = f"{column}_uuid"
+    db.connection.execute(text("SET LOCAL lock_timeout = '5s'"))
+    db.connection.execute(text(f"LOCK TABLE {table} IN ACCESS EXCLUSIVE MODE"))
+    # Rows written between the backfill and the lock (the trigger covers most)
+    db.connection.execute(text(f"""
+        UPDATE {table} SET {shadow} = {column}::uuid
+        WHERE {shadow} IS NULL AND {column} IS NOT NULL
+    """))
+    db.connection.execute(text(f"DROP TRIGGER IF EXISTS {table}_{shadow}_sync ON {table}"))
+    db.connection.execute(text(f"DROP FUNCTION IF EXISTS {table}_{shadow}_sync()"))
+    if primary_key:
+        db.connection.execute(text(f"ALTER TABLE {table} DROP CONSTRAINT IF EXISTS {table}_pkey"))
+    db.connection.execute(text(f"ALTER TABLE {table} RENAME COLUMN {column} TO {column}_text"))
+    db.connection.execute(text(f"ALTER TABLE {table} RENAME COLUMN {shadow} TO {column}"))
+    if primary_key:
+        # The validated CHECK lets SET NOT NULL skip the table scan
+        db.connection.execute(text(f"ALTER TABLE {table} ALTER COLUMN {column} SET NOT NULL"))
+        db.connection.execute(text(f"ALTER TABLE {table} DROP CONSTRAINT {table}_{shadow}_not_null"))
+        db.connection.execute(text(f"""
+            ALTER TABLE {table} ADD CONSTRAINT {table}_pkey
+            PRIMARY KEY USING INDEX {table}_{shadow}_key
+        """))
+    db.connection.execute(text(f"ALTER TABLE {table} DROP COLUMN {column}_text"))
+    # The old indexes went with the column; their copies take over the names
+    for copy, name in index_renames:
+        db.connection.execute(text(f"ALTER INDEX {copy} RENAME TO {name}"))
+    db.connection.commit()
+
+
+def main():
+    """Migrate TEXT id columns to native uuid without a long table lock"""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("--batch-size", type=int, default=10000,
+                        help="Rows per backfill transaction")
+    parser.add_argument("--pause", type=float, default=0.0,
+                        help="Seconds to sleep between backfill batches")
+    args = parser.parse_args()
+
+    db = Database()
+    if db.id_type != "UUID":
+        print(f"{type(db).__name__} stores IDs as {db.id_type}; nothing to migrate")
+        return
+
+    for table, column, primary_key in ID_COLUMNS:
+        if column_type(db, table, column) == "uuid":
+            print(f"{table}.{column} is already uuid")
+            continue
+        print(f"Migrating {table}.{column} to uuid...")
+        prepare(db, table, column, primary_key)
+        backfill(db, table, column, args.batch_size, args.pause)
+        if primary_key:
+            build_index(db, table, column)
+        index_renames = build_dependent_indexes(db, table, column)
+        swap(db, table, column, primary_key, index_renames)
+        print(f"{table}.{column} migrated")
+
+    # Old rows keep their uuid4 values; new rows get time-ordered UUIDv7s
+    print("ID migration complete")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+import argparse
+import os
+import sys
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database import Database
+
+def main():
+    """Backfill/rebuild the daily nutrition rollups, or check them for drift"""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("--user", help="Only this user id (e.g. whatsapp:+4917...)")
+    parser.add_argument("--check", action="store_true",
+                        help="Only report days where rollups and meal_entries disagree")
+    args = parser.parse_args()
+
+    db = Database()
+
+    if args.check:
+        print("Checking daily rollups...")
+        mismatches = db.check_daily_rollups(args.user)
+        for user_id, log_date, expected, actual in mismatches:
+            print(f"{user_id} {log_date}: expected {expected}, found {actual}")
+        print(f"{len(mismatches)} mismatching day(s)")
+        sys.exit(1 if mismatches else 0)
+
+    print("Rebuilding daily rollups...")
+    rows = db.rebuild_daily_rollups(args.user)
+    print(f"Rebuilt {rows} rollup row(s)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+import argparse
+import os
+import sys
+from datetime import date
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database import Database
+from app.user_stats import STATS_LOOKBACK_DAYS, recompute_all
+
+def main():
+    """Nightly recomputation of per-user stats (averages, bests, habits, top foods)"""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("--date", help="Day the stats are computed for, YYYY-MM-DD (default: today)")
+    parser.add_argument("--workers", type=int, help="Worker processes (default: CPU count)")
+    parser.add_argument("--shard-size", type=int, default=500, help="Users per task")
+    parser.add_argument("--memory-limit-mb", type=int, help="Address-space limit per worker")
+    parser.add_argument("--max-tasks-per-child", type=int, default=50,
+                        help="Shards a worker handles before it is replaced")
+    parser.add_argument("--lookback-days", type=int, default=STATS_LOOKBACK_DAYS,
+                        help="Window for averages and trends")
+    parser.add_argument("--progress-every", type=float, default=5.0,
+                        help="Seconds between progress lines")
+    args = parser.parse_args()
+
+    today = date.fromisoformat(args.date) if args.date else date.today()
+    print(f"Recomputing user stats for {today}...")
+    recompute_all(Database(), today, shard_size=args.shard_size, workers=args.workers,
+                  memory_limit_mb=args.memory_limit_mb,
+                  max_tasks_per_child=args.max_tasks_per_child,
+                  lookback_days=args.lookback_days, progress_every=args.progress_every)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+import argparse
+import os
+import sys
+from datetime import date
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database import Database
+from app.digest import DigestCheckpoint, DigestSender, digest_range, iter_digests
+from app.twilio import Twilio_Client
+
+def main():
+    """Send end-of-day or weekly nutrition digests to every active user"""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("--kind", choices=["daily", "weekly"], default="daily")
+    parser.add_argument("--date", help="Last day covered, YYYY-MM-DD (default: today)")
+    parser.add_argument("--rate", type=float, help="Messages per second (default: TWILIO_MPS or 80)")
+    parser.add_argument("--workers", type=int, default=32, help="Concurrent Twilio requests")
+    parser.add_argument("--checkpoint", default="digest_checkpoint.json",
+                        help="Progress file; rerun with the same file to resume")
+    parser.add_argument("--dry-run", action="store_true", help="Render and rate-limit, but don't send")
+    args = parser.parse_args()
+
+    day = date.fromisoformat(args.date) if args.date else date.today()
+    start_date, end_date = digest_range(args.kind, day)
+
+    checkpoint = DigestCheckpoint(args.checkpoint, f"{args.kind}:{start_date}:{end_date}").load()
+    if checkpoint.watermark:
+        print(f"Resuming after {checkpoint.watermark} ({checkpoint.sent} already sent)")
+
+    db = Database()
+    twilio_client = None if args.dry_run else Twilio_Client()
+    sender = DigestSender(twilio_client, checkpoint, rate=args.rate,
+                          workers=args.workers, dry_run=args.dry_run)
+
+    print(f"Sending {args.kind} digests for {start_date} to {end_date}...")
+    sender.run(iter_digests(db, args.kind, start_date, end_date, checkpoint.watermark))
+
+if __name__ == "__main__":
+    main()
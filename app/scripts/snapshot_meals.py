@@ -0,0 +1,35 @@
+import argparse
+import json
+import os
+import sys
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.snapshot import MealSnapshot
+
+def main():
+    """Append new meals to the Parquet snapshot, or report stats from it"""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("command", choices=["export", "population", "cohorts"])
+    parser.add_argument("--root", default=os.getenv("MEAL_SNAPSHOT_DIR", "meal_snapshot"))
+    parser.add_argument("--batch-size", type=int, default=50000)
+    parser.add_argument("--start-month", help="YYYY-MM")
+    parser.add_argument("--end-month", help="YYYY-MM")
+    args = parser.parse_args()
+
+    snapshot = MealSnapshot(args.root)
+
+    if args.command == "export":
+        # Only the export touches the database
+        from app.database import Database
+        print(f"Exporting meals after {snapshot.watermark() or 'the beginning'}...")
+        rows = snapshot.export_incremental(Database(), batch_size=args.batch_size)
+        print(f"Exported {rows} new rows to {args.root}")
+    elif args.command == "population":
+        print(json.dumps(snapshot.population_stats(args.start_month, args.end_month), indent=2))
+    else:
+        print(json.dumps(snapshot.cohort_stats(), indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+# Columnar (Parquet) snapshot of meal_entries for offline reporting, so
+# analytics don't compete with webhook traffic on the production database
+
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+import json
+import os
+import time
+
+import numpy as np
+
+from app import analytics, date_parser
+
+WATERMARK_FILE = "_watermark.json"
+# Rows newer than this aren't exported yet. created_at is stamped when the
+# inserting transaction starts, so a row can commit behind one already past
+# the watermark; this must exceed the longest write transaction.
+EXPORT_LAG_SECONDS = int(os.getenv("MEAL_SNAPSHOT_LAG_SECONDS", "300"))
+
+
+def _pyarrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("The meal snapshot needs pyarrow: pip install pyarrow")
+    return pa, ds, pq
+
+
+def _schema(pa):
+    return pa.schema([
+        ("id", pa.string()),
+        ("user_id", pa.string()),
+        ("meal_name", pa.string()),
+        ("meal_description", pa.string()),
+        ("meal_calories", pa.int32()),
+        ("meal_protein", pa.int32()),
+        ("meal_carbs", pa.int32()),
+        ("meal_fat", pa.int32()),
+        ("created_at", pa.timestamp("us")),
+    ])
+
+
+class MealSnapshot:
+    """
+    Month-partitioned Parquet copy of meal_entries under `root`
+
+    Layout: root/month=YYYY-MM/part-<first created_at>-<first id>.parquet.
+    Export is append-only, driven by a (created_at, id) watermark that stays
+    EXPORT_LAG_SECONDS behind now; edits and deletes made after a row was
+    exported aren't reflected.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    # Export
+    def watermark(self) -> Optional[Dict[str, str]]:
+        path = os.path.join(self.root, WATERMARK_FILE)
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return json.load(f)
+
+    def _save_watermark(self, created_at, meal_id, rows: int):
+        data = {"created_at": str(created_at), "id": str(meal_id), "rows": rows,
+                "updated_at": datetime.now().isoformat()}
+        path = os.path.join(self.root, WATERMARK_FILE)
+        with open(f"{path}.tmp", "w") as f:
+            json.dump(data, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(f"{path}.tmp", path)
+
+    def export_incremental(self, db, batch_size: int = 50000,
+                           lag_seconds: int = EXPORT_LAG_SECONDS) -> int:
+        """
+        Append meals newer than the watermark and older than lag_seconds;
+        returns rows written
+
+        Each batch is written (one file per month it touches) before the
+        watermark moves, and file names derive from the batch's first row,
+        so a crashed run redoes at most one batch and overwrites its files.
+        """
+        pa, _, pq = _pyarrow()
+        schema = _schema(pa)
+        mark = self.watermark()
+        after = (mark["created_at"], mark["id"]) if mark else None
+        total = mark["rows"] if mark else 0
+        # created_at is naive UTC
+        cutoff = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(seconds=lag_seconds)
+
+        written = 0
+        started = time.perf_counter()
+        batch = []
+        for row in db.iter_meals(batch_size=batch_size, after=after):
+            created_at = row.created_at
+            if isinstance(created_at, str):
+                created_at = datetime.fromisoformat(created_at)
+            # Rows come oldest first, so everything after this is too recent as well
+            if created_at >= cutoff:
+                break
+            batch.append(row)
+            if len(batch) >= batch_size:
+                self._write_batch(pa, pq, schema, batch)
+                written += len(batch)
+                self._save_watermark(batch[-1].created_at, batch[-1].id, total + written)
+                print(f"{written} rows exported, {written / (time.perf_counter() - started):,.0f} rows/s")
+                batch = []
+        if batch:
+            self._write_batch(pa, pq, schema, batch)
+            written += len(batch)
+            self._save_watermark(batch[-1].created_at, batch[-1].id, total + written)
+        return written
+
+    def _write_batch(self, pa, pq, schema, rows):
+        by_month = defaultdict(list)
+        for row in rows:
+            created_at = row.created_at
+            if isinstance(created_at, str):
+                created_at = datetime.fromisoformat(created_at)
+            by_month[created_at.strftime("%Y-%m")].append({
+                "id": str(row.id),
+                "user_id": row.user_id,
+                "meal_name": row.meal_name,
+                "meal_description": row.meal_description,
+                "meal_calories": row.meal_calories,
+                "meal_protein": row.meal_protein,
+                "meal_carbs": row.meal_carbs,
+                "meal_fat": row.meal_fat,
+                "created_at": created_at,
+            })
+        first = rows[0]
+        stamp = str(first.created_at).replace(" ", "T").replace(":", "")
+        for month, records in by_month.items():
+            directory = os.path.join(self.root, f"month={month}")
+            os.makedirs(directory, exist_ok=True)
+            path = os.path.join(directory, f"part-{stamp}-{first.id}.parquet")
+            pq.write_table(pa.Table.from_pylist(records, schema=schema), f"{path}.tmp")
+            os.replace(f"{path}.tmp", path)
+
+    # Query
+    def scan(self, columns: List[str] = None, start_month: str = None,
+             end_month: str = None, user_id: str = None):
+        """
+        Read the snapshot as a pyarrow Table
+
+        Args:
+            columns: Columns to load (default: all)
+            start_month / end_month: Inclusive "YYYY-MM" bounds; only the
+                matching partitions are opened
+            user_id: Only this user's meals
+        """
+        pa, ds, _ = _pyarrow()
+        dataset = ds.dataset(self.root, format="parquet", partitioning="hive",
+                             schema=_schema(pa).append(pa.field("month", pa.string())),
+                             exclude_invalid_files=True)
+        condition = None
+        for part in (
+            ds.field("month") >= start_month if start_month else None,
+            ds.field("month") <= end_month if end_month else None,
+            ds.field("user_id") == user_id if user_id else None,
+        ):
+            if part is not None:
+                condition = part if condition is None else condition & part
+        return dataset.to_table(columns=columns, filter=condition)
+
+    def meal_arrays(self, start_month: str = None, end_month: str = None,
+                    user_id: str = None) -> analytics.MealArrays:
+        """Load the snapshot into the columns the analytics module works on"""
+        table = self.scan(["user_id", "created_at", "meal_calories", "meal_protein",
+                           "meal_carbs", "meal_fat"], start_month, end_month, user_id)
+        pa, _, _ = _pyarrow()
+        import pyarrow.compute as pc
+        user_ids = table.column("user_id").to_numpy(zero_copy_only=False)
+        users, user = np.unique(user_ids, return_inverse=True)
+        created_at = table.column("created_at").to_numpy().astype("datetime64[us]")
+        # Day and hour in each user's local time, like rollups and summaries;
+        # one conversion per timezone rather than per user
+        zones = np.array([date_parser.user_timezone(str(u)).key for u in users] or [""])[user]
+        for zone in np.unique(zones):
+            rows = zones == zone
+            utc = pa.array(created_at[rows], type=pa.timestamp("us", tz=zone))
+            created_at[rows] = pc.local_timestamp(utc).to_numpy(zero_copy_only=False)
+        days = created_at.astype("datetime64[D]")
+        # Date ordinals match date.toordinal() (0001-01-01 is 1)
+        day = (days - np.datetime64("0001-01-01", "D")).astype(np.int64) + 1
+        hour = ((created_at - days) // np.timedelta64(1, "h")).astype(np.int8)
+        order = np.lexsort((day, user))
+
+        def column(name):
+            return table.column(name).to_numpy(zero_copy_only=False).astype(np.int32)[order]
+
+        return analytics.MealArrays(
+            users=[str(u) for u in users],
+            user=user.astype(np.int32)[order],
+            day=day.astype(np.int32)[order],
+            hour=hour[order],
+            calories=column("meal_calories"),
+            protein=column("meal_protein"),
+            carbs=column("meal_carbs"),
+            fat=column("meal_fat"),
+        )
+
+    def population_stats(self, start_month: str = None, end_month: str = None) -> Dict[str, float]:
+        """Averages across all users and tracked days"""
+        daily = analytics.daily_totals(self.meal_arrays(start_month, end_month))
+        if len(daily.day) == 0:
+            return {"users": 0, "tracked_days": 0}
+        ratios = analytics.macro_ratios(daily.protein.sum(), daily.carbs.sum(), daily.fat.sum())
+        per_user_days = np.bincount(daily.user, minlength=len(daily.users))
+        return {
+            "users": int((per_user_days > 0).sum()),
+            "tracked_days": int(len(daily.day)),
+            "avg_daily_calories": round(float(daily.calories.mean()), 1),
+            "median_daily_calories": round(float(np.median(daily.calories)), 1),
+            "avg_meals_per_day": round(float(daily.meal_count.mean()), 2),
+            "avg_tracked_days_per_user": round(float(per_user_days[per_user_days > 0].mean()), 1),
+            "goal_adherence": round(float(analytics.goal_adherence(daily).mean()), 3),
+            "protein_share": round(float(ratios[0]), 3),
+            "carbs_share": round(float(ratios[1]), 3),
+            "fat_share": round(float(ratios[2]), 3),
+        }
+
+    def cohort_stats(self) -> List[Dict[str, float]]:
+        """
+        Per signup cohort (month of a user's first meal): size, average daily
+        calories and the share of the cohort still logging in each later month
+        """
+        meals = self.meal_arrays()
+        if len(meals) == 0:
+            return []
+        days = np.datetime64("0001-01-01", "D") + (meals.day.astype(np.int64) - 1).astype("timedelta64[D]")
+        month = days.astype("datetime64[M]").astype(np.int64)
+
+        n_users = len(meals.users)
+        first_month = np.full(n_users, np.iinfo(np.int64).max)
+        np.minimum.at(first_month, meals.user, month)
+        daily = analytics.daily_totals(meals)
+
+        stats = []
+        for cohort in np.unique(first_month):
+            members = first_month == cohort
+            size = int(members.sum())
+            in_cohort = members[daily.user]
+            active = members[meals.user]
+            offsets = month[active] - cohort
+            retention = np.bincount(
+                np.unique(offsets * n_users + meals.user[active]) // n_users
+            ) / size
+            stats.append({
+                "cohort": str(np.datetime64(int(cohort), "M")),
+                "users": size,
+                "avg_daily_calories": round(float(daily.calories[in_cohort].mean()), 1),
+                "retention_by_month": [round(float(r), 3) for r in retention],
+            })
+        return stats
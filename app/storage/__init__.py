@@ -0,0 +1 @@
+# Database backends; use app.database.Database() to get the configured one
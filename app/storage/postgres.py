@@ -0,0 +1,31 @@
+from sqlalchemy import create_engine, text
+import os
+
+from app.database import Database
+
+
+class PostgresDatabase(Database):
+    """Database backed by Postgres (Supabase in production)"""
+
+    json_type = "JSONB"
+    id_type = "UUID"
+    blob_type = "BYTEA"
+
+    def _create_engine(self, url: str):
+        # Threads hold one connection each, so leave room above the default pool
+        return create_engine(
+            url,
+            pool_pre_ping=True,
+            pool_size=int(os.getenv("DB_POOL_SIZE", "5")),
+            max_overflow=int(os.getenv("DB_MAX_OVERFLOW", "40")),
+        )
+
+    def get_existing_tables(self):
+        """Get a list of existing tables in the database"""
+        result = self.connection.execute(text("""
+            SELECT table_name 
+            FROM information_schema.tables 
+            WHERE table_schema = 'public'
+        """))
+        
+        return [row[0] for row in result.fetchall()]
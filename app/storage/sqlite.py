@@ -0,0 +1,75 @@
+from sqlalchemy import DateTime, create_engine, event, text
+from sqlalchemy.pool import NullPool
+import os
+
+from app.database import Database
+from app.models import MealEntry
+
+
+class SQLiteDatabase(Database):
+    """
+    Database backed by a local SQLite file
+
+    Meant for single-node deployments and offline benchmarking. The file is
+    opened in WAL mode so readers don't block the writer, each thread gets
+    its own connection, and writes can be grouped with Database.batch().
+    """
+
+    json_type = "TEXT"
+    # No native uuid type; UUIDv7 text still sorts by creation time
+    id_type = "TEXT"
+    blob_type = "BLOB"
+    auto_create_tables = True
+
+    def _create_engine(self, url: str):
+        # Connections are held per thread by Database.connection, so no pooling
+        engine = create_engine(
+            url,
+            poolclass=NullPool,
+            # Seconds a writer waits for the lock before "database is locked"
+            connect_args={"check_same_thread": False,
+                          "timeout": float(os.getenv("SQLITE_BUSY_TIMEOUT", "30"))},
+        )
+
+        @event.listens_for(engine, "connect")
+        def _configure(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            cursor.execute("PRAGMA journal_mode=WAL")
+            # Durable at checkpoints, not on every commit; safe with WAL
+            cursor.execute("PRAGMA synchronous=NORMAL")
+            cursor.execute("PRAGMA temp_store=MEMORY")
+            cursor.execute("PRAGMA cache_size=-16000")
+            cursor.close()
+
+        return engine
+
+    def get_existing_tables(self):
+        """Get a list of existing tables in the database"""
+        result = self.connection.execute(text("""
+            SELECT name FROM sqlite_master WHERE type = 'table'
+        """))
+
+        return [row[0] for row in result.fetchall()]
+
+    def _replace_meal_values(self, user_id: str, meal_id: str, meal_entry: MealEntry):
+        # No row locks or UPDATE ... RETURNING of old values here. A no-op
+        # write takes the database's write lock first, so the read below is
+        # the latest version and stays so until the caller commits
+        params = self._meal_values(user_id, meal_id, meal_entry)
+        self.connection.execute(text("""
+            UPDATE meal_entries SET meal_name = meal_name
+            WHERE user_id = :user_id AND id = :meal_id
+        """), params)
+        old = self.connection.execute(text("""
+            SELECT created_at, meal_calories, meal_protein, meal_carbs, meal_fat
+            FROM meal_entries
+            WHERE user_id = :user_id AND id = :meal_id
+        """).columns(created_at=DateTime), params).fetchone()
+        self.connection.execute(text("""
+            UPDATE meal_entries
+            SET meal_name = :meal_name, meal_description = :meal_description,
+                meal_calories = :meal_calories, meal_protein = :meal_protein,
+                meal_carbs = :meal_carbs, meal_fat = :meal_fat
+            WHERE user_id = :user_id AND id = :meal_id
+        """), params)
+        return old
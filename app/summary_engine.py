@@ -0,0 +1,131 @@
+# Deterministic nutrition summaries: per-day totals, averages and the table
+# are computed locally; only the one-line comment comes from the LLM
+
+from datetime import date
+from typing import Dict, List
+
+from pydantic import BaseModel, computed_field
+
+# Separator row shared by the header and the totals block
+SEPARATOR = "--------|-----------|-------------|---------|---------"
+
+
+class DayTotals(BaseModel):
+    """Nutrition totals for one day"""
+    date: date
+    calories: int
+    protein: int
+    carbs: int
+    fat: int
+    meal_count: int
+
+
+class NutritionSummary(BaseModel):
+    """Per-day totals for a date range plus overall totals and averages"""
+    start_date: date
+    end_date: date
+    days: List[DayTotals] = []
+    total_calories: int = 0
+    total_protein: int = 0
+    total_carbs: int = 0
+    total_fat: int = 0
+
+    @computed_field
+    @property
+    def tracked_days(self) -> int:
+        return len(self.days)
+
+    @computed_field
+    @property
+    def range_days(self) -> int:
+        return (self.end_date - self.start_date).days + 1
+
+    @computed_field
+    @property
+    def averages(self) -> Dict[str, float]:
+        """Per tracked day, rounded for display"""
+        return {field: round(self.average(field), 1)
+                for field in ("calories", "protein", "carbs", "fat")}
+
+    def average(self, field: str) -> float:
+        """Average per tracked day (days without meals don't count)"""
+        if not self.days:
+            return 0.0
+        return getattr(self, f"total_{field}") / len(self.days)
+
+    def __str__(self) -> str:
+        # Compact JSON when handed back to a model as a tool result
+        return self.model_dump_json()
+
+
+def build_summary(rows, start_date: date, end_date: date) -> NutritionSummary:
+    """Turn per-day rollup rows (log_date, calories, protein, carbs, fat, meal_count)"""
+    days = [
+        DayTotals(
+            date=row[0],
+            calories=row[1],
+            protein=row[2],
+            carbs=row[3],
+            fat=row[4],
+            meal_count=row[5],
+        )
+        for row in rows
+    ]
+    return NutritionSummary(
+        start_date=start_date,
+        end_date=end_date,
+        days=days,
+        total_calories=sum(day.calories for day in days),
+        total_protein=sum(day.protein for day in days),
+        total_carbs=sum(day.carbs for day in days),
+        total_fat=sum(day.fat for day in days),
+    )
+
+
+def _row(label, carbs, protein, fat, calories) -> str:
+    return f"{label:<8}|{carbs:^11}|{protein:^13}|{fat:^9}| {calories:^8}".rstrip()
+
+
+def render_summary_table(summary: NutritionSummary) -> str:
+    """Render the WhatsApp summary table"""
+    if not summary.days:
+        if summary.start_date == summary.end_date:
+            return f"📊 No meals tracked on {summary.start_date:%d.%m.%Y} yet."
+        return (f"📊 No meals tracked between {summary.start_date:%d.%m.%Y} "
+                f"and {summary.end_date:%d.%m.%Y} yet.")
+
+    lines = [
+        f"📊 {summary.range_days}-Day Nutrition Summary",
+        "",
+        _row("Day", "Carbs (g)", "Protein (g)", "Fat (g)", "Calories"),
+        SEPARATOR,
+    ]
+    for day in summary.days:
+        lines.append(_row(f"{day.date:%d.%m.}", day.carbs, day.protein, day.fat, day.calories))
+    lines.append(SEPARATOR)
+    lines.append(_row("Total", summary.total_carbs, summary.total_protein,
+                      summary.total_fat, summary.total_calories))
+    lines.append(_row("Avg/day", f"{summary.average('carbs'):.1f}",
+                      f"{summary.average('protein'):.1f}", f"{summary.average('fat'):.1f}",
+                      f"{summary.average('calories'):.1f}"))
+    return "\n".join(lines)
+
+
+def comment_prompt(summary: NutritionSummary, trend_line: str = None) -> str:
+    """Prompt for the single encouraging one-liner"""
+    trends = f"Longer-term trends: {trend_line}" if trend_line else ""
+    return f"""
+    A user tracked {summary.tracked_days} of the last {summary.range_days} days.
+    Daily averages: {summary.average('calories'):.0f} kcal, {summary.average('protein'):.0f}g protein,
+    {summary.average('carbs'):.0f}g carbs, {summary.average('fat'):.0f}g fat.
+    {trends}
+    Write one witty line that evaluates their eating but is encouraging, with emojis.
+    Return only that line.
+    """
+
+
+def fallback_comment(summary: NutritionSummary) -> str:
+    """Used when the LLM call fails; the table is still worth sending"""
+    if summary.tracked_days < summary.range_days:
+        return "Keep logging every day and the picture gets sharper! 📈"
+    return "Every single day logged, nice consistency! 💪"
@@ -0,0 +1,152 @@
+# Speech-to-text backends: the OpenAI API, or a local CPU Whisper model
+
+from abc import ABC, abstractmethod
+from typing import List, Optional
+import io
+import os
+import threading
+
+from app.circuit import OPENAI_MAX_RETRIES, OPENAI_TIMEOUT_SECONDS, transcription_breaker
+
+# Comma-separated, in order of preference, e.g. "local,openai"
+TRANSCRIPTION_BACKEND = os.getenv("TRANSCRIPTION_BACKEND", "openai")
+# Optional language hint (ISO code, e.g. "de"); detected per clip when unset
+TRANSCRIPTION_LANGUAGE = os.getenv("TRANSCRIPTION_LANGUAGE") or None
+
+
+class TranscriptionBackend(ABC):
+    """Turns one audio clip into text"""
+
+    name = "base"
+    # Concurrent transcribe() calls worth making; callers size their pools by it
+    max_concurrency = 8
+
+    @abstractmethod
+    def transcribe(self, filename: str, data: bytes) -> str:
+        """The clip's text; raises if it can't be transcribed"""
+
+
+class OpenAIBackend(TranscriptionBackend):
+    """Remote whisper-1 through the OpenAI API"""
+
+    name = "openai"
+
+    def __init__(self, model: str = None):
+        from openai import OpenAI
+        self.client = OpenAI(timeout=OPENAI_TIMEOUT_SECONDS, max_retries=OPENAI_MAX_RETRIES)
+        self.model = model or os.getenv("OPENAI_TRANSCRIPTION_MODEL", "whisper-1")
+        self.max_concurrency = int(os.getenv("TRANSCRIBE_WORKERS", "8"))
+
+    def transcribe(self, filename: str, data: bytes) -> str:
+        kwargs = {"language": TRANSCRIPTION_LANGUAGE} if TRANSCRIPTION_LANGUAGE else {}
+        # Fails fast while the API is down; a local backend after this one takes over
+        transcript = transcription_breaker.call(
+            self.client.audio.transcriptions.create,
+            model=self.model,
+            file=(filename, data),
+            **kwargs
+        )
+        return transcript.text
+
+
+class LocalWhisperBackend(TranscriptionBackend):
+    """
+    Quantized Whisper on the CPU via faster-whisper (CTranslate2)
+
+    The model is loaded once, when the backend is created, and shared by all
+    threads; a semaphore caps concurrent inferences at `workers`, each using
+    `cpu_threads` threads, so the two together bound CPU use.
+    """
+
+    name = "local"
+
+    def __init__(self, model_size: str = None, compute_type: str = None,
+                 workers: int = None, cpu_threads: int = None, beam_size: int = None):
+        try:
+            from faster_whisper import WhisperModel
+        except ImportError:
+            raise RuntimeError("The local transcription backend needs faster-whisper: pip install faster-whisper")
+
+        self.model_size = model_size or os.getenv("LOCAL_WHISPER_MODEL", "base")
+        self.workers = workers or int(os.getenv("LOCAL_WHISPER_WORKERS", "2"))
+        cpu_threads = cpu_threads or int(os.getenv(
+            "LOCAL_WHISPER_CPU_THREADS", str(max(1, (os.cpu_count() or 2) // self.workers))
+        ))
+        self.beam_size = beam_size or int(os.getenv("LOCAL_WHISPER_BEAM_SIZE", "1"))
+        self.max_concurrency = self.workers
+
+        print(f"Loading local Whisper model '{self.model_size}' "
+              f"({self.workers} workers x {cpu_threads} threads)...")
+        self.model = WhisperModel(
+            self.model_size,
+            device="cpu",
+            compute_type=compute_type or os.getenv("LOCAL_WHISPER_COMPUTE_TYPE", "int8"),
+            cpu_threads=cpu_threads,
+            num_workers=self.workers,
+            download_root=os.getenv("LOCAL_WHISPER_MODEL_DIR") or None,
+        )
+        self._slots = threading.BoundedSemaphore(self.workers)
+
+    def transcribe(self, filename: str, data: bytes) -> str:
+        with self._slots:
+            segments, _ = self.model.transcribe(
+                io.BytesIO(data),
+                language=TRANSCRIPTION_LANGUAGE,
+                beam_size=self.beam_size,
+                # Silence is already trimmed by app/audio.py
+                vad_filter=False,
+            )
+            # Segments are generated lazily; decoding happens here
+            return " ".join(segment.text.strip() for segment in segments)
+
+
+class FallbackBackend(TranscriptionBackend):
+    """Tries each backend in order until one returns"""
+
+    def __init__(self, backends: List[TranscriptionBackend]):
+        self.backends = backends
+        self.name = ",".join(backend.name for backend in backends)
+        self.max_concurrency = backends[0].max_concurrency
+
+    def transcribe(self, filename: str, data: bytes) -> str:
+        for backend in self.backends[:-1]:
+            try:
+                return backend.transcribe(filename, data)
+            except Exception as e:
+                print(f"Transcription with {backend.name} failed, trying the next backend: {e}")
+        return self.backends[-1].transcribe(filename, data)
+
+
+BACKENDS = {
+    "openai": OpenAIBackend,
+    "local": LocalWhisperBackend,
+}
+
+
+def create_backend(names: str) -> TranscriptionBackend:
+    """Build the configured backends, skipping any that can't load"""
+    backends = []
+    for name in [n.strip() for n in names.split(",") if n.strip()]:
+        if name not in BACKENDS:
+            raise ValueError(f"Unknown transcription backend: {name}")
+        try:
+            backends.append(BACKENDS[name]())
+        except Exception as e:
+            print(f"Could not load transcription backend {name}: {e}")
+    if not backends:
+        raise RuntimeError(f"No transcription backend could be loaded from '{names}'")
+    return backends[0] if len(backends) == 1 else FallbackBackend(backends)
+
+
+_backend: Optional[TranscriptionBackend] = None
+_backend_lock = threading.Lock()
+
+
+def get_backend() -> TranscriptionBackend:
+    """The process-wide backend, loaded (and warmed) on first use"""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = create_backend(TRANSCRIPTION_BACKEND)
+            print(f"Transcription backend: {_backend.name}")
+        return _backend
@@ -5,9 +5,11 @@ import os
 from requests.auth import HTTPBasicAuth
 import requests
 import json
+import mimetypes
 from base64 import b64encode
-import tempfile
 from typing import Dict, Any
+from app.media_store import media_store
+from app.circuit import twilio_breaker
 class Twilio_Client:
     def __init__(self):
         # Load environment variables
@@ -30,7 +32,8 @@ class Twilio_Client:
     
     def send_message(self, message, to):
         try:
-            message_response = self.twilio_client.messages.create(
+            message_response = twilio_breaker.call(
+                self.twilio_client.messages.create,
                 from_=self.TWILIO_WHATSAPP_NUMBER,
                 body=message,
                 to=to
@@ -47,10 +50,7 @@ class Twilio_Client:
     def get_media_url(self, media_type, media_url: str) -> Dict[str, Any]:
         """Download media content and process based on type"""
         
-        response = requests.get(
-            media_url,
-            auth=self.twilio_auth
-        )
+        response = twilio_breaker.call(self._download, media_url)
         
         if media_type.startswith('image/'):
             # For images, return as data URL
@@ -60,19 +60,24 @@ class Twilio_Client:
             return {"type": media_type, "url": url}
         
         elif media_type.startswith('audio/'):
-            # For audio, save to temp file AND encode as base64
-            # First save the audio to a temporary file
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.mp3') as temp_audio:
-                temp_audio.write(response.content)
-                temp_audio_path = temp_audio.name
-            
-            # Also encode the audio as base64 for direct API use
-            base64_audio = b64encode(response.content).decode('utf-8')
+            # For audio, spool the download; small notes never touch the disk
+            suffix = mimetypes.guess_extension(media_type.split(";")[0].strip()) or ".ogg"
+            media_id = media_store.spool(response.iter_content(64 * 1024), suffix=suffix)
             
             return {
                 "type": media_type, 
-                "file_path": temp_audio_path,  # Path to the saved file
-                "base64_data": base64_audio    # Base64 encoded data
+                "media_id": media_id,  # Read back with media_store.read()
             }
         else:
-            raise ValueError(f"Unsupported media type: {media_type}")
\ No newline at end of file
+            raise ValueError(f"Unsupported media type: {media_type}")
+
+    def _download(self, media_url: str):
+        # Bounded, so a Twilio outage can't hold the webhook for long
+        response = requests.get(
+            media_url,
+            auth=self.twilio_auth,
+            stream=True,
+            timeout=(5, 30)
+        )
+        response.raise_for_status()
+        return response
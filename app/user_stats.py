@@ -0,0 +1,217 @@
+# Per-user stats (averages, personal bests, typical meal times, most-logged
+# foods), recomputed nightly across a process pool and read by the agents
+
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterator, List, Optional
+import multiprocessing
+import os
+import time
+
+import numpy as np
+
+from app import analytics
+from app.database import Database
+
+# Window for averages and trends; personal bests use the full history
+STATS_LOOKBACK_DAYS = 30
+# Stored stats older than this are still used, but logged: the nightly job is behind
+STATS_MAX_AGE_DAYS = int(os.getenv("USER_STATS_MAX_AGE_DAYS", "2"))
+TOP_MEALS = 5
+
+
+def _select(meals: analytics.MealArrays, mask: np.ndarray) -> analytics.MealArrays:
+    return analytics.MealArrays(
+        users=meals.users,
+        user=meals.user[mask],
+        day=meals.day[mask],
+        hour=meals.hour[mask],
+        calories=meals.calories[mask],
+        protein=meals.protein[mask],
+        carbs=meals.carbs[mask],
+        fat=meals.fat[mask],
+    )
+
+
+def compute_user_stats(db, user_ids: List[str], today: date,
+                       lookback_days: int = STATS_LOOKBACK_DAYS) -> Dict[str, dict]:
+    """
+    Stats for a group of users, from one pass over their meal history
+
+    Returns:
+        Dict of user_id -> stats, for users with at least one meal
+    """
+    end = datetime.combine(today, datetime.min.time())
+    meals = analytics.load_meal_arrays(db, end_date=end, user_ids=user_ids)
+    if len(meals) == 0:
+        return {}
+    n_users = len(meals.users)
+
+    recent = _select(meals, meals.day >= (today - timedelta(days=lookback_days - 1)).toordinal())
+    trends = analytics.user_trends(recent, today)
+    hours = analytics.typical_meal_hours(recent)
+    recent_daily = analytics.daily_totals(recent)
+    recent_days = np.bincount(recent_daily.user, minlength=n_users)
+
+    def average(values):
+        sums = np.bincount(recent_daily.user, weights=values, minlength=n_users)
+        return np.divide(sums, recent_days, out=np.zeros(n_users), where=recent_days > 0)
+
+    averages = {name: average(getattr(recent_daily, name))
+                for name in ("calories", "protein", "carbs", "fat", "meal_count")}
+
+    # Personal bests over the full history
+    daily = analytics.daily_totals(meals)
+    _, longest = analytics.streaks(daily, today)
+    most_meals = np.zeros(n_users, dtype=np.int64)
+    np.maximum.at(most_meals, daily.user, daily.meal_count)
+    # Sorted by user then protein, so each user's last row is their best day
+    by_protein = np.lexsort((daily.protein, daily.user))
+    best_protein_row = np.zeros(n_users, dtype=np.int64)
+    best_protein_row[daily.user[by_protein]] = by_protein
+    tracked = np.bincount(daily.user, minlength=n_users)
+
+    top_meals = db.get_meal_name_counts(meals.users, TOP_MEALS)
+
+    stats = {}
+    for code, user_id in enumerate(meals.users):
+        best = best_protein_row[code]
+        stats[user_id] = {
+            "averages": {
+                "days": lookback_days,
+                "tracked_days": int(recent_days[code]),
+                "calories": round(float(averages["calories"][code]), 1),
+                "protein": round(float(averages["protein"][code]), 1),
+                "carbs": round(float(averages["carbs"][code]), 1),
+                "fat": round(float(averages["fat"][code]), 1),
+                "meals_per_day": round(float(averages["meal_count"][code]), 2),
+            },
+            "trends": trends.get(user_id),
+            "personal_bests": {
+                "highest_protein_day": {
+                    "date": date.fromordinal(int(daily.day[best])).isoformat(),
+                    "protein": int(daily.protein[best]),
+                },
+                "most_meals_in_a_day": int(most_meals[code]),
+                "longest_streak": int(longest[code]),
+                "tracked_days": int(tracked[code]),
+            },
+            "typical_meal_hours": hours.get(user_id, []),
+            "top_meals": [{"name": name, "count": count}
+                          for name, count in top_meals.get(user_id, [])],
+        }
+    return stats
+
+
+def stats_for_user(db, user_id: str, today: date) -> Optional[dict]:
+    """
+    Stats for the agents: the nightly row, even if it's stale, or None
+
+    Never computed on demand; this runs on every meal reply and summary,
+    and recompute_user_stats.py does the work off the request path.
+    """
+    stored = db.get_user_stats(user_id)
+    if stored is None:
+        return None
+    stats, computed_for = stored
+    age = (today - computed_for).days
+    if age > STATS_MAX_AGE_DAYS:
+        print(f"Stats for {user_id} are {age} days old")
+    return stats
+
+
+def describe_stats(stats: Optional[dict]) -> str:
+    """One line for LLM prompts"""
+    if not stats:
+        return "No recent history."
+    parts = [analytics.describe_trends(stats.get("trends"))]
+    if stats.get("top_meals"):
+        meals = ", ".join(f"{meal['name']} ({meal['count']}x)" for meal in stats["top_meals"][:3])
+        parts.append(f"Most logged: {meals}.")
+    if stats.get("typical_meal_hours"):
+        hours = ", ".join(f"{hour}:00" for hour in sorted(stats["typical_meal_hours"]))
+        parts.append(f"Usually eats around {hours}.")
+    bests = stats.get("personal_bests")
+    if bests:
+        protein = bests["highest_protein_day"]
+        parts.append(f"Personal bests: {protein['protein']}g protein on {protein['date']}, "
+                     f"{bests['longest_streak']}-day logging streak.")
+    return " ".join(parts)
+
+
+# Nightly batch
+# Each worker process opens its own Database; engines aren't shared across processes
+_worker_db = None
+
+
+def _init_worker(memory_limit_mb: Optional[int]):
+    global _worker_db
+    if memory_limit_mb:
+        try:
+            import resource
+            limit = memory_limit_mb * 1024 * 1024
+            resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+        except (ImportError, ValueError) as e:
+            print(f"Could not set worker memory limit: {e}")
+    _worker_db = Database()
+
+
+def _run_shard(task):
+    user_ids, today, lookback_days = task
+    try:
+        stats = compute_user_stats(_worker_db, user_ids, today, lookback_days)
+        _worker_db.upsert_user_stats(stats, today)
+        return len(user_ids), len(stats)
+    except Exception as e:
+        print(f"Error computing stats for {user_ids[0]}..{user_ids[-1]}: {e}")
+        import traceback
+        traceback.print_exc()
+        return len(user_ids), 0
+
+
+def _shards(user_ids: Iterator[str], shard_size: int) -> Iterator[List[str]]:
+    shard = []
+    for user_id in user_ids:
+        shard.append(user_id)
+        if len(shard) >= shard_size:
+            yield shard
+            shard = []
+    if shard:
+        yield shard
+
+
+def recompute_all(db, today: date, shard_size: int = 500, workers: int = None,
+                  memory_limit_mb: int = None, max_tasks_per_child: int = 50,
+                  lookback_days: int = STATS_LOOKBACK_DAYS, progress_every: float = 5.0) -> int:
+    """
+    Recompute and store stats for every user
+
+    Users are split into shards of shard_size and farmed out to a pool of
+    worker processes; each shard is loaded, computed and upserted by one
+    worker. Workers are recycled after max_tasks_per_child shards, and
+    memory_limit_mb caps each worker's address space, so a bad shard fails
+    on its own instead of taking the host down.
+
+    Returns:
+        Number of users whose stats were written
+    """
+    workers = workers or os.cpu_count() or 1
+    tasks = ((shard, today, lookback_days) for shard in _shards(db.iter_user_ids(), shard_size))
+
+    started = time.perf_counter()
+    last_report = started
+    done_users = 0
+    written = 0
+    # spawn, not fork: a forked child would inherit the parent's open connections
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(workers, initializer=_init_worker, initargs=(memory_limit_mb,),
+                      maxtasksperchild=max_tasks_per_child) as pool:
+        for shard_users, shard_written in pool.imap_unordered(_run_shard, tasks):
+            done_users += shard_users
+            written += shard_written
+            now = time.perf_counter()
+            if now - last_report >= progress_every:
+                last_report = now
+                print(f"{done_users} users processed, {written} written, "
+                      f"{done_users / (now - started):,.0f} users/s")
+    print(f"Done: {written} users' stats written in {time.perf_counter() - started:.1f}s")
+    return written
@@ -0,0 +1,37 @@
+import os
+
+import pytest
+
+# Agents build their clients on import; no request is ever sent
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+
+@pytest.fixture
+def db(tmp_path):
+    from app.database import Database
+    database = Database(f"sqlite:///{tmp_path / 'test.db'}")
+    database.create_tables()
+    database.context_cache.clear()
+    return database
+
+
+def make_state(body: str, sender: str = "whatsapp:+4915112345678", media_items=None):
+    from app.models import State, WhatsAppMessage
+    message = WhatsAppMessage(body=body, sender=sender, num_media=len(media_items or []),
+                              media_items=media_items or [], form_data={})
+    return State(message=message, context=None)
+
+
+def log_meal_at(db, user_id: str, meal_name: str, created_at: str, calories: int = 400):
+    """Log a meal as if it had been sent at created_at (UTC)"""
+    from sqlalchemy import text
+    from app.models import MealEntry
+    db.set_meal_entry(user_id, MealEntry(
+        meal_name=meal_name, meal_description="", meal_calories=calories,
+        meal_protein=10, meal_carbs=10, meal_fat=10,
+    ))
+    db.connection.execute(text("UPDATE meal_entries SET created_at = :created_at WHERE meal_name = :meal_name"),
+                          {"created_at": created_at, "meal_name": meal_name})
+    db.connection.commit()
+    # The rollup was kept for the insert time
+    db.rebuild_daily_rollups(user_id)
@@ -0,0 +1,99 @@
+from datetime import date, datetime
+
+import numpy as np
+import pytest
+
+from app import analytics
+from app.snapshot import MealSnapshot
+from tests.conftest import log_meal_at
+
+BERLIN = "whatsapp:+4915112345678"
+NEW_YORK = "whatsapp:+12125550100"
+D = date(2024, 10, 1).toordinal()
+
+
+def meal_arrays(rows):
+    """rows of (user code, day offset, hour, calories)"""
+    user, day, hour, calories = (np.array(column) for column in zip(*rows))
+    zeros = np.zeros(len(rows), dtype=np.int32)
+    return analytics.MealArrays(
+        users=["a", "b"], user=user.astype(np.int32), day=(day + D).astype(np.int32),
+        hour=hour.astype(np.int8), calories=calories.astype(np.int32),
+        protein=zeros + 10, carbs=zeros + 20, fat=zeros + 5,
+    )
+
+
+def test_daily_totals():
+    daily = analytics.daily_totals(meal_arrays([
+        (1, 0, 8, 100), (0, 2, 8, 300), (0, 0, 8, 200), (0, 0, 19, 400),
+    ]))
+    assert list(daily.user) == [0, 0, 1]
+    assert list(daily.day - D) == [0, 2, 0]
+    assert list(daily.calories) == [600, 300, 100]
+    assert list(daily.protein) == [20, 10, 10]
+    assert list(daily.meal_count) == [2, 1, 1]
+
+
+def test_rolling_average_is_per_user_over_calendar_days():
+    daily = analytics.daily_totals(meal_arrays([
+        (0, 0, 8, 1000), (0, 1, 8, 2000), (0, 8, 8, 3000), (1, 1, 8, 500),
+    ]))
+    # Day 8 is more than 7 days after days 0 and 1; user b starts fresh
+    assert list(analytics.rolling_average(daily, daily.calories)) == [1000, 1500, 3000, 500]
+    assert list(analytics.rolling_average(daily, daily.calories, window=9)) == [1000, 1500, 2000, 500]
+
+
+def test_streaks():
+    daily = analytics.daily_totals(meal_arrays([
+        (0, 0, 8, 1), (0, 1, 8, 1), (0, 2, 8, 1), (0, 5, 8, 1), (0, 6, 8, 1),
+        (1, 0, 8, 1), (1, 1, 8, 1),
+    ]))
+    current, longest = analytics.streaks(daily)
+    assert list(current) == [2, 2]
+    assert list(longest) == [3, 2]
+
+    # A streak only holds while the last tracked day is today or yesterday
+    current, _ = analytics.streaks(daily, date.fromordinal(D + 7))
+    assert list(current) == [2, 0]
+
+
+@pytest.fixture
+def late_meals(db):
+    # 22:30 UTC is 00:30 the next day in Berlin and 18:30 the same day in New York
+    log_meal_at(db, BERLIN, "Midnight snack", "2024-10-15 22:30:00", calories=300)
+    log_meal_at(db, BERLIN, "Lunch", "2024-10-16 10:00:00", calories=700)
+    log_meal_at(db, NEW_YORK, "Dinner", "2024-10-15 22:30:00", calories=800)
+    return db
+
+
+def local_days(meals):
+    return sorted((meals.users[u], date.fromordinal(int(d)), int(h))
+                  for u, d, h in zip(meals.user, meals.day, meals.hour))
+
+
+LOCAL_DAYS = [
+    (NEW_YORK, date(2024, 10, 15), 18),
+    (BERLIN, date(2024, 10, 16), 0),
+    (BERLIN, date(2024, 10, 16), 12),
+]
+
+
+def test_load_meal_arrays_uses_local_days(late_meals):
+    meals = analytics.load_meal_arrays(late_meals)
+    assert local_days(meals) == LOCAL_DAYS
+    # Both Berlin meals are on the 16th, so that's one tracked day
+    assert list(analytics.daily_totals(meals).calories) == [1000, 800]
+
+
+def test_load_meal_arrays_filters_local_days(late_meals):
+    day = datetime(2024, 10, 16)
+    meals = analytics.load_meal_arrays(late_meals, BERLIN, day, day)
+    assert len(meals) == 2
+    assert len(analytics.load_meal_arrays(late_meals, NEW_YORK, day, day)) == 0
+
+
+def test_snapshot_uses_local_days(late_meals, tmp_path):
+    pytest.importorskip("pyarrow")
+    snapshot = MealSnapshot(str(tmp_path / "snapshot"))
+    snapshot.export_incremental(late_meals)
+    assert local_days(snapshot.meal_arrays()) == LOCAL_DAYS
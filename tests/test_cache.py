@@ -0,0 +1,34 @@
+from datetime import date, datetime
+
+from app.cache import DailyContextCache, LocalPubSub, SummaryCache
+from app.models import MealContext
+
+BERLIN = "whatsapp:+4915112345678"
+
+
+def caches():
+    bus = LocalPubSub()
+    return DailyContextCache(bus=bus), SummaryCache(bus=bus)
+
+
+def meal(created_at):
+    return MealContext(id="m1", created_at=created_at, meal_name="Late pasta", meal_description="",
+                       meal_calories=700, meal_protein=25, meal_carbs=90, meal_fat=20)
+
+
+def test_write_drops_summaries_of_the_users_day():
+    contexts, summaries = caches()
+    summaries.put(BERLIN, date(2024, 10, 16), date(2024, 10, 16), "the 16th")
+    summaries.put(BERLIN, date(2024, 10, 15), date(2024, 10, 15), "the 15th")
+
+    # 23:30 UTC on the 15th is the 16th in Berlin
+    contexts.add_meal(BERLIN, meal(datetime(2024, 10, 15, 23, 30)))
+    assert summaries.get(BERLIN, date(2024, 10, 16), date(2024, 10, 16)) is None
+    assert summaries.get(BERLIN, date(2024, 10, 15), date(2024, 10, 15)) == "the 15th"
+
+
+def test_write_without_a_day_drops_all_of_the_users_summaries():
+    contexts, summaries = caches()
+    summaries.put(BERLIN, date(2024, 10, 15), date(2024, 10, 16), "two days")
+    contexts.remove_meal(BERLIN, "unknown")
+    assert summaries.get(BERLIN, date(2024, 10, 15), date(2024, 10, 16)) is None
@@ -0,0 +1,71 @@
+import asyncio
+import threading
+
+import pytest
+
+from app.agents.quick_log import Quick_Logger
+from app.agents.transcriber import Transcriber
+from app.langgraph_flow import Workflow
+from tests.conftest import make_state
+
+
+@pytest.fixture
+def workflow(db, monkeypatch):
+    monkeypatch.setattr("app.langgraph_flow.GRAPH_ATTEMPTS", 1)
+    # Every turn ends at the quick logger, without a model call
+    def answer(self, state):
+        state.response = f"done: {state.message.body}"
+        return state
+    monkeypatch.setattr(Quick_Logger, "__call__", answer)
+    return Workflow(db)
+
+
+def voice_note(media_id):
+    return make_state("", media_items=[{"type": "audio/ogg", "media_id": media_id}])
+
+
+def test_replay_after_crash_in_transcriber_uses_the_new_audio(workflow, monkeypatch):
+    seen = []
+
+    def crash(self, state):
+        seen.append(state.message.media_items[0]["media_id"])
+        raise RuntimeError("worker died")
+
+    monkeypatch.setattr(Transcriber, "__call__", crash)
+    with pytest.raises(RuntimeError):
+        asyncio.run(workflow.run_graph(voice_note("old"), run_id="SM1"))
+    assert workflow.checkpointer.flush()
+
+    def transcribe(self, state):
+        seen.append(state.message.media_items[0]["media_id"])
+        state.message.body = "two eggs"
+        return state
+
+    monkeypatch.setattr(Transcriber, "__call__", transcribe)
+    result = asyncio.run(workflow.run_graph(voice_note("new"), run_id="SM1"))
+    assert seen == ["old", "new"]
+    assert result["response"] == "done: two eggs"
+
+
+def test_deleted_run_is_not_read_back_before_the_writer_deletes_it(workflow, monkeypatch):
+    saver = workflow.checkpointer
+    original = saver.db.delete_checkpoints
+    # Completed runs are deleted too; keep SM2's rows around for the test
+    monkeypatch.setattr(saver.db, "delete_checkpoints", lambda ids: None)
+    asyncio.run(workflow.run_graph(make_state("oats"), run_id="SM2"))
+    assert saver.flush()
+
+    release = threading.Event()
+
+    def held_delete(ids):
+        assert release.wait(5)
+        original(ids)
+
+    monkeypatch.setattr(saver.db, "delete_checkpoints", held_delete)
+    saver.delete_thread("SM2")
+    try:
+        config = {"configurable": {"thread_id": "SM2", "checkpoint_ns": ""}}
+        assert saver.get_tuple(config) is None
+    finally:
+        release.set()
+    assert saver.flush()
@@ -0,0 +1,135 @@
+import asyncio
+
+import pytest
+
+from app import circuit
+from app.circuit import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(circuit.time, "monotonic", clock)
+    return clock
+
+
+def fail():
+    raise ConnectionError("down")
+
+
+def trip(breaker):
+    for _ in range(breaker.failure_threshold):
+        with pytest.raises(ConnectionError):
+            breaker.call(fail)
+
+
+def test_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker("test", failure_threshold=3, reset_seconds=30)
+    breaker.call(lambda: None)
+    trip(breaker)
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpenError) as raised:
+        breaker.call(lambda: "not called")
+    assert raised.value.retry_in == pytest.approx(30)
+    assert breaker.stats()["rejected"] == 1
+
+
+def test_success_resets_the_count(clock):
+    breaker = CircuitBreaker("test", failure_threshold=3)
+    for _ in range(5):
+        with pytest.raises(ConnectionError):
+            breaker.call(fail)
+        with pytest.raises(ConnectionError):
+            breaker.call(fail)
+        breaker.call(lambda: None)
+    assert breaker.state == CLOSED
+
+
+def test_errors_that_are_not_outages_dont_count(clock):
+    breaker = CircuitBreaker("test", failure_threshold=1, is_failure=lambda e: isinstance(e, ConnectionError))
+    with pytest.raises(ValueError):
+        breaker.call(int, "not a number")
+    assert breaker.state == CLOSED
+
+
+def test_half_open_lets_one_probe_through(clock):
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_seconds=30)
+    trip(breaker)
+    assert not breaker.available()
+    clock.now += 30
+    assert breaker.available()
+    assert breaker.state == OPEN     # available() doesn't take the probe
+
+    assert breaker.allow()
+    assert breaker.state == HALF_OPEN
+    assert not breaker.available()
+    assert not breaker.allow()
+
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    assert breaker.allow()
+
+
+def test_failed_probe_opens_again(clock):
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_seconds=30)
+    trip(breaker)
+    clock.now += 30
+    with pytest.raises(ConnectionError):
+        breaker.call(fail)
+    assert breaker.state == OPEN
+    assert breaker.retry_in() == pytest.approx(30)
+    assert breaker.stats()["opened"] == 2
+
+
+def test_lost_probe_is_given_up_on(clock):
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_seconds=30)
+    trip(breaker)
+    clock.now += 30
+    assert breaker.allow()           # never reported
+    clock.now += 29
+    assert not breaker.allow()
+    clock.now += 1
+    assert breaker.allow()
+
+
+def test_listeners_see_every_transition(clock):
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_seconds=30)
+    seen = []
+    breaker.add_listener(lambda name, state: seen.append((name, state)))
+    breaker.add_listener(lambda name, state: 1 / 0)     # errors are contained
+    trip(breaker)
+    clock.now += 30
+    breaker.call(lambda: None)
+    assert seen == [("test", OPEN), ("test", HALF_OPEN), ("test", CLOSED)]
+
+
+def test_acall(clock):
+    breaker = CircuitBreaker("test", failure_threshold=1)
+
+    async def down():
+        raise ConnectionError("down")
+
+    async def up():
+        return "ok"
+
+    with pytest.raises(ConnectionError):
+        asyncio.run(breaker.acall(down))
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(breaker.acall(up))
+
+
+def test_degraded(clock, monkeypatch):
+    breaker = CircuitBreaker("test", failure_threshold=1)
+    monkeypatch.setattr(circuit, "BREAKERS", {"test": breaker})
+    assert not circuit.degraded()
+    trip(breaker)
+    assert circuit.degraded()
+    assert circuit.stats()["test"]["state"] == OPEN
@@ -0,0 +1,109 @@
+from types import SimpleNamespace
+
+import pytest
+
+from app import circuit
+from app.agents.router import Router
+from app.corrections import Correction, apply_correction, local_correction, parse_correction, pick_target
+from tests.conftest import log_meal_at, make_state
+
+
+def meal(meal_name, calories=300, protein=20, carbs=10, fat=20, description="", id="1"):
+    return SimpleNamespace(id=id, meal_name=meal_name, meal_description=description,
+                           meal_calories=calories, meal_protein=protein,
+                           meal_carbs=carbs, meal_fat=fat)
+
+
+@pytest.mark.parametrize("message", [
+    "delete the last one", "Remove that meal.", "undo", "please cancel it",
+    "Lösche die letzte Mahlzeit", "rückgängig",
+])
+def test_delete(message):
+    assert parse_correction(message) == Correction("delete")
+
+
+@pytest.mark.parametrize("message, item, old, new", [
+    ("actually it was 2 eggs, not 3", "eggs", 3, 2),
+    ("two eggs instead of three", "eggs", 3, 2),
+    ("not 3 but 2 eggs", "eggs", 3, 2),
+    ("2 Eier statt 3", "eier", 3, 2),
+    ("nicht 3 sondern 2 eier", "eier", 3, 2),
+])
+def test_count(message, item, old, new):
+    assert parse_correction(message) == Correction("count", item=item, old_count=old, new_count=new)
+
+
+@pytest.mark.parametrize("message, values", [
+    ("make that 450 kcal", {"meal_calories": 450}),
+    ("actually 30g protein and 12 g fat", {"meal_protein": 30, "meal_fat": 12}),
+    ("Korrektur: 60 g Kohlenhydrate", {"meal_carbs": 60}),
+])
+def test_set(message, values):
+    assert parse_correction(message) == Correction("set", values=values)
+
+
+@pytest.mark.parametrize("message, factor", [
+    ("actually it was only half", 0.5),
+    ("it was a double portion", 2.0),
+    ("eigentlich nur die Hälfte", 0.5),
+])
+def test_scale(message, factor):
+    assert parse_correction(message) == Correction("scale", factor=factor)
+
+
+@pytest.mark.parametrize("message", [
+    "", "2 eggs and toast", "I had 450 kcal of pasta", "half an avocado", "3 eggs, not bad",
+    "2 eggs instead of 3 pancakes", "not 3 pancakes but 2 eggs",
+])
+def test_new_meals_are_not_corrections(message):
+    assert parse_correction(message) is None
+
+
+def test_count_scales_a_single_item_meal():
+    corrected = apply_correction(parse_correction("it was 2 eggs, not 3"),
+                                 meal("3 eggs", calories=210, protein=18, carbs=3, fat=15))
+    assert corrected.meal_name == "2 eggs"
+    assert (corrected.meal_calories, corrected.meal_protein, corrected.meal_fat) == (140, 12, 10)
+
+
+def test_count_in_a_mixed_meal_needs_the_model():
+    assert apply_correction(parse_correction("it was 2 eggs, not 3"), meal("3 eggs with toast")) is None
+
+
+def test_set_and_scale():
+    row = meal("Pasta", calories=800, protein=30, carbs=120, fat=20)
+    assert apply_correction(parse_correction("make that 450 kcal"), row).meal_calories == 450
+    halved = apply_correction(parse_correction("actually only half"), row)
+    assert (halved.meal_calories, halved.meal_carbs) == (400, 60)
+
+
+def test_pick_target():
+    eggs, pasta, oats = meal("3 eggs", id="1"), meal("Pasta", id="2"), meal("Oats", id="3")
+    recent = [oats, pasta, eggs]
+    assert pick_target(recent, parse_correction("it was 2 eggs, not 3")) is eggs
+    assert pick_target(recent, parse_correction("2 apples, not 3")) is None
+    assert pick_target(recent, parse_correction("the pasta was actually half"), "the pasta was actually half") is pasta
+    assert pick_target(recent, parse_correction("make that 450 kcal"), "make that 450 kcal") is oats
+    assert pick_target([], Correction("delete")) is None
+
+
+def test_local_correction_needs_a_cue_and_a_recent_meal():
+    eggs, pasta = meal("3 eggs", id="1"), meal("Pasta", id="2")
+    assert local_correction("actually it was 2 eggs, not 3", [pasta, eggs]).item == "eggs"
+    assert local_correction("2 Eier statt 3", [meal("3 Eier")]).item == "eier"
+    assert local_correction("delete the last one", [pasta]).kind == "delete"
+    # Nothing logged recently to correct
+    assert local_correction("actually it was 2 eggs, not 3", []) is None
+    assert local_correction("2 apples instead of 3", [pasta, eggs]) is None
+
+
+@pytest.mark.parametrize("message, intent", [
+    ("actually it was 2 eggs, not 3", "correction"),
+    ("2 pancakes instead of 3", "meal_tracking"),
+    ("2 eggs instead of 3 pancakes", "meal_tracking"),
+])
+def test_router_shortcut(db, monkeypatch, message, intent):
+    log_meal_at(db, "whatsapp:+4915112345678", "3 eggs", "2024-10-16 06:00:00")
+    # Anything not taken locally goes to keyword routing
+    monkeypatch.setattr(circuit.openai_breaker, "available", lambda: False)
+    assert Router(db)(make_state(message)).intent == intent
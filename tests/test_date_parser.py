@@ -0,0 +1,18 @@
+import pytest
+
+from app import date_parser
+from app.date_parser import parse_date_range
+from app.date_parser_corpus import CORPUS, TODAY
+
+
+@pytest.mark.parametrize("message, expected", CORPUS)
+def test_parse_date_range(message, expected):
+    assert parse_date_range(message, TODAY) == expected
+
+
+@pytest.mark.parametrize("message", ["last 99999999999 days", "letzte 99999999999 Wochen"])
+def test_huge_ranges_are_capped(message):
+    start, end = parse_date_range(message, TODAY)
+    assert end == TODAY
+    assert (end - start).days == date_parser.MAX_RANGE_DAYS - 1
+
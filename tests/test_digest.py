@@ -0,0 +1,87 @@
+from datetime import date
+import threading
+import time
+
+from app.digest import DIGEST_TITLES, DigestCheckpoint, DigestSender, iter_digests
+from tests.conftest import log_meal_at
+
+DAY = date(2024, 10, 16)
+USERS = [f"whatsapp:+4915100000{n:03d}" for n in range(1, 4)]
+
+
+class FakeTwilio:
+    """Records sends; a user listed in `hold` isn't sent until released, one in `fail` fails"""
+
+    def __init__(self, hold=(), fail=()):
+        self.sent = []
+        self.fail = set(fail)
+        self.started = {user_id: threading.Event() for user_id in hold}
+        self.release = {user_id: threading.Event() for user_id in hold}
+        self._lock = threading.Lock()
+
+    def send_message(self, message, to):
+        if to in self.release:
+            self.started[to].set()
+            assert self.release[to].wait(5)
+        if to in self.fail:
+            return None
+        with self._lock:
+            self.sent.append((to, message))
+        return f"SM-{to}"
+
+
+def sender_for(tmp_path, twilio, run_key="daily:2024-10-16:2024-10-16", **kwargs):
+    checkpoint = DigestCheckpoint(str(tmp_path / "checkpoint.json"), run_key).load()
+    return DigestSender(twilio, checkpoint, rate=1000, workers=4, checkpoint_every=0, **kwargs)
+
+
+def test_watermark_only_covers_the_finished_prefix(tmp_path):
+    twilio = FakeTwilio(hold=[USERS[0]])
+    sender = sender_for(tmp_path, twilio)
+    run = threading.Thread(target=sender.run, args=([(user_id, "digest") for user_id in USERS],))
+    run.start()
+    assert twilio.started[USERS[0]].wait(5)
+
+    # The later users finish first, but the first one is still in flight
+    while len(twilio.sent) < 2:
+        time.sleep(0.01)
+    assert sender.checkpoint.watermark is None
+
+    twilio.release[USERS[0]].set()
+    run.join()
+    assert sender.checkpoint.watermark == USERS[-1]
+    assert (sender.checkpoint.sent, sender.checkpoint.failed) == (3, 0)
+    assert [user_id for user_id, _ in twilio.sent] == [USERS[1], USERS[2], USERS[0]]
+
+
+def test_failures_are_listed_and_passed(tmp_path):
+    sender = sender_for(tmp_path, FakeTwilio(fail=[USERS[1]]))
+    sender.run([(user_id, "digest") for user_id in USERS])
+    assert (sender.checkpoint.sent, sender.checkpoint.failed) == (2, 1)
+    assert sender.checkpoint.watermark == USERS[-1]
+    with open(sender.failures_path) as f:
+        assert f.read().split() == [USERS[1]]
+
+
+def test_resumed_run_skips_users_already_handled(db, tmp_path):
+    for user_id in USERS:
+        log_meal_at(db, user_id, f"Pasta {user_id[-1]}", "2024-10-16 10:00:00", calories=700)
+
+    digests = list(iter_digests(db, "daily", DAY, DAY))
+    assert [user_id for user_id, _ in digests] == USERS
+    assert digests[0][1].startswith(DIGEST_TITLES["daily"])
+
+    # The first run stops after the first two users
+    first = sender_for(tmp_path, FakeTwilio())
+    first.run(digests[:2])
+    assert first.checkpoint.watermark == USERS[1]
+
+    twilio = FakeTwilio()
+    resumed = sender_for(tmp_path, twilio)
+    assert resumed.checkpoint.watermark == USERS[1]
+    resumed.run(iter_digests(db, "daily", DAY, DAY, after_user_id=resumed.checkpoint.watermark))
+    assert [user_id for user_id, _ in twilio.sent] == [USERS[2]]
+    assert (resumed.checkpoint.sent, resumed.checkpoint.watermark) == (3, USERS[2])
+
+    # Another run's checkpoint isn't resumed from
+    assert sender_for(tmp_path, FakeTwilio(), run_key="weekly:2024-10-10:2024-10-16").checkpoint.watermark is None
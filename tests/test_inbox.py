@@ -0,0 +1,125 @@
+import os
+import threading
+import time
+
+import pytest
+
+from app import inbox as inbox_module
+from app.inbox import InboundLog, encode_record, open_inbox
+
+
+def pending_ids(log):
+    return [record["id"] for record, _ in log.pending()]
+
+
+def test_replay_stops_at_a_torn_record(tmp_path):
+    log = InboundLog(str(tmp_path), sync="always").open()
+    log.record_received({"MessageSid": "SM1", "Body": "2 eggs"})
+    log.record_received({"MessageSid": "SM2", "Body": "oats"})
+    log.record_done("SM1")
+    log.close()
+    # A crash in the middle of writing the next record
+    (segment,) = [name for name in os.listdir(tmp_path) if name.endswith(".wal")]
+    with open(tmp_path / segment, "ab") as f:
+        f.write(encode_record({"type": "done", "id": "SM2"})[:-3])
+
+    restarted = InboundLog(str(tmp_path), sync="always").open()
+    assert pending_ids(restarted) == ["SM2"]
+    assert restarted.pending()[0][0]["form"]["Body"] == "oats"
+    # The new run writes to a fresh segment, past the torn tail
+    restarted.record_done("SM2")
+    assert pending_ids(restarted) == []
+    restarted.close()
+
+
+def test_a_retried_webhook_is_replayed_once(tmp_path):
+    log = InboundLog(str(tmp_path), sync="off").open()
+    log.record_received({"MessageSid": "SM1", "Body": "2 eggs"})
+    log.record_received({"MessageSid": "SM1", "Body": "2 eggs"})
+    log.record_replay("SM1")
+    assert [(record["id"], replays) for record, replays in log.pending()] == [("SM1", 1)]
+    log.close()
+
+
+def test_group_commit_shares_fsyncs(tmp_path, monkeypatch):
+    log = InboundLog(str(tmp_path), sync="group").open()
+    fsync = os.fsync
+
+    def slow_fsync(fd):
+        time.sleep(0.05)
+        fsync(fd)
+
+    monkeypatch.setattr(os, "fsync", slow_fsync)
+    start = threading.Barrier(16)
+
+    def write(n):
+        start.wait()
+        log.record_received({"MessageSid": f"SM{n}"})
+
+    threads = [threading.Thread(target=write, args=(n,)) for n in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # Every writer returned with its record synced, most of them on someone else's fsync
+    assert log.records == 16
+    assert log._synced == log._written == 16
+    assert log.fsyncs < 16
+    assert sorted(pending_ids(log)) == sorted(f"SM{n}" for n in range(16))
+    log.close()
+
+
+def test_compaction_carries_unfinished_entries_forward(tmp_path):
+    # Small segments, compacted by hand
+    log = InboundLog(str(tmp_path), segment_bytes=300, sync="off", compact_segments=100).open()
+    for n in range(12):
+        log.record_received({"MessageSid": f"SM{n}", "Body": "x" * 50})
+        if n % 3:
+            log.record_done(f"SM{n}")
+    log.record_replay("SM3")
+    assert log.rotations > 0
+    unfinished = pending_ids(log)
+    assert unfinished == ["SM0", "SM3", "SM6", "SM9"]
+
+    active = log._segment
+    log.compact()
+    assert log.compactions == 1
+    # The sealed segments are gone; only the active one and what it rotated into are left
+    assert min(number for number, _ in log._segments()) == active
+    assert pending_ids(log) == unfinished
+    # Replay counts survive, so the give-up limit still applies
+    assert {record["id"]: replays for record, replays in log.pending()}["SM3"] == 1
+    log.close()
+
+
+def test_rotation_starts_a_compaction(tmp_path):
+    log = InboundLog(str(tmp_path), segment_bytes=200, sync="off", compact_segments=2).open()
+    for n in range(10):
+        log.record_received({"MessageSid": f"SM{n}", "Body": "x" * 50})
+    deadline = time.monotonic() + 5
+    while (log.compactions == 0 or log._compacting) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert log.compactions >= 1
+    assert sorted(pending_ids(log)) == sorted(f"SM{n}" for n in range(10))
+    log.close()
+
+
+def test_workers_lock_their_own_slot(tmp_path, monkeypatch):
+    monkeypatch.setattr(inbox_module, "INBOX_SLOTS", 2)
+    first, first_lock = open_inbox(str(tmp_path))
+    second, second_lock = open_inbox(str(tmp_path))
+    assert first.root != second.root
+    with pytest.raises(RuntimeError):
+        open_inbox(str(tmp_path))
+
+    # A restarted worker takes over the slot, with what was left in it
+    first.record_received({"MessageSid": "SM1"})
+    first.close()
+    first_lock.close()
+    again, again_lock = open_inbox(str(tmp_path))
+    assert again.root == first.root
+    assert pending_ids(again) == ["SM1"]
+    for log, lock in ((second, second_lock), (again, again_lock)):
+        log.close()
+        lock.close()
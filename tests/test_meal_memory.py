@@ -0,0 +1,103 @@
+import os
+import threading
+
+import pytest
+
+from app.meal_memory import REUSE_THRESHOLD, MealMemory, can_reuse, embed, quantities
+from app.models import MealEntry
+
+
+def meal(text: str) -> dict:
+    return {"id": "1", "meal_name": text, "meal_description": ""}
+
+
+def similarity(a: str, b: str) -> float:
+    return float(embed(a) @ embed(b))
+
+
+@pytest.mark.parametrize("logged, message", [
+    ("200g chicken breast with rice", "400g chicken breast with rice"),
+    ("2 eggs and toast", "3 eggs and toast"),
+    ("two eggs and toast", "three eggs and toast"),
+    ("Oatmeal with blueberries", "Oatmeal with blueberries, half portion"),
+])
+def test_quantity_variants_are_not_reused(logged, message):
+    assert not can_reuse(message, 0.99, meal(logged))
+
+
+def test_embedding_alone_would_reuse_quantity_variants():
+    # Why can_reuse checks amounts: these score above the reuse threshold
+    assert similarity("200g chicken breast with rice", "400g chicken breast with rice") >= REUSE_THRESHOLD
+    assert similarity("2 eggs and toast", "3 eggs and toast") >= REUSE_THRESHOLD
+
+
+@pytest.mark.parametrize("logged, message", [
+    ("2 eggs and toast", "2 eggs and toast"),
+    ("2 eggs and toast", "two eggs and toast"),
+    ("Oatmeal with blueberries", "oatmeal with blueberries"),
+])
+def test_same_amounts_are_reused(logged, message):
+    assert can_reuse(message, 0.99, meal(logged))
+
+
+def test_below_threshold_is_never_reused():
+    assert not can_reuse("pasta carbonara", 0.5, meal("pasta carbonara"))
+
+
+def test_quantities():
+    assert quantities("2 eggs, 200g rice and half an avocado") == ["0.5", "2", "200"]
+    assert quantities("1,5 Brötchen mit zwei Eiern") == ["1.5", "2"]
+    assert quantities("½ pizza") == ["0.5"]
+
+
+class SlowDatabase:
+    """iter_meals for `slow_user` blocks until released"""
+
+    def __init__(self, slow_user: str):
+        self.slow_user = slow_user
+        self.entered = threading.Event()
+        self.release = threading.Event()
+
+    def iter_meals(self, user_id, after=None):
+        if user_id == self.slow_user:
+            self.entered.set()
+            assert self.release.wait(5)
+        return iter(())
+
+
+def test_slow_catch_up_does_not_block_other_users(tmp_path):
+    memory = MealMemory(str(tmp_path))
+    slow, fast = "whatsapp:+491111", "whatsapp:+492222"
+    assert memory._user_lock(slow) is not memory._user_lock(fast)
+    db = SlowDatabase(slow)
+
+    loading = threading.Thread(target=memory.search, args=(db, slow, "pasta"))
+    loading.start()
+    assert db.entered.wait(5)
+    try:
+        done = threading.Thread(target=memory.add, args=(db, fast, "m1", MealEntry(
+            meal_name="Pasta", meal_description="", meal_calories=600,
+            meal_protein=20, meal_carbs=90, meal_fat=15,
+        )))
+        done.start()
+        done.join(2)
+        assert not done.is_alive()
+    finally:
+        db.release.set()
+        loading.join(5)
+
+
+def test_add_is_saved_by_flush(tmp_path):
+    memory = MealMemory(str(tmp_path))
+    user_id = "whatsapp:+491111"
+    db = SlowDatabase(slow_user=None)
+    memory.add(db, user_id, "m1", MealEntry(
+        meal_name="Oats", meal_description="with blueberries", meal_calories=350,
+        meal_protein=12, meal_carbs=55, meal_fat=8,
+    ))
+    path = memory._path(user_id)
+    assert not os.path.exists(f"{path}.json")
+
+    memory.flush()
+    assert os.path.exists(f"{path}.json")
+    assert MealMemory(str(tmp_path)).search(db, user_id, "oats with blueberries")[0][1]["id"] == "m1"
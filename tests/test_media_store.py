@@ -0,0 +1,82 @@
+import os
+import time
+
+import pytest
+
+from app.media_store import MediaStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = MediaStore(str(tmp_path / "media"), memory_limit=10, max_age_seconds=60)
+    yield store
+    store.stop()
+
+
+def files(store):
+    return sorted(os.listdir(store.root)) if os.path.isdir(store.root) else []
+
+
+def test_payloads_up_to_the_limit_stay_in_memory(store):
+    media_id = store.spool([b"12345", b"", b"67890"])
+    assert store.read(media_id) == b"1234567890"
+    assert files(store) == []
+    assert store.stats()["in_memory_items"] == 1
+
+
+def test_larger_payloads_move_to_disk(store):
+    # The limit is crossed in the middle of a chunk; what was buffered goes first
+    media_id = store.spool([b"123456", b"7890X", b"YZ"], suffix=".ogg")
+    assert store.read(media_id) == b"1234567890XYZ"
+    assert files(store) == [f"{media_id}.ogg"]
+    stats = store.stats()
+    assert (stats["on_disk_items"], stats["on_disk_bytes"], stats["spooled_to_disk"]) == (1, 13, 1)
+
+
+def test_a_failed_download_leaves_no_file(store):
+    def chunks():
+        yield b"x" * 20
+        raise ConnectionError("reset")
+
+    with pytest.raises(ConnectionError):
+        store.spool(chunks())
+    assert files(store) == []
+    assert store.stats()["on_disk_items"] == 0
+
+
+def test_request_scope_releases_its_payloads(store):
+    outside = store.spool([b"kept"])
+    with store.request_scope():
+        small = store.spool([b"small"])
+        large = store.spool([b"x" * 50])
+        assert len(files(store)) == 1
+    for media_id in (small, large):
+        with pytest.raises(KeyError):
+            store.read(media_id)
+    assert files(store) == []
+    assert store.released == 2
+    # Only what was spooled inside the scope
+    assert store.read(outside) == b"kept"
+
+
+def test_sweep_drops_expired_payloads_and_orphaned_files(store):
+    old = store.spool([b"x" * 50])
+    recent = store.spool([b"y" * 50])
+    store._entries[old].created -= 120
+
+    # Left behind by a crashed worker, and one another worker is still writing
+    os.makedirs(store.root, exist_ok=True)
+    orphan, fresh = os.path.join(store.root, "orphan"), os.path.join(store.root, "fresh")
+    for path in (orphan, fresh):
+        with open(path, "wb") as f:
+            f.write(b"z")
+    os.utime(orphan, (time.time() - 120, time.time() - 120))
+    # Known files are kept by age of their entry, not mtime
+    os.utime(store._entries[recent].path, (time.time() - 120, time.time() - 120))
+
+    assert store.sweep() == 2
+    with pytest.raises(KeyError):
+        store.read(old)
+    assert store.read(recent) == b"y" * 50
+    assert files(store) == sorted([recent, "fresh"])
+    assert store.janitor_removed == 2
@@ -0,0 +1,56 @@
+import pytest
+
+from app.message_parts import body_length, split_message
+
+TABLE_HEADER = "Day     | Carbs (g) | Protein (g) | Fat (g) | Calories"
+TABLE_RULE = "--------|-----------|-------------|---------|---------"
+
+
+def test_short_messages_are_one_part():
+    assert split_message("  Logged 2 eggs 🍳  ") == ["Logged 2 eggs 🍳"]
+    assert split_message("   ") == []
+
+
+def test_emoji_count_twice():
+    assert body_length("🍳") == 2
+    assert split_message("🍳" * 6, limit=10) == ["🍳" * 5, "🍳"]
+
+
+@pytest.mark.parametrize("limit", [50, 100, 250])
+def test_parts_fit_and_keep_every_line(limit):
+    lines = [f"Line {i}: oats with blueberries and a coffee" for i in range(30)]
+    parts = split_message("\n".join(lines), limit=limit)
+    assert len(parts) > 1
+    assert all(body_length(part) <= limit for part in parts)
+    assert "\n".join(parts).split("\n") == lines
+
+
+def test_parts_end_at_a_paragraph_break():
+    first = "\n".join(["a" * 20] * 3)
+    second = "\n".join(["b" * 20] * 3)
+    parts = split_message(f"{first}\n\n{second}", limit=100)
+    assert parts == [first, second]
+
+
+def test_long_lines_are_cut_between_words():
+    words = ["pasta"] * 40
+    parts = split_message(" ".join(words), limit=50)
+    assert all(body_length(part) <= 50 for part in parts)
+    assert " ".join(parts).split() == words
+
+
+def test_words_longer_than_a_part_are_cut_hard():
+    parts = split_message("x" * 25, limit=10)
+    assert parts == ["x" * 10, "x" * 10, "x" * 5]
+
+
+def test_continued_table_repeats_its_header():
+    rows = [f"Day {i:<4}|   170     |     95      |   60    |  1810" for i in range(1, 31)]
+    text = "\n".join(["📊 30-Day Nutrition Summary", "", TABLE_HEADER, TABLE_RULE, *rows])
+    parts = split_message(text, limit=600)
+    assert len(parts) > 1
+    for part in parts[1:]:
+        assert part.split("\n")[:2] == [TABLE_HEADER, TABLE_RULE]
+    # Every row is sent exactly once
+    sent = [line for part in parts for line in part.split("\n") if line.startswith("Day ") and line != TABLE_HEADER]
+    assert sent == rows
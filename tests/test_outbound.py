@@ -0,0 +1,79 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+from sqlalchemy import text
+
+from app import outbound
+from app.circuit import CLOSED, CircuitBreaker
+from app.outbound import OutboundMessage, OutboundQueue
+
+TO = "whatsapp:+4915112345678"
+
+
+class FakeTwilio:
+    TWILIO_ACCOUNT_SID = "AC123"
+    TWILIO_AUTH_TOKEN = "token"
+    TWILIO_WHATSAPP_NUMBER = "whatsapp:+14155238886"
+
+
+@pytest.fixture
+def breaker(monkeypatch):
+    breaker = CircuitBreaker("twilio", failure_threshold=1, reset_seconds=0.05)
+    monkeypatch.setattr(outbound, "twilio_breaker", breaker)
+    # Open, and due for a probe
+    breaker.record_failure(RuntimeError("HTTP 503"))
+    time.sleep(0.06)
+    return breaker
+
+
+@pytest.fixture
+def queue(db):
+    queue = OutboundQueue(db, FakeTwilio(), rate=1000)
+    queue.client = httpx.AsyncClient(
+        base_url=outbound.TWILIO_API_URL,
+        transport=httpx.MockTransport(lambda request: httpx.Response(201, json={"sid": "SM1"})),
+    )
+    return queue
+
+
+def deliver(queue, message):
+    async def run():
+        queue._loop = asyncio.get_running_loop()
+        queue._queue = asyncio.Queue()
+        await queue._deliver(message)
+    asyncio.run(run())
+
+
+def stored(db, message_id):
+    return db.connection.execute(
+        text("SELECT status, attempts FROM outbound_messages WHERE id = :id"), {"id": message_id}
+    ).fetchone()
+
+
+def test_unclaimed_message_leaves_the_probe(queue, breaker):
+    # Not in the table: delivered by another worker
+    deliver(queue, OutboundMessage("gone", TO, "hi"))
+    assert breaker.allow()
+
+
+def test_probe_taken_elsewhere_gives_the_claim_back(db, queue, breaker, monkeypatch):
+    db.enqueue_outbound([("m1", TO, "hi")], outbound._utcnow())
+
+    async def another_lane_probes():
+        assert breaker.allow()
+    monkeypatch.setattr(queue.bucket, "acquire_async", another_lane_probes)
+
+    message = OutboundMessage("m1", TO, "hi")
+    deliver(queue, message)
+    assert tuple(stored(db, "m1")) == ("pending", 0)
+    assert message.attempts == 0
+    assert queue.held == 1
+
+
+def test_probe_outcome_is_reported(db, queue, breaker):
+    db.enqueue_outbound([("m1", TO, "hi")], outbound._utcnow())
+    deliver(queue, OutboundMessage("m1", TO, "hi"))
+    assert tuple(stored(db, "m1")) == ("sent", 1)
+    assert breaker.state == CLOSED
@@ -0,0 +1,65 @@
+import asyncio
+
+from app import progress
+from app.agents.synthesizer import render_macro_block
+from app.models import MealEntry
+
+ACK = progress.acknowledgement_for([{"type": "image/jpeg"}])
+MEAL = MealEntry(meal_name="Pasta", meal_description="", meal_calories=700,
+                 meal_protein=25, meal_carbs=90, meal_fat=20)
+
+
+def run_turn(seconds_before_macros: float, threshold: float = 0.2):
+    """A turn like process_message runs it; returns what was sent early and whether the macros were"""
+    sent = []
+
+    def meal_tracker():
+        # Runs on a worker thread, like a graph node
+        reporter = progress.current()
+        reporter.partial("macros", render_macro_block(MEAL))
+
+    async def turn():
+        with progress.reporting(sent.append, threshold_seconds=threshold) as reporter:
+            reporter.acknowledge(ACK)
+            await asyncio.sleep(seconds_before_macros)
+            await asyncio.to_thread(meal_tracker)
+            macros_sent = reporter.sent("macros")
+        # Nothing is sent once the turn is over
+        await asyncio.sleep(threshold)
+        return macros_sent
+
+    return sent, asyncio.run(turn())
+
+
+def test_fast_turns_send_no_progress():
+    before = progress.stats()["suppressed"]
+    sent, macros_sent = run_turn(0.01)
+    assert sent == []
+    assert not macros_sent
+    assert progress.stats()["suppressed"] == before + 1
+
+
+def test_slow_turns_send_the_acknowledgement_and_the_macros():
+    sent, macros_sent = run_turn(0.3)
+    assert sent == [ACK, render_macro_block(MEAL)]
+    # The synthesizer sees this and only adds the comment
+    assert macros_sent
+
+
+def test_macros_sent_first_replace_the_acknowledgement():
+    sent = []
+
+    async def turn():
+        with progress.reporting(sent.append, threshold_seconds=0.0) as reporter:
+            reporter.acknowledge(ACK)
+            # Before the acknowledgement timer gets a chance to fire
+            reporter.partial("macros", render_macro_block(MEAL))
+            await asyncio.sleep(0.05)
+
+    asyncio.run(turn())
+    assert sent == [render_macro_block(MEAL)]
+
+
+def test_text_turns_have_no_acknowledgement():
+    assert progress.acknowledgement_for([]) is None
+    assert progress.acknowledgement_for([{"type": "audio/ogg"}]).startswith("🎙️")
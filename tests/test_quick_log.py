@@ -0,0 +1,77 @@
+from datetime import date, datetime
+
+import pytest
+
+from app import corrections, date_parser, quick_log
+from app.agents.quick_log import Quick_Logger
+from app.models import MealEntry
+from tests.conftest import log_meal_at, make_state
+
+TODAY = date(2025, 3, 12)
+
+
+@pytest.mark.parametrize("message", [
+    "delete the last one",
+    "remove the last meal",
+    "delete that",
+    "Lösche die letzte Mahlzeit",
+])
+def test_corrections_are_not_favorite_deletes(db, message):
+    command = quick_log.parse_command(message, TODAY)
+    assert command is None or command.kind != "delete_favorite"
+
+    # The quick logger leaves it alone, so the router sees a correction
+    state = Quick_Logger(db)(make_state(message))
+    assert state.response is None
+    assert corrections.parse_correction(message).kind == "delete"
+
+
+@pytest.mark.parametrize("message, alias", [
+    ("delete favorite pizza", "pizza"),
+    ("remove my favourite protein shake", "protein shake"),
+    ("forget fav oats", "oats"),
+    ("unfavorite pizza", "pizza"),
+    ("Lösche Favorit Müsli", "müsli"),
+    ("entferne favoriten müsli", "müsli"),
+])
+def test_delete_favorite(message, alias):
+    assert quick_log.parse_command(message, TODAY) == quick_log.QuickCommand("delete_favorite", alias=alias)
+
+
+def test_delete_favorite_removes_it(db):
+    user_id = "whatsapp:+4915112345678"
+    db.save_favorite(user_id, "pizza", MealEntry(
+        meal_name="Pizza", meal_description="", meal_calories=800,
+        meal_protein=30, meal_carbs=90, meal_fat=30,
+    ))
+
+    state = Quick_Logger(db)(make_state("delete favorite pizza", sender=user_id))
+    assert state.response.startswith("🗑️")
+    assert db.get_favorite(user_id, "pizza") is None
+
+
+def test_slot_window_is_local_to_the_user():
+    # Berlin is UTC+1 in March, New York already UTC-4
+    assert quick_log.slot_window(date(2025, 3, 11), "breakfast", date_parser.user_timezone("whatsapp:+4915112345678")) == (
+        datetime(2025, 3, 11, 3), datetime(2025, 3, 11, 10))
+    assert quick_log.slot_window(date(2025, 3, 11), "dinner", date_parser.user_timezone("whatsapp:+12125550100")) == (
+        datetime(2025, 3, 11, 20), datetime(2025, 3, 12, 4))
+
+
+@pytest.mark.parametrize("sender, message, logged", [
+    # 07:30 and 11:30 in Berlin; naive UTC would make both breakfast
+    ("whatsapp:+4915112345678", "same as yesterday breakfast", ["Muesli"]),
+    ("whatsapp:+4915112345678", "same as yesterday lunch", ["Pasta"]),
+    # 21:00 in New York is already the next day in UTC
+    ("whatsapp:+12125550100", "same as yesterday dinner", ["Steak"]),
+])
+def test_same_as_uses_the_users_timezone(db, monkeypatch, sender, message, logged):
+    monkeypatch.setattr(date_parser, "today_for", lambda user_id: TODAY)
+    log_meal_at(db, "whatsapp:+4915112345678", "Muesli", "2025-03-11 06:30:00")
+    log_meal_at(db, "whatsapp:+4915112345678", "Pasta", "2025-03-11 10:30:00")
+    log_meal_at(db, "whatsapp:+12125550100", "Steak", "2025-03-12 01:00:00")
+
+    state = Quick_Logger(db)(make_state(message, sender=sender))
+    assert state.response is not None
+    assert [meal.meal_name for meal in db.get_recent_meals(sender, limit=1)] == logged
+    assert state.meal_entry.meal_name == logged[-1]
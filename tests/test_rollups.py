@@ -0,0 +1,126 @@
+from datetime import date, datetime
+import threading
+import time
+
+from sqlalchemy import text
+
+from app import date_parser
+from app.models import MealEntry
+from tests.conftest import log_meal_at
+
+BERLIN = "whatsapp:+4915112345678"
+NEW_YORK = "whatsapp:+12125550100"
+
+
+def entry(meal_name, calories, protein=10, carbs=10, fat=10):
+    return MealEntry(meal_name=meal_name, meal_description="", meal_calories=calories,
+                     meal_protein=protein, meal_carbs=carbs, meal_fat=fat)
+
+
+def rollups(db, user_id=BERLIN):
+    return [tuple(row) for row in db.connection.execute(text("""
+        SELECT log_date, total_calories, total_protein, total_carbs, total_fat, meal_count
+        FROM daily_nutrition_rollups WHERE user_id = :user_id ORDER BY log_date
+    """), {"user_id": user_id})]
+
+
+def today(db):
+    (created_at,) = db.connection.execute(text("SELECT MAX(created_at) FROM meal_entries")).fetchone()
+    return str(date_parser.local_date(BERLIN, created_at))
+
+
+def test_local_date():
+    assert date_parser.local_date(BERLIN, datetime(2024, 10, 15, 22, 30)) == date(2024, 10, 16)
+    assert date_parser.local_date(NEW_YORK, "2024-10-16 02:00:00") == date(2024, 10, 15)
+    assert date_parser.local_date(BERLIN, date(2024, 10, 16)) == date(2024, 10, 16)
+    assert date_parser.local_date(BERLIN, None) is None
+
+
+def test_writes_keep_the_rollup_in_step(db):
+    pasta, oats = entry("Pasta", 700, 25, 90, 20), entry("Oats", 300, 10, 50, 5)
+    db.set_meal_entry(BERLIN, pasta)
+    db.set_meal_entry(BERLIN, oats)
+    day = today(db)
+    assert rollups(db) == [(day, 1000, 35, 140, 25, 2)]
+
+    db.update_meal_entry(BERLIN, pasta.id, entry("Pasta", 500, 20, 60, 15))
+    assert rollups(db) == [(day, 800, 30, 110, 20, 2)]
+
+    db.delete_meal_entry(BERLIN, oats.id)
+    assert rollups(db) == [(day, 500, 20, 60, 15, 1)]
+
+    # The day's last meal takes its row with it
+    db.delete_meal_entry(BERLIN, pasta.id)
+    assert rollups(db) == []
+    assert db.check_daily_rollups() == []
+
+
+def test_rollups_are_kept_per_local_day(db):
+    # 23:30 UTC is already the next day in Berlin, 19:30 the same day in New York
+    log_meal_at(db, BERLIN, "Late pasta", "2024-10-15 23:30:00", calories=700)
+    log_meal_at(db, BERLIN, "Breakfast", "2024-10-16 06:00:00", calories=300)
+    log_meal_at(db, NEW_YORK, "Dinner", "2024-10-15 23:30:00", calories=600)
+
+    assert db.rebuild_daily_rollups() == 2
+    assert [(str(row[0]), row[1], row[5]) for row in db.get_daily_rollups(
+        BERLIN, date(2024, 10, 15), date(2024, 10, 16))] == [("2024-10-16", 1000, 2)]
+    assert [(str(row[0]), row[1]) for row in db.get_daily_rollups(
+        NEW_YORK, date(2024, 10, 15), date(2024, 10, 16))] == [("2024-10-15", 600)]
+
+
+def test_rebuild_one_user(db):
+    log_meal_at(db, BERLIN, "Oats", "2024-10-16 06:00:00", calories=300)
+    log_meal_at(db, NEW_YORK, "Dinner", "2024-10-15 23:30:00", calories=600)
+    db.connection.execute(text("DELETE FROM daily_nutrition_rollups"))
+    db.connection.commit()
+
+    assert db.rebuild_daily_rollups(BERLIN) == 1
+    assert rollups(db, BERLIN) == [("2024-10-16", 300, 10, 10, 10, 1)]
+    assert rollups(db, NEW_YORK) == []
+
+
+def test_check_reports_drift(db):
+    log_meal_at(db, BERLIN, "Oats", "2024-10-16 06:00:00", calories=300)
+    log_meal_at(db, BERLIN, "Pasta", "2024-10-17 12:00:00", calories=700)
+    assert db.check_daily_rollups() == []
+
+    db.connection.execute(text("UPDATE daily_nutrition_rollups SET total_calories = 999 WHERE log_date = '2024-10-16'"))
+    db.connection.execute(text("DELETE FROM daily_nutrition_rollups WHERE log_date = '2024-10-17'"))
+    db.connection.commit()
+    assert db.check_daily_rollups() == [
+        (BERLIN, "2024-10-16", (300, 10, 10, 10, 1), (999, 10, 10, 10, 1)),
+        (BERLIN, "2024-10-17", (700, 10, 10, 10, 1), None),
+    ]
+    assert db.check_daily_rollups(NEW_YORK) == []
+
+    db.rebuild_daily_rollups()
+    assert db.check_daily_rollups() == []
+
+
+def test_concurrent_edits_dont_drift(db, monkeypatch):
+    pasta = entry("Pasta", 700)
+    db.set_meal_entry(BERLIN, pasta)
+
+    original = db._apply_rollup_delta
+    entered, release = threading.Event(), threading.Event()
+
+    def paused(*args):
+        if threading.current_thread().name == "first":
+            entered.set()
+            assert release.wait(5)
+        original(*args)
+
+    monkeypatch.setattr(db, "_apply_rollup_delta", paused)
+    first = threading.Thread(target=db.update_meal_entry, args=(BERLIN, pasta.id, entry("Pasta", 500)), name="first")
+    second = threading.Thread(target=db.update_meal_entry, args=(BERLIN, pasta.id, entry("Pasta", 300)), name="second")
+    first.start()
+    assert entered.wait(5)
+    # The second edit reads the meal while the first one is between its write and commit
+    second.start()
+    time.sleep(0.3)
+    release.set()
+    first.join()
+    second.join()
+
+    assert rollups(db)[0][1] == 300
+    assert db.check_daily_rollups() == []
@@ -0,0 +1,35 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.models import MealEntry
+from app.snapshot import MealSnapshot
+from tests.conftest import log_meal_at
+
+BERLIN = "whatsapp:+4915112345678"
+
+pytest.importorskip("pyarrow")
+
+
+def exported(snapshot):
+    return sorted(snapshot.scan(["meal_name"]).column("meal_name").to_pylist())
+
+
+def test_export_holds_back_recent_rows(db, tmp_path):
+    snapshot = MealSnapshot(str(tmp_path / "snapshot"))
+    log_meal_at(db, BERLIN, "Oats", "2024-10-16 06:00:00")
+    db.set_meal_entry(BERLIN, MealEntry(meal_name="Pasta", meal_description="", meal_calories=700,
+                                        meal_protein=25, meal_carbs=90, meal_fat=20))
+
+    # Pasta was just logged; a transaction that started before it may still commit
+    assert snapshot.export_incremental(db, lag_seconds=300) == 1
+    assert exported(snapshot) == ["Oats"]
+
+    # ...like this one, stamped before Pasta but committed after it
+    late = (datetime.now(timezone.utc) - timedelta(seconds=60)).strftime("%Y-%m-%d %H:%M:%S")
+    log_meal_at(db, BERLIN, "Soup", late)
+
+    assert snapshot.export_incremental(db, lag_seconds=0) == 2
+    assert exported(snapshot) == ["Oats", "Pasta", "Soup"]
+    assert snapshot.watermark()["rows"] == 3
+    assert snapshot.export_incremental(db, lag_seconds=0) == 0
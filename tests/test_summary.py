@@ -0,0 +1,9 @@
+import asyncio
+
+from app.agents.summary import Summary_Creator
+from tests.conftest import make_state
+
+
+def test_huge_ranges_get_a_summary(db):
+    state = asyncio.run(Summary_Creator(db)(make_state("summary of the last 99999999999 days")))
+    assert state.response.startswith("📊")
@@ -0,0 +1,50 @@
+from datetime import date
+
+from app import analytics, user_stats
+from tests.conftest import log_meal_at
+
+BERLIN = "whatsapp:+4915112345678"
+NEW_YORK = "whatsapp:+12125550100"
+TODAY = date(2024, 10, 16)
+
+
+def test_compute_user_stats(db):
+    # 23:30 and 22:30 UTC are the next day in Berlin, so the 14th-16th is a 3-day streak
+    log_meal_at(db, BERLIN, "Oats", "2024-10-14 06:00:00", calories=300)
+    log_meal_at(db, BERLIN, "Soup", "2024-10-14 17:00:00", calories=700)
+    log_meal_at(db, BERLIN, "Pasta", "2024-10-14 23:30:00", calories=800)
+    log_meal_at(db, BERLIN, "Toast", "2024-10-15 22:30:00", calories=500)
+    # Outside the 30-day window: a personal best, but not in the averages
+    log_meal_at(db, BERLIN, "Feast", "2024-08-01 12:00:00", calories=2000)
+    log_meal_at(db, NEW_YORK, "Bagel", "2024-10-16 12:00:00", calories=400)
+
+    stats = user_stats.compute_user_stats(db, [BERLIN, NEW_YORK, "whatsapp:+4900"], TODAY)
+    assert set(stats) == {BERLIN, NEW_YORK}
+
+    berlin = stats[BERLIN]
+    assert berlin["averages"] == {
+        "days": 30, "tracked_days": 3, "calories": 766.7, "protein": 13.3,
+        "carbs": 13.3, "fat": 13.3, "meals_per_day": 1.33,
+    }
+    assert berlin["personal_bests"]["longest_streak"] == 3
+    assert berlin["personal_bests"]["most_meals_in_a_day"] == 2
+    assert berlin["personal_bests"]["tracked_days"] == 4
+    assert berlin["personal_bests"]["highest_protein_day"] == {"date": "2024-10-14", "protein": 20}
+    assert len(berlin["top_meals"]) == user_stats.TOP_MEALS
+
+    assert stats[NEW_YORK]["averages"]["calories"] == 400
+    assert stats[NEW_YORK]["top_meals"] == [{"name": "Bagel", "count": 1}]
+
+
+def test_stats_for_user_never_computes(db, monkeypatch):
+    def scan(*args, **kwargs):
+        raise AssertionError("computed on demand")
+
+    monkeypatch.setattr(analytics, "trends_for_user", scan)
+    monkeypatch.setattr(analytics, "load_meal_arrays", scan)
+    log_meal_at(db, BERLIN, "Oats", "2024-10-16 06:00:00")
+    assert user_stats.stats_for_user(db, BERLIN, TODAY) is None
+
+    db.upsert_user_stats({BERLIN: {"trends": None, "top_meals": []}}, date(2024, 10, 1))
+    # Weeks old, but still what the agents get
+    assert user_stats.stats_for_user(db, BERLIN, TODAY) == {"trends": None, "top_meals": []}